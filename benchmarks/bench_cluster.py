@@ -0,0 +1,188 @@
+"""
+Coordinator and remote worker benchmark on localhost
+
+Serves a queue of synthetic files from the local media server through a
+Coordinator and has several RemoteWorker processes download it, as
+`cli.py --serve` and `cli.py --worker` would on separate hosts. With
+--kill-after one worker is killed mid-run, once it holds a lease, so its
+leased jobs must be requeued when their leases expire and finished by
+the others. The other workers are shut down cleanly at the end.
+
+Reports throughput, items per second, and how many items needed more
+than one attempt.
+
+Usage:
+    python -m benchmarks.bench_cluster [--workers 3] [--slots 2] [--kill-after 2] [--output FILE]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+# The fake extractor is a yt-dlp plugin under benchmarks/yt_dlp_plugins/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.bench_download import RecordCollector
+from benchmarks.media_server import MediaServer
+from src.core.coordinator import Coordinator, CoordinatorServer
+from src.core.downloader import SESSION_OPTIONS, load_yt_dlp, make_downloader
+from src.core.metrics import MetricsRegistry
+from src.core.queue_manager import QueueManager
+from src.core.remote_worker import RemoteWorker
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=3,
+                        help="worker processes (default: 3)")
+    parser.add_argument("--slots", type=int, default=2,
+                        help="concurrent jobs per worker (default: 2)")
+    parser.add_argument("--items", type=int, default=24,
+                        help="queued items (default: 24)")
+    parser.add_argument("--file-size", type=int, default=4 * 1024 * 1024,
+                        help="bytes per synthetic file (default: 4 MiB)")
+    parser.add_argument("--latency-ms", type=float, default=20,
+                        help="server latency per request (default: 20)")
+    parser.add_argument("--bandwidth", type=int, default=4 * 1024 * 1024,
+                        help="bytes/sec per connection, 0 = unlimited (default: 4 MiB/s)")
+    parser.add_argument("--lease", type=float, default=3.0,
+                        help="lease seconds (default: 3)")
+    parser.add_argument("--kill-after", type=float, default=0,
+                        help="kill the first worker once it holds a lease and this many seconds have passed, "
+                             "0 = never (default)")
+    parser.add_argument("--output", default="bench_cluster.json",
+                        help="results file (default: bench_cluster.json)")
+    return parser.parse_args(argv)
+
+
+# Seconds a worker gets to shut down before it is killed
+STOP_TIMEOUT = 10.0
+
+
+def _worker_name(number):
+    return f"bench-worker-{number}"
+
+
+def _worker_main(url, directory, slots, name, shutdown):
+    """Entry point of a worker process: serve jobs until shutdown is set"""
+    downloader = make_downloader(
+        'thread', session_options=dict(SESSION_OPTIONS, quiet=True, noprogress=True), max_idle_sessions=slots
+    )
+    downloader.warm_up(slots)
+    worker = RemoteWorker(url, downloader, slots=slots, download_path=directory, worker_id=name)
+    try:
+        worker.start()
+        shutdown.wait()
+        worker.stop()
+        worker.join()
+    finally:
+        # Shuts down the post-processing pool, whose processes would otherwise outlive the worker
+        worker.close()
+        downloader.close()
+
+
+def run(args, server, directory):
+    """Download every item through the coordinator and summarize the run"""
+    collector = RecordCollector()
+    queue_manager = QueueManager()
+    coordinator = Coordinator(queue_manager, lease_seconds=args.lease, metrics=MetricsRegistry([collector]))
+    coordinator_server = CoordinatorServer(coordinator)
+    coordinator_server.start()
+
+    context = multiprocessing.get_context('spawn')
+    # One event per worker: setting an event another process died waiting on would block
+    shutdowns = [context.Event() for _ in range(args.workers)]
+    workers = [
+        # Not daemonic: a worker runs its own post-processing pool
+        context.Process(
+            target=_worker_main,
+            args=(coordinator_server.url, directory, args.slots, _worker_name(number), shutdowns[number])
+        )
+        for number in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    names = sorted(server.files)
+    queue_manager.add_items([server.watch_url(name) for name in names], "1080p", directory)
+
+    started = time.perf_counter()
+    coordinator.start()
+    killed = False
+    while not coordinator.drain(timeout=0.1):
+        if (args.kill_after and not killed and time.perf_counter() - started >= args.kill_after
+                and _worker_name(0) in coordinator.leases().values()):
+            # Mid-download, so the requeue path is exercised
+            workers[0].kill()
+            workers[0].join()
+            killed = True
+    wall = time.perf_counter() - started
+
+    for worker, shutdown in zip(workers, shutdowns):
+        if worker.is_alive():
+            shutdown.set()
+    for worker in workers:
+        worker.join(STOP_TIMEOUT)
+        if worker.is_alive():
+            worker.kill()
+            worker.join()
+    coordinator.close()
+    coordinator_server.close()
+
+    completed = [record for record in collector.records if record['status'] == 'completed']
+    total_bytes = sum(record['bytes'] or 0 for record in completed)
+    return {
+        'workers': args.workers,
+        'slots': args.slots,
+        'items': len(names),
+        'completed': len(completed),
+        'requeued': sum(1 for item in queue_manager.get_items() if item['attempts'] > 1),
+        'killed_worker': killed,
+        'wall_seconds': wall,
+        'throughput_bps': total_bytes / wall if wall else 0,
+        'items_per_second': len(completed) / wall if wall else 0,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_yt_dlp()
+
+    names = [f"cluster-{i}" for i in range(args.items)]
+    with MediaServer(
+        {name: args.file_size for name in names},
+        latency=args.latency_ms / 1000,
+        bandwidth=args.bandwidth
+    ) as server, tempfile.TemporaryDirectory() as directory:
+        result = run(args, server, directory)
+
+    print(
+        f"{result['workers']} workers x {result['slots']} slots: "
+        f"{result['completed']}/{result['items']} completed, {result['requeued']} requeued, "
+        f"{result['throughput_bps'] / 1024 / 1024:.1f} MiB/s, {result['items_per_second']:.1f} items/s"
+    )
+
+    report = {
+        'benchmark': 'cluster',
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'yt_dlp': load_yt_dlp().version.__version__,
+            'cpus': os.cpu_count(),
+        },
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'result': result,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
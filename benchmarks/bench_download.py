@@ -0,0 +1,240 @@
+"""
+End-to-end download benchmark against the local media server
+
+Runs the real pipeline (QueueManager, DownloadScheduler, VideoDownloader
+with pooled yt-dlp sessions and the post-processing stage) on synthetic
+files served with configurable latency and bandwidth shaping. Extraction
+goes through a fake yt-dlp extractor, so no network access is needed.
+
+For each concurrency level it reports:
+  - throughput: total bytes / wall time
+  - overhead: mean per-item time outside the transfer itself
+    (extraction, time to first byte, merge, post-processing)
+  - fairness: Jain's index over per-item average throughput (1.0 = even)
+  - memory: peak resident set size growth during the run
+
+Results are written as JSON; pass --compare to print the change against
+an earlier results file.
+
+Usage:
+    python -m benchmarks.bench_download [--concurrency 1 8 64] [--backend process] [--output FILE] [--compare OLD]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+# The fake extractor is a yt-dlp plugin under benchmarks/yt_dlp_plugins/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.media_server import MediaServer
+from src.core.downloader import BACKENDS, SESSION_OPTIONS, MAX_SEGMENTS, load_yt_dlp, make_downloader
+from src.core.metrics import MetricsRegistry
+from src.core.queue_manager import QueueManager
+from src.core.scheduler import DownloadScheduler
+
+OVERHEAD_STAGES = ('extract', 'ttfb', 'merge', 'postprocess')
+MEMORY_SAMPLE_INTERVAL = 0.05
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 64],
+                        help="concurrent downloads to test (default: 1 8 64)")
+    parser.add_argument("--items-per-worker", type=int, default=4,
+                        help="queued items per concurrent download (default: 4)")
+    parser.add_argument("--file-size", type=int, default=1024 * 1024,
+                        help="bytes per synthetic file (default: 1 MiB)")
+    parser.add_argument("--latency-ms", type=float, default=20,
+                        help="server latency per request (default: 20)")
+    parser.add_argument("--bandwidth", type=int, default=4 * 1024 * 1024,
+                        help="bytes/sec per connection, 0 = unlimited (default: 4 MiB/s)")
+    parser.add_argument("--total-bandwidth", type=int, default=0,
+                        help="bytes/sec for the whole server, 0 = unlimited (default)")
+    parser.add_argument("--segments", type=int, default=MAX_SEGMENTS,
+                        help=f"connections per file of 16 MiB or more, 1 = off (default: {MAX_SEGMENTS})")
+    parser.add_argument("--backend", choices=BACKENDS, default="thread",
+                        help="run downloads on threads (default) or in worker processes")
+    parser.add_argument("--output", default="bench_download.json",
+                        help="results file (default: bench_download.json)")
+    parser.add_argument("--compare", metavar="OLD",
+                        help="earlier results file to compare against")
+    return parser.parse_args(argv)
+
+
+class MemorySampler:
+    """Samples resident set size on a background thread (Linux /proc; None elsewhere)"""
+
+    def __init__(self):
+        self.baseline = self._rss()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        if self.baseline is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    @property
+    def growth(self):
+        """Peak RSS above the baseline in bytes, or None if unsupported"""
+        if self.baseline is None:
+            return None
+        return self.peak - self.baseline
+
+    def _run(self):
+        while not self._stop.wait(MEMORY_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, self._rss())
+
+    @staticmethod
+    def _rss():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+
+class RecordCollector:
+    """Metrics sink keeping every item record of a run"""
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def jain_index(values):
+    """Jain's fairness index: 1.0 when all values are equal, 1/n at worst"""
+    values = [value for value in values if value > 0]
+    if not values:
+        return None
+    return sum(values) ** 2 / (len(values) * sum(value * value for value in values))
+
+
+def run_level(server, concurrency, names, directory, segments=MAX_SEGMENTS, backend='thread'):
+    """Download every name with `concurrency` workers and summarize the run"""
+    collector = RecordCollector()
+    metrics = MetricsRegistry([collector])
+    queue_manager = QueueManager()
+    downloader = make_downloader(
+        backend,
+        session_options=dict(SESSION_OPTIONS, quiet=True, noprogress=True, max_segments=segments),
+        max_idle_sessions=concurrency
+    )
+    scheduler = DownloadScheduler(queue_manager, downloader, max_workers=concurrency, metrics=metrics)
+
+    # Build the sessions (and worker processes) up front so the run measures steady-state downloads
+    downloader.warm_up(concurrency)
+    queue_manager.add_items([server.watch_url(name) for name in names], "1080p", directory)
+
+    with MemorySampler() as memory:
+        started = time.perf_counter()
+        scheduler.start()
+        scheduler.drain()
+        wall = time.perf_counter() - started
+    scheduler.close()
+    downloader.close()
+
+    completed = [record for record in collector.records if record['status'] == 'completed']
+    total_bytes = sum(record['bytes'] for record in completed)
+    overheads = [
+        sum(record[stage + '_seconds'] or 0 for stage in OVERHEAD_STAGES)
+        for record in completed
+    ]
+
+    return {
+        'concurrency': concurrency,
+        'items': len(names),
+        'completed': len(completed),
+        'wall_seconds': wall,
+        'throughput_bps': total_bytes / wall if wall else 0,
+        'items_per_second': len(completed) / wall if wall else 0,
+        'overhead_ms_mean': sum(overheads) / len(overheads) * 1000 if overheads else None,
+        'overhead_ms_max': max(overheads) * 1000 if overheads else None,
+        'fairness': jain_index([record['avg_bps'] for record in completed]),
+        'rss_growth_bytes': memory.growth,
+        'connections': server.connections,
+    }
+
+
+def compare(results, old_path):
+    """Print per-level changes against an earlier results file"""
+    with open(old_path, encoding="utf-8") as f:
+        old = {level['concurrency']: level for level in json.load(f)['results']}
+
+    print(f"\nvs {old_path}")
+    for level in results:
+        before = old.get(level['concurrency'])
+        if not before:
+            continue
+        changes = []
+        for key, label in (('throughput_bps', 'throughput'), ('overhead_ms_mean', 'overhead'),
+                           ('rss_growth_bytes', 'memory')):
+            if before.get(key) and level.get(key) is not None:
+                changes.append(f"{label} {(level[key] / before[key] - 1) * 100:+.1f}%")
+        print(f"  x{level['concurrency']:<4} " + ", ".join(changes))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_yt_dlp()
+
+    results = []
+    for concurrency in args.concurrency:
+        names = [f"c{concurrency}-{i}" for i in range(concurrency * args.items_per_worker)]
+        with MediaServer(
+            {name: args.file_size for name in names},
+            latency=args.latency_ms / 1000,
+            bandwidth=args.bandwidth,
+            total_bandwidth=args.total_bandwidth
+        ) as server, tempfile.TemporaryDirectory() as directory:
+            results.append(run_level(server, concurrency, names, directory, args.segments, args.backend))
+
+    print(f"{'workers':>8}{'items':>7}{'MiB/s':>9}{'items/s':>9}{'overhead ms':>13}{'fairness':>10}{'RSS +MiB':>10}")
+    for level in results:
+        overhead = level['overhead_ms_mean']
+        fairness = level['fairness']
+        rss = level['rss_growth_bytes']
+        print(
+            f"{level['concurrency']:>8}{level['completed']:>7}"
+            f"{level['throughput_bps'] / 1024 / 1024:>9.1f}{level['items_per_second']:>9.1f}"
+            f"{overhead if overhead is not None else float('nan'):>13.1f}"
+            f"{fairness if fairness is not None else float('nan'):>10.3f}"
+            f"{rss / 1024 / 1024 if rss is not None else float('nan'):>10.1f}"
+        )
+
+    report = {
+        'benchmark': 'download',
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'yt_dlp': load_yt_dlp().version.__version__,
+            'cpus': os.cpu_count(),
+        },
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+QueueManager microbenchmark
+
+Measures the cost of the operations the UI calls on every click as the
+queue grows from 1k to 100k items. Per-operation times should stay flat.
+
+Usage:
+    python -m benchmarks.bench_queue_manager
+"""
+
+import random
+import time
+from src.core.queue_manager import QueueManager
+from src.utils.validators import parse_url_list
+
+SIZES = (1_000, 10_000, 100_000)
+SAMPLES = 1_000
+
+
+def _time_per_op(func, args_list):
+    """Average microseconds per call of func over args_list"""
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def run(size):
+    """Benchmark a queue holding `size` items"""
+    manager = QueueManager()
+    add_us = _time_per_op(
+        manager.add_item,
+        [(f"https://youtu.be/{i:011d}", "720p", "./downloads") for i in range(size)]
+    )
+
+    ids = [item['id'] for item in manager.get_items()]
+    sample = random.sample(ids, SAMPLES)
+
+    claim_us = _time_per_op(manager.claim_next, [()] * SAMPLES)
+    complete_us = _time_per_op(manager.mark_completed, [(i,) for i in sample])
+    lookup_us = _time_per_op(manager.get_item, [(i,) for i in sample])
+    has_pending_us = _time_per_op(manager.has_pending, [()] * SAMPLES)
+    completed_ids_us = _time_per_op(manager.get_completed_ids, [()] * 10)
+    remove_us = _time_per_op(manager.remove_item, [(i,) for i in random.sample(ids, SAMPLES)])
+    clear_us = _time_per_op(manager.clear_completed, [()])
+
+    # Bulk import: validate a pasted block, then insert it as one batch
+    lines = [f"https://www.youtube.com/watch?v={i:011d}&si=share" for i in range(size)]
+    start = time.perf_counter()
+    accepted, _ = parse_url_list(lines)
+    parse_us = (time.perf_counter() - start) / size * 1e6
+    start = time.perf_counter()
+    QueueManager().add_items(accepted, "720p", "./downloads")
+    add_items_us = (time.perf_counter() - start) / size * 1e6
+
+    return {
+        'size': size,
+        'add_item': add_us,
+        'claim_next': claim_us,
+        'mark_completed': complete_us,
+        'get_item': lookup_us,
+        'has_pending': has_pending_us,
+        'get_completed_ids': completed_ids_us,
+        'remove_item': remove_us,
+        'clear_completed': clear_us,
+        'parse_url_list/url': parse_us,
+        'add_items/item': add_items_us,
+    }
+
+
+def main():
+    results = [run(size) for size in SIZES]
+    columns = [key for key in results[0] if key != 'size']
+
+    print(f"{'op (us/call)':<20}" + "".join(f"{r['size']:>12,}" for r in results))
+    for column in columns:
+        print(f"{column:<20}" + "".join(f"{r[column]:>12.2f}" for r in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Per-item overhead: fresh YoutubeDL per download vs. pooled sessions
+
+Downloads many small files from the local media server, once building a
+new YoutubeDL for each item (the old VideoDownloader behavior) and once
+through YoutubeDLSessionPool. Files are tiny, so the time per item is
+almost entirely setup, extraction and connection overhead.
+
+Usage:
+    python -m benchmarks.bench_sessions [items]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import yt_dlp
+from benchmarks.media_server import MediaServer
+from src.core.downloader import YoutubeDLSessionPool
+
+FILE_SIZE = 64 * 1024
+OPTIONS = {
+    'quiet': True,
+    'noprogress': True,
+    'continuedl': True,
+}
+
+
+def run_fresh(urls, directory):
+    """One YoutubeDL per item, as VideoDownloader used to do"""
+    for url in urls:
+        opts = dict(OPTIONS, format='best', outtmpl=os.path.join(directory, '%(title)s.%(ext)s'))
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            ydl.download([url])
+
+
+def run_pooled(urls, directory):
+    """All items through one warm pooled session"""
+    pool = YoutubeDLSessionPool(OPTIONS)
+    outtmpl = os.path.join(directory, '%(title)s.%(ext)s')
+    for url in urls:
+        with pool.session('best', outtmpl) as ydl:
+            ydl.download([url])
+    pool.close()
+
+
+def measure(runner, server, prefix, count):
+    urls = [server.url(f"{prefix}{i}") for i in range(count)]
+    connections_before = server.connections
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        runner(urls, directory)
+        elapsed = time.perf_counter() - start
+
+    return {
+        'per_item_ms': elapsed / count * 1000,
+        'connections': server.connections - connections_before,
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    files = {f"{prefix}{i}": FILE_SIZE for prefix in ('fresh', 'pooled') for i in range(count)}
+
+    with MediaServer(files) as server:
+        fresh = measure(run_fresh, server, 'fresh', count)
+        pooled = measure(run_pooled, server, 'pooled', count)
+
+    print(f"{'mode':<8}{'ms/item':>10}{'connections':>14}")
+    for name, result in (('fresh', fresh), ('pooled', pooled)):
+        print(f"{name:<8}{result['per_item_ms']:>10.1f}{result['connections']:>14}")
+    print(f"speedup: {fresh['per_item_ms'] / pooled['per_item_ms']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Startup-time benchmark and budget check
+
+Reports an `-X importtime` breakdown of the modules imported before the
+window can be built, and the wall time from process start until the
+first window has been drawn. Exits non-zero if a budget is exceeded or
+yt_dlp is imported on the startup path.
+
+Usage:
+    python -m benchmarks.bench_startup [--import-budget-ms N] [--window-budget-ms N]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Everything main() imports before constructing the window
+STARTUP_IMPORTS = (
+    "import customtkinter, main, src.ui.main_window, src.core.queue_store, src.core.metadata_cache, src.core.archive"
+)
+
+# Child script: build the window, draw one frame, report the wall clock and exit
+FIRST_WINDOW_SCRIPT = """
+import sys, time
+import customtkinter as ctk
+from src.ui.main_window import MainWindow
+app = MainWindow()
+app.update()
+print(time.time())
+print('yt_dlp' in sys.modules)
+app.destroy()
+"""
+
+
+def import_breakdown(top=15):
+    """
+    Run the startup imports under -X importtime
+
+    Returns:
+        tuple: (total microseconds, [(cumulative_us, module)], yt_dlp imported?)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_IMPORTS + "; import sys; print('yt_dlp' in sys.modules)"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        # Only top-level entries (no indentation) add up to the total
+        if not module.startswith("  "):
+            rows.append((int(cumulative), module.strip()))
+
+    total = sum(cumulative for cumulative, _ in rows)
+    rows.sort(reverse=True)
+    return total, rows[:top], result.stdout.strip() == "True"
+
+
+def time_to_first_window():
+    """
+    Wall time from spawning the app process to its first drawn frame
+
+    Returns:
+        tuple: (seconds or None if no display, yt_dlp imported?)
+    """
+    start = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_WINDOW_SCRIPT],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None, False
+    drawn_at, yt_dlp_loaded = result.stdout.split()
+    return float(drawn_at) - start, yt_dlp_loaded == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--import-budget-ms", type=float, default=None)
+    parser.add_argument("--window-budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    failures = []
+
+    total_us, rows, yt_dlp_in_imports = import_breakdown()
+    print(f"Startup imports: {total_us / 1000:.1f} ms")
+    for cumulative, module in rows:
+        print(f"  {cumulative / 1000:8.1f} ms  {module}")
+    if yt_dlp_in_imports:
+        failures.append("yt_dlp is imported on the startup path")
+    if args.import_budget_ms is not None and total_us / 1000 > args.import_budget_ms:
+        failures.append(f"imports took {total_us / 1000:.1f} ms (budget {args.import_budget_ms} ms)")
+
+    seconds, yt_dlp_in_window = time_to_first_window()
+    if seconds is None:
+        print("Time to first window: skipped (no display)")
+    else:
+        print(f"Time to first window: {seconds * 1000:.1f} ms")
+        if yt_dlp_in_window:
+            failures.append("yt_dlp was imported before the first window was drawn")
+        if args.window_budget_ms is not None and seconds * 1000 > args.window_budget_ms:
+            failures.append(f"first window took {seconds * 1000:.1f} ms (budget {args.window_budget_ms} ms)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Local HTTP stand-in for a media host, used by the benchmarks
+
+Serves synthetic files of a given size at /media/<name>.mp4 with HTTP/1.1
+keep-alive and byte-range support, and counts accepted connections so
+connection reuse can be measured. Each file also has a watch page URL
+(/watch/<name>) and a metadata document (/api/<name>.json) that the fake
+extractor in yt_dlp_plugins/ turns into a yt-dlp info dict.
+
+Responses can be shaped with a fixed latency per request and bandwidth
+caps per connection and for the whole server.
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.core.rate_limiter import TokenBucket
+
+_CHUNK = 64 * 1024
+# Repeating payload; content does not matter, only size
+_PATTERN = bytes(range(256)) * (_CHUNK // 256)
+_RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)')
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, media_server):
+        super().__init__(address, _Handler)
+        self.media_server = media_server
+
+    def process_request(self, request, client_address):
+        self.media_server._count_connection()
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections is expected here
+        pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        media = self.server.media_server
+        if media.latency:
+            time.sleep(media.latency)
+
+        api_match = re.match(r'^/api/([\w.-]+)\.json$', self.path)
+        if api_match:
+            self._serve_metadata(api_match.group(1), send_body)
+            return
+
+        match = re.match(r'^/media/([\w.-]+)\.mp4$', self.path)
+        size = media.files.get(match.group(1)) if match else None
+        if size is None:
+            self.send_error(404)
+            return
+
+        start, end, status = 0, size - 1, 200
+        range_match = _RANGE_RE.match(self.headers.get('Range', ''))
+        if range_match:
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2) or end), size - 1)
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        if send_body:
+            self._send_range(start, end)
+
+    def _serve_metadata(self, name, send_body):
+        media = self.server.media_server
+        if name not in media.files:
+            self.send_error(404)
+            return
+
+        body = json.dumps(media.metadata(name)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_range(self, start, end):
+        media = self.server.media_server
+        remaining = end - start + 1
+        sent = 0
+        started = time.monotonic()
+        try:
+            while remaining > 0:
+                chunk = _PATTERN[:min(_CHUNK, remaining)]
+                media.shared_bucket.consume(len(chunk))
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+                sent += len(chunk)
+
+                if media.bandwidth:
+                    # Hold this connection to its own rate
+                    delay = sent / media.bandwidth - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class MediaServer:
+    def __init__(self, files=None, latency=0.0, bandwidth=0, total_bandwidth=0):
+        """
+        Args:
+            files: Mapping of file name (without .mp4) to size in bytes
+            latency: Seconds added before every response
+            bandwidth: Bytes/sec per connection, 0 for unlimited
+            total_bandwidth: Bytes/sec shared by all connections, 0 for unlimited
+        """
+        self.files = dict(files or {})
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.shared_bucket = TokenBucket(total_bandwidth, burst=_CHUNK * 4)
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """Start serving on a free localhost port"""
+        self._httpd = _Server(('127.0.0.1', 0), self)
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def url(self, name):
+        """URL of a served file"""
+        return f"http://127.0.0.1:{self.port}/media/{name}.mp4"
+
+    def watch_url(self, name):
+        """Page URL of a served file, handled by the fake extractor"""
+        return f"http://127.0.0.1:{self.port}/watch/{name}"
+
+    def metadata(self, name):
+        """Metadata document for a file, shaped like a minimal yt-dlp info dict"""
+        return {
+            'id': name,
+            'title': name,
+            'formats': [{
+                'format_id': '720p',
+                'url': self.url(name),
+                'ext': 'mp4',
+                'width': 1280,
+                'height': 720,
+                'vcodec': 'avc1.64001f',
+                'acodec': 'mp4a.40.2',
+                'filesize': self.files[name],
+            }],
+        }
+
+    def _count_connection(self):
+        with self._lock:
+            self.connections += 1
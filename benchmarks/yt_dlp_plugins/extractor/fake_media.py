@@ -0,0 +1,22 @@
+"""
+yt-dlp extractor for the benchmark media server
+
+Loaded by yt-dlp's plugin mechanism when the benchmarks/ directory is on
+sys.path. Watch pages on 127.0.0.1 are resolved through the server's
+/api/<name>.json document, so extraction costs one HTTP round trip over
+the session's keep-alive connections, like a real site.
+"""
+
+from yt_dlp.extractor.common import InfoExtractor
+
+
+class FakeMediaIE(InfoExtractor):
+    IE_NAME = 'fakemedia'
+    _VALID_URL = r'https?://127\.0\.0\.1:(?P<port>\d+)/watch/(?P<id>[\w.-]+)'
+
+    def _real_extract(self, url):
+        port, video_id = self._match_valid_url(url).group('port', 'id')
+        info = self._download_json(
+            f'http://127.0.0.1:{port}/api/{video_id}.json', video_id, note='Downloading metadata')
+        info['webpage_url'] = url
+        return info
@@ -0,0 +1,17 @@
+"""
+YouTube Downloader - Headless Entry Point
+Batch-download URLs from a file or stdin without the desktop UI
+
+Usage:
+    python cli.py urls.txt -j 4 -q 720p
+    cat urls.txt | python cli.py --json
+"""
+
+import multiprocessing
+import sys
+from src.cli import main
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -3,10 +3,9 @@ YouTube Downloader - Main Entry Point
 A modern desktop application for downloading YouTube videos and playlists
 """
 
-import customtkinter as ctk
-from src.ui.main_window import MainWindow
-from src.utils.logger import setup_logger
+import multiprocessing
 import os
+from src.utils.logger import setup_logger
 
 
 def main():
@@ -17,15 +16,64 @@ def main():
     # Create necessary directories
     os.makedirs("downloads", exist_ok=True)
     os.makedirs("logs", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+
+    # UI and storage modules are imported here so `import main` stays cheap;
+    # yt-dlp itself is loaded in the background after the window appears
+    import customtkinter as ctk
+    from src.ui.main_window import MainWindow
+    from src.core.queue_store import QueueStore
+    from src.core.metadata_cache import MetadataCache
+    from src.core.archive import DownloadArchive
+    from src.core.metrics import MetricsRegistry, LoggingSink, JsonLinesSink
+    from src.core.rate_limiter import parse_rate
+    from src.core.scheduling import POLICIES
+    from src.core.downloader import BACKENDS
 
     # Set appearance
     ctk.set_appearance_mode("dark")
     ctk.set_default_color_theme("blue")
 
+    # Optional startup limits; both can be changed later from the options section
+    try:
+        rate_limit = parse_rate(os.environ.get("YTD_RATE_LIMIT", ""))
+        max_per_host = int(os.environ.get("YTD_MAX_PER_HOST") or 0)
+    except ValueError as e:
+        logger.error(f"Ignoring invalid limit setting: {str(e)}")
+        rate_limit, max_per_host = 0, 0
+
+    # Queue order: priority (default), sjf (smallest expected download first) or fifo
+    scheduling_policy = os.environ.get("YTD_SCHEDULING") or "priority"
+    if scheduling_policy not in POLICIES:
+        logger.error(f"Ignoring unknown scheduling policy: {scheduling_policy}")
+        scheduling_policy = "priority"
+
+    # Download engine: thread (default) or process (each download in a worker process)
+    download_backend = os.environ.get("YTD_BACKEND") or "thread"
+    if download_backend not in BACKENDS:
+        logger.error(f"Ignoring unknown download backend: {download_backend}")
+        download_backend = "thread"
+
     # Launch application
-    app = MainWindow()
+    # Queue is journaled so pending and interrupted items survive a restart
+    # Extracted metadata is cached so retries and re-queues skip extraction
+    app = MainWindow(
+        queue_store=QueueStore(os.path.join("data", "queue.db")),
+        metadata_cache=MetadataCache(os.path.join("data", "metadata.db")),
+        rate_limit=rate_limit,
+        max_per_host=max_per_host,
+        # Completed videos are remembered so re-adding them is a no-op
+        archive=DownloadArchive(os.path.join("data", "archive.db")),
+        # One JSON record per finished download, for finding where time goes
+        metrics=MetricsRegistry([LoggingSink(), JsonLinesSink(os.path.join("data", "metrics.jsonl"))]),
+        scheduling_policy=scheduling_policy,
+        download_backend=download_backend
+    )
     app.mainloop()
 
 
 if __name__ == "__main__":
+    # Post-processing (and the process download backend) run in worker processes;
+    # needed for frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     main()
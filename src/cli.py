@@ -0,0 +1,383 @@
+"""
+Headless batch downloader
+
+Reads URLs from a file or stdin and runs them through the same queue,
+scheduler and downloader as the desktop app. Never imports the UI stack
+(customtkinter, tkinter, Pillow), so it runs on bare servers and in cron.
+
+With --serve the queue is handed out to --worker processes, on this host
+or others, instead of being downloaded locally (see core/coordinator.py).
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from src.core.archive import DownloadArchive
+from src.core.coordinator import Coordinator, CoordinatorServer, LEASE_SECONDS
+from src.core.downloader import BACKENDS, SESSION_OPTIONS, MAX_SEGMENTS, make_downloader
+from src.core.metrics import MetricsRegistry, LoggingSink
+from src.core.playlist_expander import PlaylistExpander
+from src.core.queue_manager import QueueManager
+from src.core.remote_worker import RemoteWorker
+from src.core.rate_limiter import TokenBucket, HostLimiter, parse_rate
+from src.core.retry import RetryPolicy
+from src.core.scheduler import DownloadScheduler
+from src.core.scheduling import POLICIES, make_policy
+from src.core.storage import ACTIVE_STAGING_SECONDS, discard_staging, staging_dir, sweep_staging
+from src.utils.logger import setup_logger
+from src.utils.validators import parse_url_list
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+# Minimum seconds between progress lines for one item
+PROGRESS_INTERVAL = 1.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Download YouTube videos and playlists without the GUI"
+    )
+    parser.add_argument("input", nargs="?", default="-",
+                        help="file with one URL per line, or - for stdin (default)")
+    parser.add_argument("-q", "--quality", default="1080p",
+                        help="maximum video height, e.g. 720p (default: 1080p)")
+    parser.add_argument("-o", "--output", default="./downloads",
+                        help="download directory (default: ./downloads)")
+    parser.add_argument("-j", "--jobs", type=int, default=3,
+                        help="concurrent downloads (default: 3)")
+    parser.add_argument("--postprocess-jobs", type=int, default=None,
+                        help="concurrent ffmpeg jobs (default: number of CPU cores)")
+    parser.add_argument("--segments", type=int, default=MAX_SEGMENTS,
+                        help=f"connections per large file or fragmented stream, 1 = off (default: {MAX_SEGMENTS})")
+    parser.add_argument("--backend", choices=BACKENDS, default=None,
+                        help="run downloads on threads or in worker processes (default: thread, or $YTD_BACKEND)")
+    parser.add_argument("-r", "--limit-rate", type=parse_rate, default=0, metavar="RATE",
+                        help="total bandwidth cap across all downloads, e.g. 500K or 2M (default: unlimited)")
+    parser.add_argument("--max-per-host", type=int, default=0,
+                        help="concurrent connections per host, segments included (default: unlimited)")
+    parser.add_argument("--order", choices=list(POLICIES), default="fifo",
+                        help="download order: fifo (default), priority, or sjf (smallest expected first)")
+    parser.add_argument("--retries", type=int, default=4,
+                        help="retries per item for network, server and throttling errors (default: 4)")
+    parser.add_argument("--archive", metavar="FILE",
+                        help="download archive database; videos already in it are skipped")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="write a metrics snapshot on exit (.prom for Prometheus text, otherwise JSON)")
+    parser.add_argument("--json", action="store_true",
+                        help="emit one JSON object per event instead of text lines")
+    parser.add_argument("--serve", type=parse_address, metavar="[HOST:]PORT",
+                        help="queue the input for --worker processes instead of downloading it here")
+    parser.add_argument("--worker", metavar="URL",
+                        help="download jobs leased from the coordinator at URL, saving into -o; no input is read")
+    parser.add_argument("--token", default=None,
+                        help="shared secret between coordinator and workers (default: $YTD_COORDINATOR_TOKEN)")
+    parser.add_argument("--lease", type=float, default=LEASE_SECONDS,
+                        help=f"seconds before a silent worker's job is requeued (default: {LEASE_SECONDS:.0f})")
+    parser.add_argument("--log-format", choices=("text", "json"), default=None,
+                        help="log file format (default: text, or $YTD_LOG_FORMAT)")
+    return parser.parse_args(argv)
+
+
+def parse_address(value):
+    """Parse --serve's [HOST:]PORT; the host defaults to 127.0.0.1"""
+    host, _, port = value.rpartition(":")
+    try:
+        return host or "127.0.0.1", int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid address: {value!r}")
+
+
+def read_urls(source):
+    """Read the lines of a path, or of stdin for '-'"""
+    if source == "-":
+        return sys.stdin.read().splitlines()
+    with open(source, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+class Reporter:
+    """Writes line-oriented or JSON progress to stdout from any thread"""
+
+    def __init__(self, as_json, stream=None):
+        self.as_json = as_json
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+        self._last_progress = {}
+
+    def emit(self, event, item=None, text=None, **fields):
+        if self.as_json:
+            record = {'event': event, 'time': round(time.time(), 3)}
+            if item:
+                record.update({'id': item['id'], 'url': item['url']})
+            record.update(fields)
+            line = json.dumps(record)
+        else:
+            label = f" {item['url']}" if item else ""
+            line = f"[{event}]{label}" + (f" {text}" if text else "")
+
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def on_start(self, item):
+        self.emit("start", item)
+
+    def on_progress(self, item, progress_data):
+        now = time.monotonic()
+        if now - self._last_progress.get(item['id'], 0) < PROGRESS_INTERVAL:
+            return
+        self._last_progress[item['id']] = now
+
+        percent = progress_data['downloaded_bytes'] / progress_data['total_bytes'] * 100
+        speed = progress_data.get('speed') or 0
+        self.emit(
+            "progress", item,
+            text=f"{percent:5.1f}% {speed / 1024:,.0f} KiB/s",
+            percent=round(percent, 1),
+            downloaded_bytes=progress_data['downloaded_bytes'],
+            total_bytes=progress_data['total_bytes'],
+            speed=speed,
+            eta=progress_data.get('eta')
+        )
+
+    def on_finish(self, item, result):
+        self._last_progress.pop(item['id'], None)
+        timings = {stage: round(seconds, 3) for stage, seconds in result.timings.items()}
+        text = result.error or ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in timings.items())
+        self.emit(
+            result.status, item, text=text,
+            error=result.error, error_kind=result.error_kind,
+            files=result.files, timings=timings, stats=result.stats
+        )
+
+    def on_retry(self, item, result, delay):
+        self._last_progress.pop(item['id'], None)
+        self.emit(
+            "retry", item,
+            text=f"{result.error_kind}, attempt {item['attempts']} failed, retrying in {delay:.0f}s",
+            error=result.error, error_kind=result.error_kind,
+            attempt=item['attempts'], delay=round(delay, 1)
+        )
+
+
+def run(args, lines):
+    """Queue the URLs, download them and return an exit code"""
+    reporter = Reporter(args.json)
+
+    archive = DownloadArchive(args.archive) if args.archive else None
+    queue_manager = QueueManager(archive=archive, policy=make_policy(args.order))
+    server = None
+    if args.serve:
+        # Workers download; this process only hands out the queue
+        downloader = None
+        scheduler = Coordinator(
+            queue_manager,
+            lease_seconds=args.lease,
+            on_start=reporter.on_start,
+            on_progress=reporter.on_progress,
+            on_finish=reporter.on_finish,
+            on_retry=reporter.on_retry,
+            metrics=MetricsRegistry([LoggingSink()]),
+            retry_policy=RetryPolicy(max_attempts=args.retries + 1),
+            archive=archive
+        )
+        host, port = args.serve
+        server = CoordinatorServer(scheduler, host, port, token=args.token)
+    else:
+        downloader = make_local_downloader(args, archive)
+        scheduler = DownloadScheduler(
+            queue_manager,
+            downloader,
+            max_workers=args.jobs,
+            max_postprocess=args.postprocess_jobs,
+            on_start=reporter.on_start,
+            on_progress=reporter.on_progress,
+            on_finish=reporter.on_finish,
+            on_retry=reporter.on_retry,
+            metrics=MetricsRegistry([LoggingSink()]),
+            retry_policy=RetryPolicy(max_attempts=args.retries + 1)
+        )
+
+    accepted, rejected = parse_url_list(lines)
+    if rejected:
+        reporter.emit(
+            "rejected",
+            text=f"{len(rejected)} lines: " + ", ".join(f"{number}: {text}" for number, text in rejected),
+            count=len(rejected),
+            lines=[{'line': number, 'text': text} for number, text in rejected]
+        )
+
+    if not accepted:
+        reporter.emit("error", text="no valid URLs given", message="no valid URLs given")
+        return EXIT_USAGE
+
+    videos = [entry for entry in accepted if not entry['playlist_id']]
+    playlists = [entry['url'] for entry in accepted if entry['playlist_id']]
+
+    if downloader:
+        sweep_output(args, queue_manager)
+    scheduler.start()
+    if server:
+        server.start()
+        reporter.emit("serving", text=server.url, url=server.url)
+    expander = PlaylistExpander(queue_manager)
+    try:
+        # Single videos go in as one batch and start right away
+        _, skipped = queue_manager.add_items(videos, args.quality, args.output)
+        scheduler.wake()
+        if skipped['queued'] or skipped['archived']:
+            reporter.emit(
+                "skipped",
+                text=f"{skipped['queued']} duplicates, {skipped['archived']} already downloaded",
+                **skipped
+            )
+
+        for url in playlists:
+            # Entries start downloading while the playlist is still being listed
+            expander.expand(url, args.quality, args.output, on_added=lambda item_id: scheduler.wake())
+
+        while not scheduler.drain(timeout=0.5):
+            pass
+    except KeyboardInterrupt:
+        scheduler.stop()
+        queue_manager.move_all('pending', 'cancelled')
+        queue_manager.move_all('retrying', 'cancelled')
+        (downloader or scheduler).cancel_all()
+        scheduler.drain(timeout=10)
+        reporter.emit("interrupted")
+        return EXIT_INTERRUPTED
+    finally:
+        if server:
+            server.close()
+        scheduler.close()
+        if downloader:
+            downloader.close()
+        if archive:
+            archive.close()
+        if args.metrics:
+            scheduler.metrics.write(args.metrics)
+
+    if downloader:
+        # The queue is not saved, so nothing can resume these partial files
+        for item in queue_manager.get_items('failed'):
+            discard_staging(staging_dir(item['download_path'], item['id']))
+
+    completed = queue_manager.count('completed')
+    failed = queue_manager.count('failed')
+    reporter.emit(
+        "summary",
+        text=f"{completed} completed, {failed} failed, {len(rejected)} rejected",
+        completed=completed,
+        failed=failed,
+        rejected=len(rejected)
+    )
+    return EXIT_OK if not failed and not rejected else EXIT_FAILED
+
+
+def make_local_downloader(args, archive=None):
+    """The downloader configured by the command line"""
+    return make_downloader(
+        args.backend,
+        session_options=dict(
+            SESSION_OPTIONS,
+            quiet=True,
+            noprogress=True,
+            max_segments=args.segments,
+            concurrent_fragment_downloads=args.segments
+        ),
+        rate_limiter=TokenBucket(args.limit_rate),
+        host_limiter=HostLimiter(args.max_per_host),
+        archive=archive
+    )
+
+
+def sweep_output(args, queue_manager=None):
+    """
+    Delete partial downloads an earlier failed or interrupted run left in the output folder
+
+    Staging still being written is kept, since another CLI process or
+    worker may be using the same folder.
+    """
+    keep = {item['id'] for item in queue_manager.get_items()} if queue_manager else set()
+    sweep_staging([args.output], keep, min_age=ACTIVE_STAGING_SECONDS)
+
+
+def run_worker(args):
+    """Serve a coordinator's jobs until it goes away and return an exit code"""
+    reporter = Reporter(args.json)
+    archive = DownloadArchive(args.archive) if args.archive else None
+    downloader = make_local_downloader(args, archive)
+    worker = RemoteWorker(
+        args.worker,
+        downloader,
+        slots=args.jobs,
+        download_path=args.output,
+        token=args.token,
+        max_postprocess=args.postprocess_jobs,
+        on_start=reporter.on_start,
+        on_progress=reporter.on_progress,
+        on_finish=reporter.on_finish
+    )
+    reporter.emit("worker", text=f"{worker.worker_id} -> {args.worker}", worker=worker.worker_id)
+    sweep_output(args)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        # Running jobs are paused and handed back for other workers
+        worker.stop()
+        worker.join()
+        reporter.emit("interrupted")
+        return EXIT_INTERRUPTED
+    finally:
+        worker.close()
+        downloader.close()
+        if archive:
+            archive.close()
+    if worker.error:
+        reporter.emit("error", text=worker.error, message=worker.error)
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.jobs < 1 or args.segments < 1 or (args.postprocess_jobs is not None and args.postprocess_jobs < 1):
+        print("--jobs, --segments and --postprocess-jobs must be at least 1", file=sys.stderr)
+        return EXIT_USAGE
+    if args.max_per_host < 0 or args.retries < 0:
+        print("--max-per-host and --retries must not be negative", file=sys.stderr)
+        return EXIT_USAGE
+
+    args.backend = args.backend or os.environ.get("YTD_BACKEND") or "thread"
+    if args.backend not in BACKENDS:
+        print(f"Unknown YTD_BACKEND: {args.backend} (choose from {', '.join(BACKENDS)})", file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.serve and args.worker:
+        print("--serve and --worker cannot be combined", file=sys.stderr)
+        return EXIT_USAGE
+    if args.lease <= 0:
+        print("--lease must be positive", file=sys.stderr)
+        return EXIT_USAGE
+    args.token = args.token or os.environ.get("YTD_COORDINATOR_TOKEN")
+
+    if args.worker:
+        setup_logger(json_format=None if args.log_format is None else args.log_format == "json")
+        return run_worker(args)
+
+    try:
+        lines = read_urls(args.input)
+    except OSError as e:
+        print(f"Cannot read input: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    setup_logger(json_format=None if args.log_format is None else args.log_format == "json")
+    return run(args, lines)
@@ -0,0 +1,124 @@
+"""
+Persistent archive of completed downloads, keyed by video ID
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+
+def quality_height(quality):
+    """Height in pixels of a quality label such as "1080p", or 0 if unknown"""
+    try:
+        return int(str(quality).split()[0].rstrip('p'))
+    except ValueError:
+        return 0
+
+
+class DownloadArchive:
+    def __init__(self, path=None):
+        """
+        Record which videos have been downloaded, and at what quality
+
+        Lookups are answered from an in-memory index (video_id -> best
+        height) loaded once at startup, so duplicate checks never touch
+        the disk or the network. Rows are written through to SQLite.
+
+        Args:
+            path: SQLite file for the persistent archive, None for memory only
+        """
+        self._index = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS archive ("
+                " video_id TEXT NOT NULL,"
+                " quality TEXT NOT NULL,"
+                " height INTEGER NOT NULL,"
+                " format_id TEXT,"
+                " path TEXT,"
+                " completed_at REAL NOT NULL,"
+                " PRIMARY KEY (video_id, quality))"
+            )
+            self._conn.commit()
+            for video_id, height in self._conn.execute(
+                "SELECT video_id, MAX(height) FROM archive GROUP BY video_id"
+            ):
+                self._index[video_id] = height
+
+        if self._index:
+            logger.info(f"Loaded download archive with {len(self._index)} videos")
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, video_id):
+        return video_id in self._index
+
+    def contains(self, video_id, quality=None):
+        """
+        Check whether a video was already downloaded
+
+        Args:
+            video_id: YouTube video ID
+            quality: Requested quality; a download at this height or higher counts
+
+        Returns:
+            bool: True if the archive already covers the request
+        """
+        height = self._index.get(video_id)
+        if height is None:
+            return False
+        return quality is None or height >= quality_height(quality)
+
+    def add(self, video_id, quality, format_id=None, path=None):
+        """Record a completed download"""
+        height = quality_height(quality)
+        with self._lock:
+            self._index[video_id] = max(self._index.get(video_id, 0), height)
+            if self._conn:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO archive"
+                        " (video_id, quality, height, format_id, path, completed_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (video_id, quality, height, format_id, path, time.time())
+                    )
+
+    def get(self, video_id):
+        """
+        Get archived downloads of a video, best quality first
+
+        Returns:
+            list: Dicts with quality, format_id, path and completed_at
+        """
+        if video_id not in self._index or not self._conn:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT quality, format_id, path, completed_at FROM archive"
+                " WHERE video_id = ? ORDER BY height DESC",
+                (video_id,)
+            ).fetchall()
+        return [
+            {'quality': quality, 'format_id': format_id, 'path': path, 'completed_at': completed_at}
+            for quality, format_id, path, completed_at in rows
+        ]
+
+    def close(self):
+        """Close the persistent archive"""
+        if self._conn:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
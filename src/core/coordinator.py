@@ -0,0 +1,507 @@
+"""
+Coordinator serving a QueueManager to download workers over HTTP
+
+Workers on this or other hosts (see remote_worker.py) lease one item at a
+time, send heartbeats while they download and post-process it, and report
+the result. A lease that is not renewed in time is taken back and the item
+is requeued, so a job whose worker died runs again elsewhere.
+
+Endpoints (JSON bodies and responses):
+    POST /lease      {worker}                          -> job, or 204 when idle
+    POST /heartbeat  {worker, id, phase, progress}     -> {action}
+    POST /complete   {worker, id, result}              -> {accepted}
+    POST /release    {worker, id}                      -> {accepted}
+    GET  /status                                       -> item counts by status
+
+Heartbeat actions are None, 'paused' or 'cancelled' (stop the job and
+report it) or 'lost' (the lease expired; drop the job without reporting).
+"""
+
+import heapq
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.core.downloader import DownloadResult
+from src.core.metrics import MetricsRegistry
+from src.core.rate_limiter import host_key
+from src.core.retry import RetryPolicy, CircuitBreaker
+from src.utils.logger import get_logger
+from src.utils.validators import extract_video_id
+
+logger = get_logger()
+
+# Seconds a lease lasts without a heartbeat
+LEASE_SECONDS = 30.0
+# Seconds between checks for expired leases and due retries
+REAP_INTERVAL = 1.0
+# Header carrying the shared token, if the coordinator requires one
+TOKEN_HEADER = 'X-Coordinator-Token'
+
+# Item fields sent to a worker with its lease
+_JOB_FIELDS = ('id', 'url', 'quality', 'download_path', 'format_id', 'attempts')
+# Statuses of items a worker holds or will get again
+_LIVE_STATUSES = ('downloading', 'processing', 'retrying')
+# DownloadResult attributes carried by /complete
+RESULT_FIELDS = ('status', 'error', 'error_kind', 'retry_after', 'files', 'format_id', 'timings', 'stats')
+
+
+class Coordinator:
+    def __init__(self, queue_manager, lease_seconds=LEASE_SECONDS, on_start=None, on_progress=None,
+                 on_finish=None, on_retry=None, metrics=None, retry_policy=None, archive=None,
+                 circuit_breaker=None):
+        """
+        Hand out queued items to remote workers under time-limited leases
+
+        Has the lifecycle and pause/resume/cancel methods of
+        DownloadScheduler, so callers can run either. Like the scheduler,
+        it hands out no items on a host that is throttling the workers
+        until that host's circuit closes.
+
+        Args:
+            queue_manager: QueueManager supplying pending items
+            lease_seconds: Seconds a lease lasts without a heartbeat
+            on_start: Called with item when a worker leases it
+            on_progress: Called with (item, progress_data) on heartbeats
+            on_finish: Called with (item, result) when a worker reports an item done
+            on_retry: Called with (item, result, delay) when a failed item is scheduled to retry
+            metrics: MetricsRegistry receiving per-item records (one is created if omitted)
+            retry_policy: RetryPolicy for transient failures and lost workers (default: RetryPolicy())
+            archive: Optional DownloadArchive; completed videos are recorded in it
+            circuit_breaker: CircuitBreaker keyed by host (default: CircuitBreaker())
+        """
+        self.queue_manager = queue_manager
+        self.lease_seconds = lease_seconds
+        self.on_start = on_start
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.on_retry = on_retry
+        self.metrics = metrics or MetricsRegistry()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.archive = archive
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+        # item_id -> {'worker': id, 'started': monotonic lease time, 'expires': monotonic time,
+        #             'action': None/'paused'/'cancelled'}
+        self._leases = {}
+        # (monotonic due time, item_id) of items waiting to retry
+        self._retries = []
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._reaper = None
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """Start handing out leases and watching for expired ones"""
+        with self._cond:
+            self._running = True
+            self._cond.notify_all()
+        if self._reaper is None:
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._reap_loop, name="lease-reaper", daemon=True)
+            self._reaper.start()
+        logger.info(f"Coordinator started (lease {self.lease_seconds:.0f}s)")
+
+    def wake(self):
+        """Notify drain() waiters that items were queued"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def stop(self):
+        """Stop handing out new leases; leased items still report back"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        logger.info("Coordinator stopped")
+
+    def close(self):
+        """Stop the coordinator and its lease reaper"""
+        self.stop()
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join()
+            self._reaper = None
+
+    def drain(self, timeout=None):
+        """
+        Block until no item is pending, leased or waiting to retry
+
+        Returns:
+            bool: True if the queue drained, False on timeout
+        """
+        queue_manager = self.queue_manager
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: (not self._leases and not queue_manager.has_pending()
+                         and not any(queue_manager.count(status) for status in _LIVE_STATUSES)),
+                timeout
+            )
+
+    def lease(self, worker_id):
+        """
+        Lease the next pending item to a worker
+
+        Returns:
+            dict: The job (item fields plus 'lease_seconds'), or None if
+                nothing is pending or the coordinator is stopped
+        """
+        with self._cond:
+            if not self._running:
+                return None
+            item = self.queue_manager.claim_next(
+                skip=self.circuit_breaker.skip_open(lambda item: host_key(item['url']))
+            )
+            if item is None:
+                return None
+            self._leases[item['id']] = {
+                'worker': worker_id,
+                'started': time.monotonic(),
+                'expires': time.monotonic() + self.lease_seconds,
+                'action': None,
+            }
+        logger.info(f"Leased {item['url']} to {worker_id} (attempt {item['attempts']})")
+        if self.on_start:
+            self.on_start(item)
+
+        job = {field: item.get(field) for field in _JOB_FIELDS}
+        job['lease_seconds'] = self.lease_seconds
+        return job
+
+    def heartbeat(self, worker_id, item_id, phase='downloading', progress=None):
+        """
+        Renew a lease and record progress
+
+        Args:
+            worker_id: Worker holding the lease
+            item_id: Leased item
+            phase: 'downloading' or 'processing'
+            progress: Progress data as passed to download progress callbacks
+
+        Returns:
+            str: None to carry on, 'paused'/'cancelled' to stop the job, or
+                'lost' if the worker no longer holds the lease
+        """
+        with self._cond:
+            lease = self._leases.get(item_id)
+            if lease is None or lease['worker'] != worker_id:
+                return 'lost'
+            lease['expires'] = time.monotonic() + self.lease_seconds
+            action = lease['action']
+
+        item = self.queue_manager.get_item(item_id)
+        if item is None:
+            return 'cancelled'
+        if phase == 'processing' and item['status'] == 'downloading':
+            self.queue_manager.set_status(item_id, 'processing')
+        if progress and progress.get('total_bytes'):
+            self.queue_manager.update_progress(item_id, progress['downloaded_bytes'] / progress['total_bytes'] * 100)
+            if self.on_progress:
+                self.on_progress(item, progress)
+        return action
+
+    def complete(self, worker_id, item_id, result):
+        """
+        Record the outcome a worker reports for its leased item
+
+        Args:
+            worker_id: Worker holding the lease
+            item_id: Leased item
+            result: DownloadResult of the download and post-processing
+
+        Returns:
+            bool: False if the worker no longer held the lease (the report is ignored)
+        """
+        lease = self._end_lease(worker_id, item_id)
+        if lease is None:
+            logger.warning(f"Ignoring result for {item_id} from {worker_id}: lease no longer held")
+            return False
+        try:
+            self._record(worker_id, item_id, result, lease['started'])
+        finally:
+            self.wake()
+        return True
+
+    def _record(self, worker_id, item_id, result, started):
+        """Apply a reported result to its item; started is when its lease was granted"""
+        item = self.queue_manager.get_item(item_id)
+        if item is None:
+            return
+        if result.format_id and result.format_id != item.get('format_id'):
+            self.queue_manager.set_format(item_id, result.format_id)
+
+        host = host_key(item['url'])
+        if result.status in ('paused', 'cancelled'):
+            self.circuit_breaker.release(host, started)
+        else:
+            self.circuit_breaker.record(host, result.error_kind if result.status == 'failed' else None, started)
+
+        if result.status == 'failed' and self.retry_policy.should_retry(result.error_kind, item['attempts']):
+            self._schedule_retry(item, result)
+            return
+
+        self.queue_manager.set_status(item_id, result.status)
+        if self.archive and result.files:
+            video_id = extract_video_id(item['url'])
+            if video_id:
+                self.archive.add(video_id, item['quality'], format_id=result.format_id, path=result.files[0])
+        self.metrics.record_item(item, result)
+        logger.info(f"{worker_id} finished {item['url']}: {result.status}")
+        if self.on_finish:
+            self.on_finish(item, result)
+
+    def release(self, worker_id, item_id):
+        """Take back a lease a worker gives up (e.g. it is shutting down) and requeue the item"""
+        lease = self._end_lease(worker_id, item_id)
+        if lease is None:
+            return False
+        # Giving a job back is not a failed attempt
+        item = self.queue_manager.unclaim(item_id)
+        if item:
+            self.circuit_breaker.release(host_key(item['url']), lease['started'])
+            logger.info(f"{worker_id} released {item['url']}; requeued")
+        self.wake()
+        return True
+
+    def pause_item(self, item_id):
+        """Pause a pending or leased item; a leased one stops at its worker's next heartbeat"""
+        item = self.queue_manager.get_item(item_id)
+        if item is None:
+            return
+        if item['status'] in ('pending', 'retrying'):
+            self.queue_manager.set_status(item_id, 'paused')
+        else:
+            self._flag(item_id, 'paused')
+
+    def resume_item(self, item_id):
+        """Requeue a paused item; it resumes from its partial file if the same worker leases it"""
+        item = self.queue_manager.get_item(item_id)
+        if item and item['status'] == 'paused':
+            self.queue_manager.set_status(item_id, 'pending')
+            self.wake()
+
+    def cancel_item(self, item_id):
+        """Cancel a pending, paused, failed or leased item"""
+        item = self.queue_manager.get_item(item_id)
+        if item is None:
+            return
+        if item['status'] in ('pending', 'retrying', 'paused', 'failed'):
+            self.queue_manager.set_status(item_id, 'cancelled')
+        else:
+            self._flag(item_id, 'cancelled')
+
+    def pause_all(self):
+        """Pause every pending and leased item"""
+        self.queue_manager.move_all('pending', 'paused')
+        self.queue_manager.move_all('retrying', 'paused')
+        self._flag_all('paused')
+
+    def resume_all(self):
+        """Requeue every paused item"""
+        if self.queue_manager.move_all('paused', 'pending'):
+            self.wake()
+
+    def cancel_all(self):
+        """Cancel every leased item"""
+        self._flag_all('cancelled')
+
+    def status(self):
+        """Item counts by status, plus the number of leases held"""
+        counts = {status: self.queue_manager.count(status)
+                  for status in ('pending', 'downloading', 'processing', 'retrying', 'paused',
+                                 'failed', 'completed', 'cancelled')}
+        with self._cond:
+            counts['leases'] = len(self._leases)
+        return counts
+
+    def leases(self):
+        """Workers holding leases: {item_id: worker_id}"""
+        with self._cond:
+            return {item_id: lease['worker'] for item_id, lease in self._leases.items()}
+
+    def _flag(self, item_id, action):
+        """Ask the worker holding item_id to stop it"""
+        with self._cond:
+            lease = self._leases.get(item_id)
+            if lease is not None:
+                lease['action'] = action
+
+    def _flag_all(self, action):
+        with self._cond:
+            for lease in self._leases.values():
+                lease['action'] = action
+
+    def _end_lease(self, worker_id, item_id):
+        """Drop a lease held by worker_id and return it; None if it does not hold it"""
+        with self._cond:
+            lease = self._leases.get(item_id)
+            if lease is None or lease['worker'] != worker_id:
+                return None
+            return self._leases.pop(item_id)
+
+    def _schedule_retry(self, item, result):
+        """Park a failed item until its backoff delay has passed"""
+        delay = self.retry_policy.delay(item['attempts'], result.retry_after)
+        item['retry_at'] = time.time() + delay
+        self.queue_manager.set_status(item['id'], 'retrying')
+        with self._cond:
+            heapq.heappush(self._retries, (time.monotonic() + delay, item['id']))
+            self._cond.notify_all()
+
+        logger.info(
+            f"Retrying {item['url']} in {delay:.1f}s "
+            f"(attempt {item['attempts']} of {self.retry_policy.max_attempts} failed: {result.error_kind})"
+        )
+        if self.on_retry:
+            self.on_retry(item, result, delay)
+
+    def _reap_loop(self):
+        while not self._stop.wait(REAP_INTERVAL):
+            try:
+                self._reap()
+            except Exception as e:
+                logger.error(f"Lease reaper error: {str(e)}")
+
+    def _reap(self):
+        """Requeue items whose worker stopped sending heartbeats, and release due retries"""
+        now = time.monotonic()
+        with self._cond:
+            expired = [(item_id, lease) for item_id, lease in self._leases.items() if lease['expires'] <= now]
+            for item_id, _ in expired:
+                del self._leases[item_id]
+            due = []
+            while self._retries and self._retries[0][0] <= now:
+                due.append(heapq.heappop(self._retries)[1])
+
+        for item_id, lease in expired:
+            item = self.queue_manager.get_item(item_id)
+            if item is None or item['status'] not in ('downloading', 'processing'):
+                continue
+            # A lost worker says nothing about the host; let another trial through
+            self.circuit_breaker.release(host_key(item['url']), lease['started'])
+            if item['attempts'] >= self.retry_policy.max_attempts:
+                logger.error(f"Worker {lease['worker']} lost {item['url']}; no attempts left")
+                result = DownloadResult('failed', "Worker stopped responding", error_kind='unknown')
+                self.queue_manager.set_status(item_id, 'failed')
+                self.metrics.record_item(item, result)
+                if self.on_finish:
+                    self.on_finish(item, result)
+            else:
+                logger.warning(f"Worker {lease['worker']} stopped responding; requeued {item['url']}")
+                self.queue_manager.set_status(item_id, 'pending')
+
+        for item_id in due:
+            item = self.queue_manager.get_item(item_id)
+            # Paused, cancelled or removed while waiting
+            if item and item['status'] == 'retrying':
+                self.queue_manager.set_status(item_id, 'pending')
+
+        if expired or due:
+            self.wake()
+
+
+class CoordinatorServer:
+    def __init__(self, coordinator, host='127.0.0.1', port=0, token=None):
+        """
+        Serve a Coordinator over HTTP
+
+        Args:
+            coordinator: Coordinator to expose
+            host: Interface to listen on; use 0.0.0.0 for workers on other hosts
+            port: Port to listen on, 0 for any free port
+            token: Shared secret workers must send in the X-Coordinator-Token
+                header; recommended whenever host is not 127.0.0.1
+        """
+        self.coordinator = coordinator
+        self.token = token
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="coordinator-http", daemon=True)
+        self._thread.start()
+        logger.info(f"Coordinator listening on {self.url}")
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self._authorized():
+                    return
+                if self.path == '/status':
+                    self._reply(200, server.coordinator.status())
+                else:
+                    self._reply(404, {'error': 'not found'})
+
+            def do_POST(self):
+                if not self._authorized():
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                    worker = str(body['worker'])
+                except (ValueError, KeyError, TypeError):
+                    self._reply(400, {'error': 'bad request'})
+                    return
+
+                coordinator = server.coordinator
+                try:
+                    if self.path == '/lease':
+                        job = coordinator.lease(worker)
+                        if job is None:
+                            self._reply(204)
+                        else:
+                            self._reply(200, job)
+                    elif self.path == '/heartbeat':
+                        action = coordinator.heartbeat(worker, body['id'], body.get('phase', 'downloading'),
+                                                       body.get('progress'))
+                        self._reply(200, {'action': action})
+                    elif self.path == '/complete':
+                        result = DownloadResult(**{key: body['result'].get(key) for key in RESULT_FIELDS})
+                        self._reply(200, {'accepted': coordinator.complete(worker, body['id'], result)})
+                    elif self.path == '/release':
+                        self._reply(200, {'accepted': coordinator.release(worker, body['id'])})
+                    else:
+                        self._reply(404, {'error': 'not found'})
+                except (KeyError, TypeError, AttributeError):
+                    self._reply(400, {'error': 'bad request'})
+
+            def _authorized(self):
+                if server.token and not hmac.compare_digest(
+                        self.headers.get(TOKEN_HEADER, ''), server.token):
+                    self._reply(403, {'error': 'forbidden'})
+                    return False
+                return True
+
+            def _reply(self, code, data=None):
+                body = json.dumps(data).encode('utf-8') if data is not None else b''
+                self.send_response(code)
+                if body:
+                    self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Every heartbeat would be a line; requests are only logged at debug level
+                logger.debug(f"{self.address_string()} {format % args}")
+
+        return Handler
@@ -2,19 +2,224 @@
 YouTube downloader using yt-dlp with ffmpeg integration
 """
 
-import yt_dlp
 import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from src.core.formats import FormatResolver, MAX_SELECTORS, quality_policy
+from src.core.metrics import TransferMeter
+from src.core.rate_limiter import TokenBucket, HostLimiter, HostConnections, host_key
+from src.core.retry import classify_error
+from src.core.storage import staging_dir, discard_staging
 from src.utils.logger import get_logger
+from src.utils.validators import extract_video_id
 
 logger = get_logger()
 
 
+def load_yt_dlp():
+    """
+    Import yt_dlp on first use
+
+    yt_dlp loads hundreds of extractor modules, so it is kept off the
+    startup path and imported when the first session is built (or by
+    warm_up() in the background).
+    """
+    import yt_dlp
+    return yt_dlp
+
+
+# Connections per file for segmented downloads (1 disables them)
+MAX_SEGMENTS = 4
+
+# Completed ranges of a segmented download are kept in <file>.part + this suffix
+SEGMENT_STATE_SUFFIX = '.segments'
+
+# yt-dlp options shared by every download session
+SESSION_OPTIONS = {
+    'merge_output_format': 'mp4',
+    # Resume from leftover .part files (e.g. after a crash)
+    'continuedl': True,
+    # Large progressive files are fetched as parallel byte ranges (see segmented.py),
+    # DASH/HLS fragments by yt-dlp's own fragment pool
+    'max_segments': MAX_SEGMENTS,
+    'concurrent_fragment_downloads': MAX_SEGMENTS,
+    # Container conversion runs in the separate post-processing stage
+    'quiet': False,
+    'no_warnings': False,
+    'ignoreerrors': False,
+}
+
+
+class DownloadResult:
+    """Outcome of a download: 'completed', 'failed', 'paused' or 'cancelled'"""
+
+    def __init__(self, status, error=None, files=None, timings=None, format_id=None, stats=None,
+                 error_kind=None, retry_after=None):
+        self.status = status
+        self.error = error
+        # Why a failed download failed, see retry.classify_error()
+        self.error_kind = error_kind
+        # Delay requested by the server (Retry-After), in seconds
+        self.retry_after = retry_after
+        # Paths of the finished media files
+        self.files = files or []
+        # yt-dlp format ID that was downloaded (e.g. '137+140')
+        self.format_id = format_id
+        # Seconds spent per stage, e.g. {'extract': 0.8, 'ttfb': 0.2, 'transfer': 12.1}
+        self.timings = timings or {}
+        # Bytes and throughput, see TransferMeter.stats()
+        self.stats = stats or {}
+
+    def __bool__(self):
+        return self.status == 'completed'
+
+    def __repr__(self):
+        return f"DownloadResult({self.status!r})"
+
+
+class _Session:
+    """A warm YoutubeDL whose per-download hooks and options can be swapped"""
+
+    def __init__(self, options):
+        self.progress_hooks = []
+        self.postprocessor_hooks = []
+        # format spec -> compiled selector; pinned specs differ per video, so it is bounded
+        self._selectors = OrderedDict()
+
+        # Imports yt-dlp, so it stays off the startup path
+        from src.core.segmented import SegmentedYoutubeDL
+
+        # The instance keeps its own dispatchers; jobs only swap the lists above
+        self.ydl = SegmentedYoutubeDL(dict(
+            options,
+            progress_hooks=[self._dispatch_progress],
+            postprocessor_hooks=[self._dispatch_postprocessor]
+        ))
+
+    def configure(self, format_spec, outtmpl, progress_hooks, postprocessor_hooks, connections=None):
+        """Point the session at a new download"""
+        selector = self._selectors.get(format_spec)
+        if selector is None:
+            selector = self._selectors[format_spec] = self.ydl.build_format_selector(format_spec)
+            while len(self._selectors) > MAX_SELECTORS:
+                self._selectors.popitem(last=False)
+        self._selectors.move_to_end(format_spec)
+
+        self.ydl.params['format'] = format_spec
+        self.ydl.format_selector = selector
+        self.ydl.params['outtmpl']['default'] = outtmpl
+        # Extra connections beyond the first are taken from here (see segmented.py)
+        self.ydl.params['host_connections'] = connections
+        self.progress_hooks = list(progress_hooks)
+        self.postprocessor_hooks = list(postprocessor_hooks)
+
+    def reset(self):
+        self.ydl.params['host_connections'] = None
+        self.progress_hooks = []
+        self.postprocessor_hooks = []
+
+    def close(self):
+        self.ydl.close()
+
+    def _dispatch_progress(self, d):
+        for hook in self.progress_hooks:
+            hook(d)
+
+    def _dispatch_postprocessor(self, d):
+        for hook in self.postprocessor_hooks:
+            hook(d)
+
+
+class YoutubeDLSessionPool:
+    def __init__(self, options=None, max_idle=8):
+        """
+        Pool of warm YoutubeDL instances reused across downloads
+
+        Each instance keeps its initialized extractors and its HTTP request
+        director (with keep-alive connection pools), so later downloads skip
+        that setup and reuse open connections. A session is used by one
+        worker at a time.
+
+        Args:
+            options: yt-dlp options shared by all sessions
+            max_idle: Idle sessions kept; extras are closed when returned
+        """
+        self.options = dict(SESSION_OPTIONS if options is None else options)
+        self.max_idle = max_idle
+        self.created = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self, format_spec, outtmpl, progress_hooks=(), postprocessor_hooks=(), connections=None):
+        """
+        Borrow a configured YoutubeDL for one download
+
+        Args:
+            format_spec: yt-dlp format selector
+            outtmpl: Output template
+            progress_hooks: Progress hooks for this download only
+            postprocessor_hooks: Post-processor hooks for this download only
+            connections: HostConnections granting extra connections (default: unlimited)
+
+        Yields:
+            yt_dlp.YoutubeDL: The session's YoutubeDL instance
+        """
+        with self._lock:
+            session = self._idle.pop() if self._idle else None
+        if session is None:
+            session = _Session(self.options)
+            self.created += 1
+
+        session.configure(format_spec, outtmpl, progress_hooks, postprocessor_hooks, connections)
+        try:
+            yield session.ydl
+        finally:
+            session.reset()
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(session)
+                    session = None
+            if session:
+                session.close()
+
+    def prewarm(self, count=1):
+        """Build idle sessions ahead of the first download"""
+        sessions = [_Session(self.options) for _ in range(count)]
+        with self._lock:
+            self.created += count
+            self._idle.extend(sessions)
+
+    def close(self):
+        """Close all idle sessions and their connection pools"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()
+
+
 class VideoDownloader:
-    def __init__(self):
+    def __init__(self, metadata_cache=None, session_pool=None, rate_limiter=None, host_limiter=None,
+                 archive=None):
+        """
+        Args:
+            metadata_cache: Optional MetadataCache; warm hits skip extraction
+            session_pool: YoutubeDLSessionPool to reuse; one is created if omitted
+            rate_limiter: TokenBucket shared by all downloads (default: unlimited)
+            host_limiter: HostLimiter capping connections per host (default: unlimited)
+            archive: Optional DownloadArchive; archived videos are not downloaded again
+        """
+        # item_id -> control dict shared with that download's progress hook
         self.active_downloads = {}
-        self.paused = False
+        self.metadata_cache = metadata_cache
+        self.session_pool = session_pool or YoutubeDLSessionPool()
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.host_limiter = host_limiter or HostLimiter()
+        self.archive = archive
+        self.format_resolver = FormatResolver(self.session_pool.options)
 
-    def download(self, url, download_path, quality, progress_callback=None):
+    def download(self, url, download_path, quality, progress_callback=None, item_id=None, format_id=None):
         """
         Download video or playlist with specified quality
 
@@ -23,47 +228,172 @@ class VideoDownloader:
             download_path: Directory to save downloads
             quality: Video quality (e.g., "1080p", "720p")
             progress_callback: Function to call with progress updates
+            item_id: Queue item ID; required for pause/resume/cancel
+            format_id: Format IDs chosen on an earlier attempt (e.g. '137+140');
+                resolved from cached metadata when omitted
 
         Returns:
-            bool: True if successful, False otherwise
+            DownloadResult: Truthy only if the download completed; lists the
+                files left in the staging directory for the post-processing stage.
+                format_id is set whenever the streams were known, also for
+                failed and paused downloads
         """
+        host = None
+        meter = TransferMeter()
+        # A pause/cancel may already have been requested between claim and start
+        control = self.active_downloads.setdefault(item_id or url, self._new_control())
+        # Partial and fragment files stay here until storage.finalize() moves the results out
+        staging = staging_dir(download_path, item_id or url)
         try:
-            # Ensure download directory exists
-            os.makedirs(download_path, exist_ok=True)
-
-            # Extract height from quality (e.g., "1080p" -> "1080")
-            height = quality.replace('p', '')
-
-            # Configure yt-dlp options
-            ydl_opts = {
-                'format': f'bestvideo[height<={height}]+bestaudio/best[height<={height}]',
-                'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                'merge_output_format': 'mp4',
-                'postprocessors': [{
-                    'key': 'FFmpegVideoConvertor',
-                    'preferedformat': 'mp4',
-                }],
-                'progress_hooks': [self._progress_hook(progress_callback)],
-                'quiet': False,
-                'no_warnings': False,
-                'ignoreerrors': False,
-            }
-
-            # Download
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            video_id = extract_video_id(url)
+            if self.archive and video_id and self.archive.contains(video_id, quality):
+                logger.info(f"Already in download archive, skipping: {url}")
+                return DownloadResult('completed')
+
+            os.makedirs(staging, exist_ok=True)
+            outtmpl = os.path.join(staging, '%(title)s.%(ext)s')
+            policy = quality_policy(quality)
+
+            # Wait for a free connection on this host; a pause/cancel ends the wait
+            if self.host_limiter.acquire(host_key(url), should_abort=lambda: control['action']):
+                host = host_key(url)
+
+            if control['action']:
+                return self._interrupted(url, control, staging, format_id=format_id)
+
+            meter.start_extract()
+            info = self._cached_info(url)
+            if info is not None:
+                meter.finish_extract()
+                format_id = format_id or self.format_resolver.resolve(info, quality)
+            # Known streams are requested by ID; the quality selector is only a fallback
+            format_spec = policy.pinned(format_id) if format_id else policy.spec
+
+            # Download on a warm session
+            with self.session_pool.session(
+                format_spec,
+                outtmpl,
+                progress_hooks=[self._progress_hook(progress_callback, control), meter.on_progress],
+                postprocessor_hooks=[meter.on_postprocessor],
+                connections=HostConnections(self.host_limiter, host_key(url))
+            ) as ydl:
                 logger.info(f"Starting download: {url}")
-                ydl.download([url])
+                if info is None:
+                    info = self._extract_info(ydl, url)
+                    meter.finish_extract()
+                info = ydl.process_ie_result(info, download=True)
                 logger.info(f"Download completed: {url}")
-                return True
+                return DownloadResult(
+                    'completed',
+                    files=self._output_files(info),
+                    timings=meter.timings(),
+                    format_id=info.get('format_id'),
+                    stats=meter.stats()
+                )
+
+        except load_yt_dlp().utils.DownloadCancelled:
+            return self._interrupted(url, control, staging, meter, format_id or control.get('format_id'))
 
         except Exception as e:
-            logger.error(f"Download failed for {url}: {str(e)}")
-            return False
+            error_kind, retry_after = classify_error(e)
+            logger.error(f"Download failed for {url} ({error_kind}): {str(e)}")
+            # Cached stream URLs may be the cause (expired/403); re-extract next time
+            video_id = extract_video_id(url)
+            if self.metadata_cache and video_id:
+                self.metadata_cache.invalidate(video_id)
+            return DownloadResult(
+                'failed',
+                str(e),
+                timings=meter.timings(),
+                stats=meter.stats(),
+                error_kind=error_kind,
+                retry_after=retry_after,
+                format_id=format_id or control.get('format_id')
+            )
+
+        finally:
+            self.active_downloads.pop(item_id or url, None)
+            if host is not None:
+                self.host_limiter.release(host)
+
+    def _cache_key(self, url):
+        """Video ID under which url's metadata is cached, or None if it is not cacheable"""
+        # URLs with a list= parameter expand to playlists, so only cache plain videos
+        if not self.metadata_cache or 'list=' in url:
+            return None
+        return extract_video_id(url)
+
+    def _cached_info(self, url):
+        """The unprocessed info dict for url from the metadata cache, or None when cold"""
+        video_id = self._cache_key(url)
+        return self.metadata_cache.get(video_id) if video_id else None
+
+    def _extract_info(self, ydl, url):
+        """Extract the unprocessed info dict for url and cache it"""
+        video_id = self._cache_key(url)
+        cache = self.metadata_cache if video_id else None
+
+        info = ydl.extract_info(url, download=False, process=False)
+        if cache and info.get('_type', 'video') == 'video':
+            # Process the sanitized copy too, so cold and warm runs behave alike
+            info = ydl.sanitize_info(info)
+            cache.put(video_id, info)
+        return info
 
-    def _progress_hook(self, callback):
+    def archive_result(self, url, quality, result):
+        """Record a completed download in the archive, if one is configured"""
+        video_id = extract_video_id(url)
+        if self.archive and video_id and result and result.files:
+            self.archive.add(video_id, quality, format_id=result.format_id, path=result.files[0])
+
+    @staticmethod
+    def _output_files(info):
+        """Final file paths of a processed video or playlist info dict"""
+        files = []
+        for entry in info.get('entries') or [info]:
+            if not entry:
+                continue
+            for download in entry.get('requested_downloads') or []:
+                if download.get('filepath'):
+                    files.append(download['filepath'])
+        return files
+
+    def _interrupted(self, url, control, staging, meter=None, format_id=None):
+        """Build the result for a paused or cancelled download"""
+        if control['action'] == 'cancelled':
+            # A cancelled item will not be resumed, so drop its partial files
+            discard_staging(staging)
+            logger.info(f"Download cancelled: {url}")
+        else:
+            # Partial files stay so resume continues with a ranged request
+            logger.info(f"Download paused: {url}")
+        if meter is None:
+            return DownloadResult(control['action'], format_id=format_id)
+        return DownloadResult(control['action'], timings=meter.timings(), stats=meter.stats(), format_id=format_id)
+
+    def _progress_hook(self, callback, control):
         """Create progress hook for yt-dlp"""
 
+        # Bytes already paid for, per file (video and audio are fetched separately)
+        received = {}
+
         def hook(d):
+            if d['status'] == 'downloading':
+                if 'format_id' not in control:
+                    # The streams yt-dlp negotiated, kept for retries of a cold download
+                    control['format_id'] = self._selected_format(d.get('info_dict') or {})
+
+                # Throttle by blocking this download's thread until the shared budget covers it
+                downloaded = d.get('downloaded_bytes') or 0
+                key = d.get('tmpfilename')
+                delta = downloaded - received.get(key, downloaded)
+                received[key] = downloaded
+                self.rate_limiter.consume(delta, should_abort=lambda: control['action'])
+
+                if control['action']:
+                    # Aborts the transfer; yt-dlp keeps the .part file
+                    raise load_yt_dlp().utils.DownloadCancelled(control['action'])
+
             if callback and d['status'] == 'downloading':
                 total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
                 downloaded = d.get('downloaded_bytes', 0)
@@ -78,12 +408,100 @@ class VideoDownloader:
 
         return hook
 
+    @staticmethod
+    def _selected_format(info):
+        """Format IDs of the download a progress hook's info_dict belongs to, e.g. '137+140'"""
+        requested = info.get('requested_formats')
+        if requested:
+            return '+'.join(fmt['format_id'] for fmt in requested)
+        return info.get('format_id')
+
+    @staticmethod
+    def _new_control():
+        return {'action': None}
+
+    def _request(self, item_id, action):
+        """
+        Flag a download to stop at its next progress update (or as soon as it starts)
+
+        A request for an item that is not running yet is kept for its
+        download; callers drop stale ones when they claim the item.
+        """
+        self.active_downloads.setdefault(item_id, self._new_control())['action'] = action
+
+    def pause(self, item_id):
+        """Pause an active download; its partial file is kept"""
+        self._request(item_id, 'paused')
+
+    def cancel(self, item_id):
+        """Cancel an active download and delete its partial files"""
+        self._request(item_id, 'cancelled')
+
+    def set_rate_limit(self, bytes_per_second):
+        """Change the global bandwidth cap (0 = unlimited); applies to running downloads"""
+        self.rate_limiter.set_rate(bytes_per_second)
+        logger.info(f"Bandwidth limit set to {bytes_per_second or 'unlimited'} B/s")
+
+    def set_max_per_host(self, limit):
+        """Change the per-host connection cap (0 = unlimited)"""
+        self.host_limiter.set_limit(limit)
+        logger.info(f"Per-host connection limit set to {limit or 'unlimited'}")
+
+    def warm_up(self, count=1):
+        """
+        Import yt-dlp and build sessions; meant for a background thread after startup
+
+        Args:
+            count: Sessions to build
+        """
+        try:
+            self.session_pool.prewarm(count)
+            logger.info("Download engine warmed up")
+        except Exception as e:
+            logger.error(f"Warm-up failed: {str(e)}")
+
+    def close(self):
+        """Close pooled yt-dlp sessions"""
+        self.session_pool.close()
+        self.format_resolver.close()
+
     def pause_all(self):
         """Pause all active downloads"""
-        self.paused = True
+        for item_id in list(self.active_downloads):
+            self.pause(item_id)
         logger.info("All downloads paused")
 
-    def resume_all(self):
-        """Resume all paused downloads"""
-        self.paused = False
-        logger.info("All downloads resumed")
+    def cancel_all(self):
+        """Cancel all active downloads"""
+        for item_id in list(self.active_downloads):
+            self.cancel(item_id)
+        logger.info("All downloads cancelled")
+
+
+# Download engines accepted by make_downloader()
+#   thread:  downloads run on the scheduler's worker threads in this process
+#   process: each download runs in a worker process (see process_downloader.py)
+BACKENDS = ('thread', 'process')
+
+
+def make_downloader(backend='thread', session_options=None, max_idle_sessions=8, **kwargs):
+    """
+    Build the downloader for a backend
+
+    Both backends have the same interface, so callers switch by name only.
+
+    Args:
+        backend: 'thread' or 'process'
+        session_options: yt-dlp options for every session (default: SESSION_OPTIONS)
+        max_idle_sessions: Warm sessions kept by the thread backend (each worker process keeps one)
+        **kwargs: metadata_cache, rate_limiter, host_limiter and archive, as for VideoDownloader
+
+    Raises:
+        ValueError: For an unknown backend
+    """
+    if backend == 'thread':
+        return VideoDownloader(session_pool=YoutubeDLSessionPool(session_options, max_idle_sessions), **kwargs)
+    if backend == 'process':
+        from src.core.process_downloader import ProcessDownloader
+        return ProcessDownloader(session_options=session_options, **kwargs)
+    raise ValueError(f"Unknown download backend: {backend}")
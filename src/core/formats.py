@@ -0,0 +1,135 @@
+"""
+Quality policies and format resolution
+
+A quality label such as "1080p" is compiled once into a QualityPolicy
+holding its height and yt-dlp format selector. FormatResolver evaluates
+that selector against a video's cached metadata to get the concrete
+format IDs yt-dlp would download (e.g. '137+140'). The scheduler keeps the
+choice on the queue item, so retries and resumes request those streams
+directly instead of negotiating again.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from src.core.archive import quality_height
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+
+def _yt_dlp():
+    """yt_dlp via downloader.load_yt_dlp(), imported here on first use since downloader imports this module"""
+    from src.core.downloader import load_yt_dlp
+    return load_yt_dlp()
+
+
+# Compiled selectors kept per resolver (one per quality policy in practice)
+MAX_SELECTORS = 32
+
+
+class QualityPolicy:
+    """Format selection for one quality label"""
+
+    def __init__(self, quality):
+        self.quality = quality
+        # 0 for labels without a height (e.g. "best")
+        self.height = quality_height(quality)
+        if self.height:
+            self.spec = f'bestvideo[height<={self.height}]+bestaudio/best[height<={self.height}]'
+        else:
+            self.spec = 'bestvideo+bestaudio/best'
+
+    def pinned(self, format_id):
+        """
+        Selector for known format IDs
+
+        The policy's own selector stays as a fallback in case the streams
+        are no longer offered.
+        """
+        return f'{format_id}/{self.spec}'
+
+    def __repr__(self):
+        return f"QualityPolicy({self.quality!r})"
+
+
+@lru_cache(maxsize=None)
+def quality_policy(quality):
+    """The shared QualityPolicy for a quality label"""
+    return QualityPolicy(quality)
+
+
+class FormatResolver:
+    def __init__(self, options=None):
+        """
+        Pick concrete format IDs from cached metadata
+
+        Uses one private YoutubeDL (created on first use) only for
+        sorting and selecting formats; it never touches the network.
+
+        Args:
+            options: yt-dlp options that affect format sorting (e.g. 'format_sort')
+        """
+        self.options = dict(options or {})
+        self._ydl = None
+        # format spec -> compiled selector, least recently used first
+        self._selectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, info, quality):
+        """
+        Format IDs yt-dlp would download for a video at a quality
+
+        Args:
+            info: Unprocessed (or sanitized) info dict with 'formats'
+            quality: Quality label, e.g. "1080p"
+
+        Returns:
+            str: Format IDs joined with '+', or None if nothing could be
+                resolved (playlists, no formats, unexpected metadata)
+        """
+        if info.get('_type', 'video') != 'video':
+            return None
+        # Copies: sorting fills in fields on the format dicts
+        formats = [dict(fmt) for fmt in info.get('formats') or [] if fmt.get('format_id') and fmt.get('url')]
+        if not formats:
+            return None
+
+        policy = quality_policy(quality)
+        try:
+            with self._lock:
+                ydl = self._get_ydl()
+                selector = self._selector(ydl, policy.spec)
+                # The same ordering process_video_result() applies before selecting
+                format_sorter = _yt_dlp().utils.FormatSorter
+                for fmt in formats:
+                    format_sorter._fill_sorting_fields(fmt)
+                formats.sort(key=format_sorter(ydl, info.get('_format_sort_fields') or []).calculate_preference)
+                selected = ydl._select_formats(formats, selector)
+        except Exception as e:
+            logger.warning(f"Could not resolve formats for {info.get('id')}: {str(e)}")
+            return None
+        return selected[0]['format_id'] if selected else None
+
+    def _get_ydl(self):
+        """The private YoutubeDL; caller holds the lock"""
+        if self._ydl is None:
+            self._ydl = _yt_dlp().YoutubeDL(dict(self.options, quiet=True, no_warnings=True))
+        return self._ydl
+
+    def _selector(self, ydl, spec):
+        """Compiled selector for spec; caller holds the lock"""
+        selector = self._selectors.get(spec)
+        if selector is None:
+            selector = self._selectors[spec] = ydl.build_format_selector(spec)
+            while len(self._selectors) > MAX_SELECTORS:
+                self._selectors.popitem(last=False)
+        self._selectors.move_to_end(spec)
+        return selector
+
+    def close(self):
+        """Close the private YoutubeDL"""
+        with self._lock:
+            if self._ydl is not None:
+                self._ydl.close()
+                self._ydl = None
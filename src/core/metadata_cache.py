@@ -0,0 +1,181 @@
+"""
+Two-level cache for yt-dlp extract_info results
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# Used when no stream URL carries an expiry
+DEFAULT_TTL = 6 * 60 * 60
+# Stop serving entries this many seconds before their stream URLs expire
+EXPIRY_MARGIN = 10 * 60
+
+
+class MetadataCache:
+    def __init__(self, path=None, max_entries=256, default_ttl=DEFAULT_TTL):
+        """
+        Cache extracted video metadata by canonical video ID
+
+        An in-memory LRU sits in front of an optional SQLite store. Entries
+        expire shortly before the earliest signed stream URL in them does,
+        so a warm hit can be downloaded without re-extracting.
+
+        Args:
+            path: SQLite file for the persistent store, None for memory only
+            max_entries: Size of the in-memory LRU
+            default_ttl: Lifetime of entries without signed stream URLs
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        # video_id -> (expires_at, info JSON); JSON keeps cached entries immutable
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                " video_id TEXT PRIMARY KEY,"
+                " expires_at REAL NOT NULL,"
+                " info TEXT NOT NULL)"
+            )
+            self._conn.commit()
+            self._purge_expired()
+
+    def get(self, video_id):
+        """
+        Look up metadata for a video
+
+        Returns:
+            dict: A fresh copy of the cached info dict, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(video_id)
+            if entry is None and self._conn:
+                entry = self._conn.execute(
+                    "SELECT expires_at, info FROM metadata WHERE video_id = ?", (video_id,)
+                ).fetchone()
+                if entry:
+                    self._remember(video_id, entry)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, data = entry
+            if expires_at <= now:
+                self.expired += 1
+                self.misses += 1
+                self._forget(video_id)
+                return None
+
+            self._lru.move_to_end(video_id)
+            self.hits += 1
+
+        logger.info(f"Metadata cache hit: {video_id}")
+        return json.loads(data)
+
+    def peek(self, video_id):
+        """
+        Look up metadata without counting a hit or miss or refreshing its LRU position
+
+        Expired entries are returned too; meant for estimates such as
+        download size, not for downloading.
+
+        Returns:
+            dict: A fresh copy of the cached info dict, or None if absent
+        """
+        with self._lock:
+            entry = self._lru.get(video_id)
+            if entry is None and self._conn:
+                entry = self._conn.execute(
+                    "SELECT expires_at, info FROM metadata WHERE video_id = ?", (video_id,)
+                ).fetchone()
+        return json.loads(entry[1]) if entry else None
+
+    def put(self, video_id, info):
+        """Store JSON-serializable (sanitized) info for a video"""
+        entry = (time.time() + self._ttl_for(info), json.dumps(info))
+        with self._lock:
+            self._remember(video_id, entry)
+            if self._conn:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO metadata (video_id, expires_at, info) VALUES (?, ?, ?)",
+                        (video_id, *entry)
+                    )
+
+    def invalidate(self, video_id):
+        """Drop a cached entry (e.g. after a 403 on its stream URLs)"""
+        with self._lock:
+            self._forget(video_id)
+
+    def stats(self):
+        """Get hit/miss counters"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'entries': len(self._lru),
+        }
+
+    def close(self):
+        """Close the persistent store"""
+        if self._conn:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    def _ttl_for(self, info):
+        """Seconds until the earliest signed stream URL in info expires"""
+        expiries = []
+        for fmt in info.get('formats') or []:
+            query = parse_qs(urlparse(fmt.get('url') or '').query)
+            if 'expire' in query:
+                try:
+                    expiries.append(int(query['expire'][0]))
+                except ValueError:
+                    pass
+
+        if not expiries:
+            return self.default_ttl
+        return max(min(expiries) - time.time() - EXPIRY_MARGIN, 0)
+
+    def _remember(self, video_id, entry):
+        """Insert into the LRU; caller holds the lock"""
+        self._lru[video_id] = entry
+        self._lru.move_to_end(video_id)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _forget(self, video_id):
+        """Remove from both levels; caller holds the lock"""
+        self._lru.pop(video_id, None)
+        if self._conn:
+            with self._conn:
+                self._conn.execute("DELETE FROM metadata WHERE video_id = ?", (video_id,))
+
+    def _purge_expired(self):
+        """Delete expired rows from the persistent store"""
+        with self._conn:
+            self._conn.execute("DELETE FROM metadata WHERE expires_at <= ?", (time.time(),))
@@ -0,0 +1,303 @@
+"""
+Per-download instrumentation, queue gauges and metrics exporters
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# Stages timed for every download, in pipeline order
+STAGES = ('extract', 'ttfb', 'transfer', 'merge', 'postprocess')
+
+# Item records kept for the JSON snapshot
+RECENT_ITEMS = 100
+
+# Peak throughput is the best rate over a window this long, not yt-dlp's per-chunk speed
+PEAK_WINDOW = 1.0
+
+
+class TransferMeter:
+    """Collects timings and throughput from one download's yt-dlp hooks"""
+
+    def __init__(self):
+        self.extract_started = None
+        self.extract_finished = None
+        self.first_byte_at = None
+        self.transfer_finished = None
+        self.peak_bps = 0.0
+        self.merge_seconds = 0.0
+        # filename -> (first downloaded_bytes seen, latest downloaded_bytes)
+        self._files = {}
+        self._pp_started = {}
+        # (time, transferred bytes) at the start of the current peak window
+        self._window = None
+
+    def start_extract(self):
+        self.extract_started = time.monotonic()
+
+    def finish_extract(self):
+        self.extract_finished = time.monotonic()
+
+    def on_progress(self, d):
+        """yt-dlp progress hook"""
+        now = time.monotonic()
+        filename = d.get('filename')
+        downloaded = d.get('downloaded_bytes') or 0
+
+        if d['status'] == 'downloading':
+            if self.first_byte_at is None and downloaded:
+                self.first_byte_at = now
+            first, _ = self._files.get(filename, (downloaded, 0))
+            self._files[filename] = (first, downloaded)
+            self._sample_peak(now)
+
+        elif d['status'] == 'finished':
+            total = d.get('total_bytes') or downloaded
+            first, _ = self._files.get(filename, (total, 0))
+            self._files[filename] = (first, total)
+            self.transfer_finished = now
+            self._sample_peak(now, final=True)
+
+    def on_postprocessor(self, d):
+        """yt-dlp post-processor hook; merging and moving count as 'merge'"""
+        name = d.get('postprocessor')
+        if d['status'] == 'started':
+            self._pp_started[name] = time.monotonic()
+        elif d['status'] == 'finished' and name in self._pp_started:
+            self.merge_seconds += time.monotonic() - self._pp_started.pop(name)
+
+    def _sample_peak(self, now, final=False):
+        """Close the current window once it spans PEAK_WINDOW (or at the end of a file)"""
+        transferred = self.transferred_bytes
+        if self._window is None:
+            self._window = (now, transferred)
+            return
+        started, start_bytes = self._window
+        elapsed = now - started
+        if elapsed >= PEAK_WINDOW or (final and elapsed > 0):
+            self.peak_bps = max(self.peak_bps, (transferred - start_bytes) / elapsed)
+            self._window = (now, transferred)
+
+    @property
+    def total_bytes(self):
+        """Size of the downloaded files"""
+        return sum(latest for _, latest in self._files.values())
+
+    @property
+    def transferred_bytes(self):
+        """Bytes received in this run (excludes data resumed from .part files)"""
+        return sum(max(latest - first, 0) for first, latest in self._files.values())
+
+    def timings(self):
+        """Seconds per stage that was reached"""
+        timings = {}
+        if self.extract_started is not None and self.extract_finished is not None:
+            timings['extract'] = self.extract_finished - self.extract_started
+            if self.first_byte_at is not None:
+                timings['ttfb'] = self.first_byte_at - self.extract_finished
+                if self.transfer_finished is not None:
+                    timings['transfer'] = self.transfer_finished - self.first_byte_at
+        if self.merge_seconds:
+            timings['merge'] = self.merge_seconds
+        return timings
+
+    def stats(self):
+        """Byte counts and average/peak throughput in bytes per second"""
+        transfer = self.timings().get('transfer')
+        transferred = self.transferred_bytes
+        return {
+            'bytes': self.total_bytes,
+            'transferred_bytes': transferred,
+            'avg_bps': transferred / transfer if transfer else 0.0,
+            'peak_bps': self.peak_bps,
+        }
+
+
+class JsonLinesSink:
+    """Appends one JSON object per finished item to a file"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+class LoggingSink:
+    """Writes a one-line summary per finished item to the application log"""
+
+    def emit(self, record):
+        timings = ', '.join(
+            f"{stage} {record[stage + '_seconds']:.2f}s"
+            for stage in STAGES if record.get(stage + '_seconds') is not None
+        )
+        logger.info(
+            f"Metrics for {record['url']}: {record['status']}, {timings}, "
+            f"{record['bytes'] / 1024 / 1024:.1f} MiB, avg {record['avg_bps'] / 1024:.0f} KiB/s, "
+            f"peak {record['peak_bps'] / 1024:.0f} KiB/s, {record['retries']} retries"
+        )
+
+
+class MetricsRegistry:
+    def __init__(self, sinks=None):
+        """
+        Aggregate per-item records and queue gauges
+
+        Every finished item is passed to each sink (any object with an
+        emit(record) method) and folded into counters that can be exported
+        as Prometheus text or JSON.
+
+        Args:
+            sinks: Initial sinks
+        """
+        self._sinks = list(sinks or [])
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+        self._items_total = {}
+        self._stage_sum = {stage: 0.0 for stage in STAGES}
+        self._stage_count = {stage: 0 for stage in STAGES}
+        self._bytes_total = 0
+        self._retries_total = 0
+        self._peak_bps = 0.0
+        self._recent = deque(maxlen=RECENT_ITEMS)
+
+    def add_sink(self, sink):
+        with self._lock:
+            self._sinks.append(sink)
+
+    def register_gauge(self, name, help_text, read):
+        """
+        Expose a live value, read at export time
+
+        Args:
+            name: Metric name without prefix, e.g. 'queue_pending'
+            help_text: Description for the Prometheus HELP line
+            read: Callable returning the current value
+        """
+        self._gauges[name] = (help_text, read)
+
+    def record_item(self, item, result):
+        """
+        Record a finished item
+
+        Args:
+            item: Queue item dict
+            result: DownloadResult with timings and stats
+        """
+        stats = result.stats
+        record = {
+            'item_id': item['id'],
+            'url': item['url'],
+            'status': result.status,
+            'retries': max(item.get('attempts', 1) - 1, 0),
+            'bytes': stats.get('bytes', 0),
+            'transferred_bytes': stats.get('transferred_bytes', 0),
+            'avg_bps': stats.get('avg_bps', 0.0),
+            'peak_bps': stats.get('peak_bps', 0.0),
+            'finished_at': time.time(),
+        }
+        for stage in STAGES:
+            record[stage + '_seconds'] = result.timings.get(stage)
+
+        with self._lock:
+            self._items_total[result.status] = self._items_total.get(result.status, 0) + 1
+            for stage in STAGES:
+                if record[stage + '_seconds'] is not None:
+                    self._stage_sum[stage] += record[stage + '_seconds']
+                    self._stage_count[stage] += 1
+            self._bytes_total += record['transferred_bytes']
+            self._retries_total += record['retries']
+            self._peak_bps = max(self._peak_bps, record['peak_bps'])
+            self._recent.append(record)
+            sinks = list(self._sinks)
+
+        for sink in sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                logger.error(f"Metrics sink {type(sink).__name__} failed: {str(e)}")
+
+    def snapshot(self):
+        """
+        Current counters, gauges and recent item records
+
+        Returns:
+            dict: JSON-serializable metrics
+        """
+        gauges = {name: read() for name, (_, read) in self._gauges.items()}
+        with self._lock:
+            return {
+                'items_total': dict(self._items_total),
+                'stage_seconds': {
+                    stage: {'sum': self._stage_sum[stage], 'count': self._stage_count[stage]}
+                    for stage in STAGES
+                },
+                'bytes_total': self._bytes_total,
+                'retries_total': self._retries_total,
+                'peak_bps': self._peak_bps,
+                'gauges': gauges,
+                'recent': list(self._recent),
+            }
+
+    def to_json(self, indent=None):
+        """Export the snapshot as JSON"""
+        return json.dumps(self.snapshot(), indent=indent, default=str)
+
+    def to_prometheus(self, prefix='ytd'):
+        """Export counters and gauges in the Prometheus text format"""
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_items_total Finished queue items by final status",
+            f"# TYPE {prefix}_items_total counter",
+        ]
+        for status, count in sorted(snapshot['items_total'].items()):
+            lines.append(f'{prefix}_items_total{{status="{status}"}} {count}')
+
+        lines += [
+            f"# HELP {prefix}_stage_seconds Time spent per pipeline stage",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for stage, values in snapshot['stage_seconds'].items():
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {values["sum"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+
+        for name, help_text, kind, value in (
+            ('bytes_total', 'Bytes received', 'counter', snapshot['bytes_total']),
+            ('retries_total', 'Download attempts beyond the first', 'counter', snapshot['retries_total']),
+            ('peak_throughput_bytes', 'Highest per-download speed seen', 'gauge', snapshot['peak_bps']),
+        ):
+            lines += [
+                f"# HELP {prefix}_{name} {help_text}",
+                f"# TYPE {prefix}_{name} {kind}",
+                f"{prefix}_{name} {value:g}",
+            ]
+
+        for name, (help_text, _) in self._gauges.items():
+            lines += [
+                f"# HELP {prefix}_{name} {help_text}",
+                f"# TYPE {prefix}_{name} gauge",
+                f"{prefix}_{name} {snapshot['gauges'][name]:g}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write a snapshot to path; .prom/.txt files get Prometheus text, others JSON"""
+        if path.endswith(('.prom', '.txt')):
+            text = self.to_prometheus()
+        else:
+            text = self.to_json(indent=2)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
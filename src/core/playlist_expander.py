@@ -0,0 +1,89 @@
+"""
+Lazy playlist expansion into individual queue items
+"""
+
+from src.core.downloader import load_yt_dlp
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+
+def iter_playlist_entries(url):
+    """
+    Yield playlist entries as yt-dlp pages through the playlist
+
+    Uses flat extraction, so only the playlist pages are fetched; each
+    entry's own metadata is extracted later when it is downloaded.
+
+    Args:
+        url: YouTube playlist URL
+
+    Yields:
+        dict: Entry with 'url', 'id', 'title' and 'duration' keys
+    """
+    ydl_opts = {
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+        'skip_download': True,
+        # Unavailable/private entries come back as None instead of aborting
+        'ignoreerrors': True,
+        'quiet': True,
+    }
+
+    with load_yt_dlp().YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+        if not info:
+            return
+
+        for entry in info.get('entries') or []:
+            if not entry or not entry.get('url'):
+                continue
+            yield {
+                'url': entry['url'],
+                'id': entry.get('id'),
+                'title': entry.get('title'),
+                'duration': entry.get('duration'),
+            }
+
+
+class PlaylistExpander:
+    def __init__(self, queue_manager):
+        self.queue_manager = queue_manager
+
+    def expand(self, url, quality, download_path, on_added=None):
+        """
+        Add every entry of a playlist to the queue as its own item
+
+        Entries are queued as soon as their page arrives, so workers can
+        start on the first videos while the rest are still being listed.
+
+        Args:
+            url: YouTube playlist URL
+            quality: Quality applied to every entry
+            download_path: Directory applied to every entry
+            on_added: Called with item_id after each entry is queued
+
+        Returns:
+            int: Number of entries queued (already queued or archived videos are skipped)
+        """
+        count = 0
+        try:
+            for entry in iter_playlist_entries(url):
+                item_id = self.queue_manager.add_item(
+                    entry['url'],
+                    quality,
+                    download_path,
+                    title=entry['title'],
+                    playlist_url=url,
+                    duration=entry['duration']
+                )
+                if item_id is None:
+                    continue
+                count += 1
+                if on_added:
+                    on_added(item_id)
+        except Exception as e:
+            logger.error(f"Playlist expansion stopped for {url} after {count} entries: {str(e)}")
+
+        logger.info(f"Expanded playlist {url} into {count} items")
+        return count
@@ -0,0 +1,176 @@
+"""
+Post-processing stage: remux or convert finished downloads to mp4 in a process pool
+"""
+
+import json
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+TARGET_EXT = 'mp4'
+
+# Codecs the mp4 container can carry as-is; anything else is re-encoded
+MP4_VIDEO_CODECS = {'h264', 'hevc', 'av1', 'mpeg4', 'vp9'}
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'alac', 'ac3', 'eac3', 'opus', 'flac'}
+
+# Encoders used for streams that cannot be copied
+VIDEO_ENCODER = ['libx264', '-preset', 'veryfast', '-crf', '20']
+AUDIO_ENCODER = ['aac', '-b:a', '192k']
+
+
+class PostProcessResult:
+    """Outcome of post-processing one file"""
+
+    def __init__(self, path, mode, seconds, error=None):
+        self.path = path
+        # 'skipped' (already mp4), 'remux' (stream copy), 'transcode' or 'failed'
+        self.mode = mode
+        self.seconds = seconds
+        self.error = error
+
+    def __bool__(self):
+        return self.error is None
+
+    def __repr__(self):
+        return f"PostProcessResult({self.mode!r}, {self.seconds:.2f}s)"
+
+
+def probe_streams(path):
+    """
+    List the audio/video streams of a media file with ffprobe
+
+    Returns:
+        list: (codec_type, codec_name) tuples
+    """
+    output = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'stream=codec_type,codec_name', '-of', 'json', path],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return [
+        (stream.get('codec_type'), stream.get('codec_name'))
+        for stream in json.loads(output).get('streams', [])
+        if stream.get('codec_type') in ('video', 'audio')
+    ]
+
+
+def plan_codecs(streams):
+    """
+    Choose per-stream ffmpeg codec arguments for an mp4 output
+
+    Returns:
+        tuple: (ffmpeg arguments, True if every stream is copied)
+    """
+    args = []
+    copy_only = True
+    # Output streams are mapped video first, then audio, so index per type
+    counts = {'video': 0, 'audio': 0}
+    for codec_type, codec_name in streams:
+        specifier = f"-c:{codec_type[0]}:{counts[codec_type]}"
+        counts[codec_type] += 1
+        allowed = MP4_VIDEO_CODECS if codec_type == 'video' else MP4_AUDIO_CODECS
+        if codec_name in allowed:
+            args += [specifier, 'copy']
+        else:
+            copy_only = False
+            args += [specifier] + (VIDEO_ENCODER if codec_type == 'video' else AUDIO_ENCODER)
+    return args, copy_only
+
+
+def postprocess_file(path):
+    """
+    Bring a finished download into an mp4 container
+
+    Streams that mp4 supports are copied; only the others are re-encoded.
+    Runs in a worker process, so it only takes and returns picklable values.
+
+    Args:
+        path: Downloaded media file
+
+    Returns:
+        PostProcessResult: Final path, what was done and how long it took
+    """
+    started = time.monotonic()
+    base, ext = os.path.splitext(path)
+    is_target = ext.lstrip('.').lower() == TARGET_EXT
+    try:
+        try:
+            streams = probe_streams(path)
+        except FileNotFoundError:
+            # No ffprobe/ffmpeg installed: mp4 files are usable as they are
+            if is_target:
+                return PostProcessResult(path, 'skipped', time.monotonic() - started)
+            raise RuntimeError("ffmpeg/ffprobe not found; cannot convert to mp4")
+        codec_args, copy_only = plan_codecs(streams)
+
+        if is_target and copy_only:
+            return PostProcessResult(path, 'skipped', time.monotonic() - started)
+
+        target = f'{base}.{TARGET_EXT}'
+        temp = f'{base}.temp.{TARGET_EXT}'
+        subprocess.run(
+            ['ffmpeg', '-y', '-loglevel', 'error', '-i', path, '-map', '0:v?', '-map', '0:a?']
+            + codec_args + ['-movflags', '+faststart', temp],
+            capture_output=True, text=True, check=True
+        )
+        os.replace(temp, target)
+        if target != path:
+            os.remove(path)
+
+        mode = 'remux' if copy_only else 'transcode'
+        return PostProcessResult(target, mode, time.monotonic() - started)
+
+    except subprocess.CalledProcessError as e:
+        error = (e.stderr or '').strip().splitlines()[-1:] or [str(e)]
+        return PostProcessResult(path, 'failed', time.monotonic() - started, error[0])
+    except Exception as e:
+        return PostProcessResult(path, 'failed', time.monotonic() - started, str(e))
+
+
+def _exit_with_parent():
+    """Pool initializer: end this process when the process owning the pool dies, even if it was killed"""
+    parent = multiprocessing.parent_process()
+    if parent is None:
+        return
+
+    def watch():
+        parent.join()
+        os._exit(1)
+
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+
+class PostProcessor:
+    def __init__(self, max_workers=None):
+        """
+        Process pool for CPU-bound post-processing
+
+        The pool is created on first use, so it costs nothing at startup.
+
+        Args:
+            max_workers: Concurrent ffmpeg jobs (default: number of CPU cores)
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, path):
+        """
+        Queue a file for post-processing
+
+        Returns:
+            concurrent.futures.Future: Resolves to a PostProcessResult
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_exit_with_parent)
+            return self._executor.submit(postprocess_file, path)
+
+    def close(self, wait=False):
+        """Shut down the pool; queued jobs that have not started are dropped"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,466 @@
+"""
+Process-pool download backend
+
+ProcessDownloader runs each download in a worker process with its own
+VideoDownloader, so extraction, segment threads and progress hooks of
+parallel downloads no longer share one interpreter lock. It has the same
+interface as VideoDownloader, so the scheduler, the GUI and the CLI use
+either without changes (see downloader.make_downloader).
+
+Each worker runs one download at a time and talks to the parent over a
+pipe: the parent sends ('download', ...), ('pause', id), ('cancel', id),
+('rate', bytes_per_second), ('warm_up',) and ('close',); the worker
+answers a download with ('progress', downloaded, total, speed, eta)
+tuples and one ('done', DownloadResult), and a warm-up with ('ready',). Log records come back over a shared queue.
+
+The archive check and per-host limit stay in the parent. A download's
+first connection is taken before it is sent to a worker; the worker asks
+for each further one with ('connect', seq, count), is answered with
+('connections', seq, granted) and hands them back with ('disconnect', id, count).
+The bandwidth cap is split evenly across the workers that are downloading.
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from src.core.downloader import DownloadResult, SESSION_OPTIONS, VideoDownloader, YoutubeDLSessionPool
+from src.core.metadata_cache import MetadataCache
+from src.core.rate_limiter import TokenBucket, HostLimiter, host_key
+from src.utils.logger import get_logger, listen_to_workers, log_context, setup_worker_logger
+from src.utils.validators import extract_video_id
+
+logger = get_logger()
+
+# Minimum seconds between progress messages from a worker
+PROGRESS_INTERVAL = 0.1
+# Seconds a closing worker gets to pause its download and exit
+STOP_TIMEOUT = 10.0
+# Seconds a worker waits for the parent to grant extra connections
+CONNECT_TIMEOUT = 5.0
+
+# Parent-side stop requests -> worker commands
+_COMMANDS = {'paused': 'pause', 'cancelled': 'cancel'}
+
+
+def _run_job(downloader, send, job_id, url, download_path, quality, format_id):
+    """Run one download in a worker process and report back to the parent"""
+    last_sent = [0.0]
+
+    def on_progress(progress):
+        now = time.monotonic()
+        finished = progress['downloaded_bytes'] >= progress['total_bytes']
+        if now - last_sent[0] < PROGRESS_INTERVAL and not finished:
+            return
+        last_sent[0] = now
+        send(('progress', progress['downloaded_bytes'], progress['total_bytes'],
+              progress.get('speed'), progress.get('eta')))
+
+    with log_context(job_id):
+        try:
+            result = downloader.download(url, download_path, quality, on_progress, item_id=job_id,
+                                         format_id=format_id)
+        except Exception as e:
+            result = DownloadResult('failed', str(e), error_kind='unknown')
+    send(('done', result))
+
+
+class _ParentHostLimiter:
+    """A worker's view of the parent's HostLimiter, which holds every connection count"""
+
+    def __init__(self, send):
+        self._send = send
+        # One request at a time; _lock guards the sequence number of the one awaited
+        self._request_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._waiting = None
+        self._replies = queue.Queue()
+        # Item ID of the current download; the parent ignores give-backs for earlier ones
+        self.job_id = None
+
+    def acquire(self, host, should_abort=None):
+        # The parent took the download's first connection before handing it over
+        return False
+
+    def try_acquire(self, host, count=1):
+        with self._request_lock:
+            with self._lock:
+                self._seq += 1
+                self._waiting = seq = self._seq
+            self._send(('connect', seq, count))
+            try:
+                return self._replies.get(timeout=CONNECT_TIMEOUT)
+            except queue.Empty:
+                return 0
+            finally:
+                with self._lock:
+                    self._waiting = None
+                    # Granted just as the wait timed out
+                    late = []
+                    while not self._replies.empty():
+                        late.append(self._replies.get_nowait())
+                if late:
+                    self.release(host, sum(late))
+
+    def release(self, host, count=1):
+        self._send(('disconnect', self.job_id, count))
+
+    def granted(self, seq, count):
+        """Deliver the parent's answer to try_acquire; one that came too late is handed back"""
+        with self._lock:
+            if seq == self._waiting:
+                self._replies.put(count)
+                return
+        if count:
+            self.release(None, count)
+
+
+def _worker_main(conn, log_queue, options):
+    """Entry point of a worker process: serve download commands until closed"""
+    setup_worker_logger(log_queue, options['log_level'])
+    metadata_cache = MetadataCache(options['metadata_cache_path']) if options['metadata_cache_path'] else None
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    host_limiter = _ParentHostLimiter(send)
+    downloader = VideoDownloader(
+        metadata_cache=metadata_cache,
+        session_pool=YoutubeDLSessionPool(options['session_options'], max_idle=1),
+        rate_limiter=TokenBucket(options['rate']),
+        host_limiter=host_limiter
+    )
+
+    job = None
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                # The parent is gone
+                break
+
+            command = message[0]
+            if command == 'download':
+                job_id = message[1]
+                # Drop a stop request that arrived after this item's previous run ended
+                downloader.active_downloads.pop(job_id, None)
+                host_limiter.job_id = job_id
+                job = threading.Thread(
+                    target=_run_job, args=(downloader, send, *message[1:]), name=f"job-{job_id}", daemon=True
+                )
+                job.start()
+            elif command == 'pause':
+                downloader.pause(message[1])
+            elif command == 'cancel':
+                downloader.cancel(message[1])
+            elif command == 'rate':
+                downloader.rate_limiter.set_rate(message[1])
+            elif command == 'connections':
+                host_limiter.granted(message[1], message[2])
+            elif command == 'warm_up':
+                downloader.warm_up()
+                send(('ready',))
+            elif command == 'close':
+                break
+    finally:
+        if job is not None and job.is_alive():
+            # Keep the partial file so the item resumes next time
+            for job_id in list(downloader.active_downloads):
+                downloader.pause(job_id)
+            job.join(STOP_TIMEOUT)
+        downloader.close()
+        if metadata_cache:
+            metadata_cache.close()
+
+
+class _Worker:
+    """A worker process and the parent's end of its pipe"""
+
+    def __init__(self, context, number, log_queue, options):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, log_queue, options),
+            name=f"download-worker-{number}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        # Item ID of the running download, if any
+        self.job = None
+        self._send_lock = threading.Lock()
+
+    def send(self, message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    def recv(self):
+        return self.conn.recv()
+
+    def stop(self):
+        try:
+            self.send(('close',))
+        except OSError:
+            pass
+        self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+class ProcessDownloader:
+    def __init__(self, metadata_cache=None, session_options=None, rate_limiter=None, host_limiter=None,
+                 archive=None):
+        """
+        Download in worker processes, one download per process
+
+        Workers are started on demand, so there are as many as the peak
+        number of concurrent downloads, and are kept until close().
+
+        Args:
+            metadata_cache: Optional MetadataCache; workers open their own
+                connection to the same SQLite file
+            session_options: yt-dlp options for the workers' sessions (default SESSION_OPTIONS)
+            rate_limiter: TokenBucket holding the global bandwidth cap (default: unlimited)
+            host_limiter: HostLimiter capping connections per host (default: unlimited)
+            archive: Optional DownloadArchive; archived videos are not downloaded again
+        """
+        # item_id -> {'action': None/'paused'/'cancelled', 'worker': _Worker running it}
+        self.active_downloads = {}
+        self.metadata_cache = metadata_cache
+        self.session_options = dict(SESSION_OPTIONS if session_options is None else session_options)
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.host_limiter = host_limiter or HostLimiter()
+        self.archive = archive
+
+        # spawn: workers must not inherit the parent's threads (UI, scheduler, logging)
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = []
+        self._idle = []
+        self._lock = threading.Lock()
+        self._log_queue = None
+        self._log_listener = None
+        self._closed = False
+
+    def download(self, url, download_path, quality, progress_callback=None, item_id=None, format_id=None):
+        """
+        Download video or playlist with specified quality in a worker process
+
+        Args:
+            url: YouTube video or playlist URL
+            download_path: Directory to save downloads
+            quality: Video quality (e.g., "1080p", "720p")
+            progress_callback: Function to call with progress updates
+            item_id: Queue item ID; required for pause/resume/cancel
+            format_id: Format IDs chosen on an earlier attempt, if any
+
+        Returns:
+            DownloadResult: As VideoDownloader.download()
+        """
+        job_id = item_id or url
+        host = None
+        # Connections held on host: the first, plus those granted to the worker
+        connections = 0
+        worker = None
+        control = self.active_downloads.setdefault(job_id, self._new_control())
+        try:
+            video_id = extract_video_id(url)
+            if self.archive and video_id and self.archive.contains(video_id, quality):
+                logger.info(f"Already in download archive, skipping: {url}")
+                return DownloadResult('completed')
+
+            if self.host_limiter.acquire(host_key(url), should_abort=lambda: control['action']):
+                host = host_key(url)
+                connections = 1
+            if control['action']:
+                return DownloadResult(control['action'])
+
+            worker = self._take_worker()
+            worker.job = job_id
+            control['worker'] = worker
+            worker.send(('download', job_id, url, download_path, quality, format_id))
+            # A stop requested before the worker was attached would have been missed
+            if control['action']:
+                worker.send((_COMMANDS[control['action']], job_id))
+            self._share_rate()
+
+            while True:
+                message = worker.recv()
+                if message[0] == 'done':
+                    return message[1]
+                if message[0] == 'connect':
+                    _, seq, count = message
+                    granted = self.host_limiter.try_acquire(host, count)
+                    connections += granted
+                    worker.send(('connections', seq, granted))
+                elif message[0] == 'disconnect':
+                    # A late give-back from this worker's previous job was released when that job ended
+                    _, released_job, count = message
+                    if released_job == job_id:
+                        self.host_limiter.release(host, count)
+                        connections -= count
+                elif progress_callback:
+                    _, downloaded, total, speed, eta = message
+                    progress_callback({
+                        'downloaded_bytes': downloaded,
+                        'total_bytes': total,
+                        'speed': speed,
+                        'eta': eta
+                    })
+
+        except (EOFError, OSError) as e:
+            logger.error(f"Download worker failed during {url}: {str(e)}")
+            self._discard_worker(worker)
+            worker = None
+            return DownloadResult('failed', f"Download worker exited: {str(e) or type(e).__name__}",
+                                  error_kind='unknown')
+
+        finally:
+            self.active_downloads.pop(job_id, None)
+            if connections:
+                self.host_limiter.release(host, connections)
+            if worker is not None:
+                self._return_worker(worker)
+
+    def _take_worker(self):
+        """An idle worker process, starting one if none is free"""
+        with self._lock:
+            if self._closed:
+                raise OSError("downloader is closed")
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                self._workers.remove(worker)
+
+            if self._log_queue is None:
+                self._log_queue = self._context.Queue()
+                self._log_listener = listen_to_workers(self._log_queue)
+            worker = _Worker(self._context, len(self._workers) + 1, self._log_queue, {
+                'session_options': self.session_options,
+                'metadata_cache_path': getattr(self.metadata_cache, 'path', None),
+                'rate': self.rate_limiter.rate,
+                'log_level': logging.getLogger().level,
+            })
+            self._workers.append(worker)
+        logger.info(f"Started download worker process {worker.process.pid}")
+        return worker
+
+    def _return_worker(self, worker):
+        worker.job = None
+        with self._lock:
+            if not self._closed:
+                self._idle.append(worker)
+        self._share_rate()
+
+    def _discard_worker(self, worker):
+        if worker is None:
+            return
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop()
+        self._share_rate()
+
+    def _share_rate(self):
+        """Split the global bandwidth cap evenly across the downloading workers"""
+        with self._lock:
+            busy = [worker for worker in self._workers if worker.job is not None]
+        rate = self.rate_limiter.rate
+        share = rate / len(busy) if rate and busy else 0
+        for worker in busy:
+            try:
+                worker.send(('rate', share))
+            except OSError:
+                pass
+
+    def archive_result(self, url, quality, result):
+        """Record a completed download in the archive, if one is configured"""
+        video_id = extract_video_id(url)
+        if self.archive and video_id and result and result.files:
+            self.archive.add(video_id, quality, format_id=result.format_id, path=result.files[0])
+
+    @staticmethod
+    def _new_control():
+        return {'action': None, 'worker': None}
+
+    def _request(self, item_id, action):
+        """Flag a download to stop, forwarding the request to its worker if it is running"""
+        control = self.active_downloads.setdefault(item_id, self._new_control())
+        control['action'] = action
+        worker = control['worker']
+        if worker is not None:
+            try:
+                worker.send((_COMMANDS[action], item_id))
+            except OSError:
+                pass
+
+    def pause(self, item_id):
+        """Pause an active download; its partial file is kept"""
+        self._request(item_id, 'paused')
+
+    def cancel(self, item_id):
+        """Cancel an active download and delete its partial files"""
+        self._request(item_id, 'cancelled')
+
+    def set_rate_limit(self, bytes_per_second):
+        """Change the global bandwidth cap (0 = unlimited); applies to running downloads"""
+        self.rate_limiter.set_rate(bytes_per_second)
+        self._share_rate()
+        logger.info(f"Bandwidth limit set to {bytes_per_second or 'unlimited'} B/s")
+
+    def set_max_per_host(self, limit):
+        """Change the per-host connection cap (0 = unlimited)"""
+        self.host_limiter.set_limit(limit)
+        logger.info(f"Per-host connection limit set to {limit or 'unlimited'}")
+
+    def warm_up(self, count=1):
+        """
+        Start worker processes and build their sessions; meant for a background thread after startup
+
+        Args:
+            count: Workers to have ready
+        """
+        workers = []
+        try:
+            for _ in range(count):
+                workers.append(self._take_worker())
+            for worker in workers:
+                worker.send(('warm_up',))
+            for worker in workers:
+                worker.recv()
+            logger.info(f"{count} download worker processes warmed up")
+        except Exception as e:
+            logger.error(f"Warm-up failed: {str(e)}")
+        finally:
+            for worker in workers:
+                self._return_worker(worker)
+
+    def close(self):
+        """Stop the worker processes; running downloads are paused"""
+        with self._lock:
+            self._closed = True
+            workers, self._workers, self._idle = self._workers, [], []
+        for worker in workers:
+            worker.stop()
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            self._log_listener = None
+
+    def pause_all(self):
+        """Pause all active downloads"""
+        for item_id in list(self.active_downloads):
+            self.pause(item_id)
+        logger.info("All downloads paused")
+
+    def cancel_all(self):
+        """Cancel all active downloads"""
+        for item_id in list(self.active_downloads):
+            self.cancel(item_id)
+        logger.info("All downloads cancelled")
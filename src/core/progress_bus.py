@@ -0,0 +1,53 @@
+"""
+Coalescing progress bus between download threads and the UI thread
+"""
+
+import threading
+
+
+class ProgressBus:
+    def __init__(self):
+        """
+        Mailbox that keeps only the latest state per item
+
+        Download threads publish as often as yt-dlp fires hooks; the UI drains
+        the bus on a fixed timer and redraws each changed item once per tick,
+        however many updates arrived in between.
+        """
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._message = None
+        self._queue_changed = False
+
+    def publish(self, item_id, **state):
+        """Merge state (e.g. percent=42.0, status='downloading') into the item's pending update"""
+        with self._lock:
+            pending = self._latest.get(item_id)
+            if pending is None:
+                self._latest[item_id] = state
+            else:
+                pending.update(state)
+
+    def post_message(self, text):
+        """Set the status bar message; only the latest one is shown"""
+        with self._lock:
+            self._message = text
+
+    def notify_queue_changed(self):
+        """Flag that items were added or removed outside the UI thread"""
+        with self._lock:
+            self._queue_changed = True
+
+    def drain(self):
+        """
+        Take all updates published since the last drain
+
+        Returns:
+            tuple: (dict of item_id -> latest state, latest message or None,
+                    whether the queue changed)
+        """
+        with self._lock:
+            latest, self._latest = self._latest, {}
+            message, self._message = self._message, None
+            queue_changed, self._queue_changed = self._queue_changed, False
+        return latest, message, queue_changed
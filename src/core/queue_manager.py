@@ -2,60 +2,498 @@
 Download queue manager
 """
 
+import heapq
+import threading
 import uuid
+from itertools import islice
 from datetime import datetime
+from src.core.archive import quality_height
+from src.core.scheduling import PriorityPolicy, cached_bytes
 from src.utils.logger import get_logger
+from src.utils.validators import extract_video_id, parse_url
 
 logger = get_logger()
 
+STATUSES = ('pending', 'downloading', 'processing', 'retrying', 'paused', 'completed', 'failed', 'cancelled')
+
+# Rebuild the pending heap once stale entries outnumber live ones by this much
+HEAP_SLACK = 1024
+
 
 class QueueManager:
-    def __init__(self):
-        self.queue = []
-        self.completed = []
-
-    def add_item(self, url, quality, download_path):
-        """Add item to queue"""
-        item = {
-            'id': str(uuid.uuid4()),
-            'url': url,
-            'quality': quality,
-            'download_path': download_path,
-            'status': 'pending',
-            'added_at': datetime.now(),
-            'progress': 0
-        }
-        self.queue.append(item)
+    def __init__(self, store=None, archive=None, policy=None, metadata_cache=None):
+        """
+        Args:
+            store: Optional QueueStore journal; the queue is restored from it
+            archive: Optional DownloadArchive; archived videos are not queued again
+            policy: Scheduling policy ordering pending items (default: PriorityPolicy)
+            metadata_cache: Optional MetadataCache; cached format sizes are stored
+                on new items as 'expected_bytes' for size-aware scheduling
+        """
+        # id -> item, in insertion order
+        self._items = {}
+        # status -> ordered set of ids (dict keys keep insertion order)
+        self._buckets = {status: {} for status in STATUSES}
+        # video_id -> id of the queued item for that video
+        self._by_video = {}
+        # (policy key, id) for pending items; entries go stale when an item
+        # leaves pending or is re-keyed and are dropped when popped
+        self._heap = []
+        self._heap_keys = {}
+        self._next_seq = 0
+        self._top_priority = 0
+        self._lock = threading.RLock()
+        self.store = store
+        self.archive = archive
+        self.policy = policy or PriorityPolicy()
+        self.metadata_cache = metadata_cache
+
+        if store:
+            self._restore()
+
+    def _restore(self):
+        """Rebuild the queue from the journal and requeue interrupted items"""
+        interrupted = 0
+        for item in self.store.load():
+            if isinstance(item.get('added_at'), str):
+                item['added_at'] = datetime.fromisoformat(item['added_at'])
+            if item['status'] in ('downloading', 'processing', 'retrying'):
+                # Partial files are left in place so yt-dlp continues them;
+                # finished ones are detected and only post-processed again.
+                # Retry delays are not kept across restarts.
+                item['status'] = 'pending'
+                self.store.record_status(item['id'], 'pending')
+                interrupted += 1
+            if not item.get('expected_bytes'):
+                item['expected_bytes'] = cached_bytes(item['url'], item['quality'], self.metadata_cache)
+            item['seq'] = self._take_seq()
+            self._top_priority = max(self._top_priority, item.get('priority', 0))
+            self._items[item['id']] = item
+            self._buckets[item['status']][item['id']] = None
+            self._index_video(item)
+            if item['status'] == 'pending':
+                self._push(item)
+
+        if self._items:
+            logger.info(f"Restored {len(self._items)} items from journal ({interrupted} interrupted)")
+
+    def close(self):
+        """Flush and close the journal, if any"""
+        if self.store:
+            self.store.close()
+
+    def __len__(self):
+        return len(self._items)
+
+    def add_item(self, url, quality, download_path, title=None, playlist_url=None, duration=None):
+        """
+        Add item to queue
+
+        Args:
+            url: Video URL
+            quality: Video quality (e.g., "1080p")
+            download_path: Directory to save the download
+            title: Display title, if already known
+            playlist_url: Playlist the item was expanded from
+            duration: Video length in seconds, if already known (used by size-aware scheduling)
+
+        Returns:
+            str: ID of the new item, or None if the video is already queued or archived
+        """
+        item_ids, skipped = self.add_items(
+            [{'url': url, 'title': title, 'duration': duration}], quality, download_path, playlist_url
+        )
+        if not item_ids:
+            reason = next(reason for reason, count in skipped.items() if count)
+            logger.info(f"Skipping duplicate ({reason}): {url}")
+            return None
         logger.info(f"Added to queue: {url}")
-        return item['id']
+        return item_ids[0]
+
+    def add_items(self, entries, quality, download_path, playlist_url=None):
+        """
+        Add many items in one batch
+
+        The whole batch is inserted under one lock and journaled as one
+        write, so callers should refresh the UI once afterwards.
+
+        Args:
+            entries: URLs, or dicts with 'url' and optional 'title' and 'duration';
+                dicts from parse_url_list() are used as-is without re-parsing
+            quality: Video quality applied to every item
+            download_path: Directory applied to every item
+            playlist_url: Playlist the items were expanded from
+
+        Returns:
+            tuple: (IDs of the new items in order,
+                {'queued': n, 'archived': n} counts of skipped duplicates)
+        """
+        added_at = datetime.now()
+        items = []
+        skipped = {'queued': 0, 'archived': 0}
+
+        # Parse and size the entries before taking the lock; sizes come from the metadata cache
+        prepared = []
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {'url': entry}
+            if 'video_id' in entry:
+                url, video_id = entry['url'], entry['video_id']
+            else:
+                parsed = parse_url(entry['url'])
+                url = parsed['url'] if parsed else entry['url'].strip()
+                video_id = parsed['video_id'] if parsed else None
+            size = cached_bytes(url, quality, self.metadata_cache) if video_id else None
+            prepared.append((entry, url, video_id, size))
+
+        with self._lock:
+            for entry, url, video_id, size in prepared:
+                duplicate = self._duplicate_reason(video_id, quality)
+                if duplicate:
+                    skipped[duplicate] += 1
+                    continue
+
+                item = {
+                    'id': str(uuid.uuid4()),
+                    'url': url,
+                    'quality': quality,
+                    'download_path': download_path,
+                    'status': 'pending',
+                    'added_at': added_at,
+                    'progress': 0,
+                    'title': entry.get('title'),
+                    'playlist_url': playlist_url,
+                    'duration': entry.get('duration'),
+                    'expected_bytes': size,
+                    'priority': 0,
+                    'seq': self._take_seq()
+                }
+                self._items[item['id']] = item
+                self._buckets['pending'][item['id']] = None
+                if video_id:
+                    self._by_video[video_id] = item['id']
+                self._push(item)
+                items.append(item)
+
+            if self.store and items:
+                self.store.record_add_many(items)
+
+        if len(items) > 1 or sum(skipped.values()) > 1:
+            logger.info(
+                f"Added {len(items)} items to queue "
+                f"({skipped['queued']} already queued, {skipped['archived']} already downloaded)"
+            )
+        return [item['id'] for item in items], skipped
+
+    def find_duplicate(self, url, quality):
+        """
+        Check a URL against the queue and the archive without any network call
+
+        Args:
+            url: Video or playlist URL (canonical or not)
+            quality: Requested quality; copies at this height or higher count
+
+        Returns:
+            str: 'queued' or 'archived' for a duplicate, otherwise None
+        """
+        with self._lock:
+            return self._duplicate_reason(extract_video_id(url), quality)
+
+    def _duplicate_reason(self, video_id, quality):
+        """Why video_id at quality would be a duplicate, or None; caller holds the lock"""
+        if not video_id:
+            return None
+
+        item = self._items.get(self._by_video.get(video_id))
+        if (item and item['status'] != 'cancelled'
+                and quality_height(item['quality']) >= quality_height(quality)):
+            return 'queued'
+
+        if self.archive and self.archive.contains(video_id, quality):
+            return 'archived'
+        return None
+
+    def _index_video(self, item):
+        """Remember which item holds a video; caller holds the lock"""
+        video_id = extract_video_id(item['url'])
+        if video_id:
+            self._by_video[video_id] = item['id']
+
+    def _unindex_video(self, item):
+        """Forget a removed item's video; caller holds the lock"""
+        video_id = extract_video_id(item['url'])
+        if video_id and self._by_video.get(video_id) == item['id']:
+            del self._by_video[video_id]
+
+    def get_item(self, item_id):
+        """Get item by ID, or None if it is not queued"""
+        return self._items.get(item_id)
 
     def remove_item(self, item_id):
         """Remove item from queue"""
-        self.queue = [item for item in self.queue if item['id'] != item_id]
-        self.completed = [item for item in self.completed if item['id'] != item_id]
+        with self._lock:
+            item = self._items.pop(item_id, None)
+            if item:
+                self._buckets[item['status']].pop(item_id, None)
+                self._heap_keys.pop(item_id, None)
+                self._unindex_video(item)
+                if self.store:
+                    self.store.record_remove([item_id])
         logger.info(f"Removed from queue: {item_id}")
 
+    def count(self, status=None):
+        """Number of items, optionally only those with the given status"""
+        if status is None:
+            return len(self._items)
+        return len(self._buckets[status])
+
+    def get_items(self, status=None):
+        """Get items in queue order, optionally filtered by status"""
+        with self._lock:
+            if status is None:
+                return list(self._items.values())
+            return [self._items[item_id] for item_id in self._buckets[status]]
+
+    def get_items_range(self, start, stop):
+        """Get the items at queue positions [start, stop) without copying the whole queue"""
+        with self._lock:
+            return list(islice(self._items.values(), start, stop))
+
     def get_pending_items(self):
-        """Get all pending items"""
-        return [item for item in self.queue if item['status'] == 'pending']
+        """Get all pending items in the order they will be downloaded"""
+        with self._lock:
+            pending = [self._items[item_id] for item_id in self._buckets['pending']]
+            return sorted(pending, key=self.policy.key)
+
+    def has_pending(self):
+        """Check whether any item is waiting to be downloaded"""
+        return bool(self._buckets['pending'])
+
+    def claim_next(self, skip=None):
+        """
+        Atomically take the next pending item in policy order and mark it downloading
+
+        Args:
+            skip: Optional predicate; pending items for which it returns True
+                are passed over and stay pending
+
+        Returns:
+            dict: The claimed item, or None if nothing can be started
+        """
+        with self._lock:
+            item = None
+            passed_over = []
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                candidate = self._live(entry)
+                if candidate is None:
+                    continue
+                if skip is not None and skip(candidate):
+                    passed_over.append(entry)
+                    continue
+                item = candidate
+                break
+
+            for entry in passed_over:
+                heapq.heappush(self._heap, entry)
+            if item is None:
+                return None
+
+            self._set_status(item['id'], 'downloading')
+            item['attempts'] = item.get('attempts', 0) + 1
+            return item
+
+    def unclaim(self, item_id):
+        """
+        Put a claimed item back to pending without counting the attempt, e.g. when its worker gives it back
+
+        Returns:
+            dict: The item, or None if it is not downloading or processing
+        """
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None or item['status'] not in ('downloading', 'processing'):
+                return None
+            item['attempts'] = max(item.get('attempts', 1) - 1, 0)
+            self._set_status(item_id, 'pending')
+            if self.store:
+                self.store.record_update(item)
+            return item
+
+    def set_policy(self, policy):
+        """Switch the scheduling policy and reorder the pending items"""
+        with self._lock:
+            self.policy = policy
+            self._rebuild_heap()
+        logger.info(f"Scheduling policy set to {policy.name}")
+
+    def set_priority(self, item_id, priority):
+        """
+        Change an item's priority; higher runs sooner under priority-aware policies
+
+        Returns:
+            dict: The updated item, or None if it is not queued
+        """
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None:
+                return None
+            item['priority'] = priority
+            self._top_priority = max(self._top_priority, priority)
+            if item['status'] == 'pending':
+                self._push(item)
+            if self.store:
+                self.store.record_update(item)
+            return item
+
+    def set_format(self, item_id, format_id):
+        """
+        Remember the format IDs chosen for an item, so later attempts request the same streams
+
+        Returns:
+            dict: The updated item, or None if it is not queued
+        """
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None:
+                return None
+            item['format_id'] = format_id
+            if self.store:
+                self.store.record_update(item)
+            return item
+
+    def set_expected_bytes(self, item_id, size):
+        """
+        Store an item's download size once its formats are known; reorders it under size-aware policies
+
+        Returns:
+            dict: The updated item, or None if it is not queued
+        """
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None or item.get('expected_bytes') == size:
+                return item
+            item['expected_bytes'] = size
+            if item['status'] == 'pending':
+                self._push(item)
+            if self.store:
+                self.store.record_update(item)
+            return item
+
+    def move_to_front(self, item_id):
+        """Give an item a priority above every other item so it downloads next"""
+        with self._lock:
+            return self.set_priority(item_id, self._top_priority + 1)
+
+    def _take_seq(self):
+        """Next insertion sequence number; caller holds the lock"""
+        self._next_seq += 1
+        return self._next_seq
+
+    def _push(self, item):
+        """Add a pending item to the heap under its current key; caller holds the lock"""
+        key = self.policy.key(item)
+        self._heap_keys[item['id']] = key
+        heapq.heappush(self._heap, (key, item['id']))
+        if len(self._heap) > 2 * len(self._buckets['pending']) + HEAP_SLACK:
+            self._rebuild_heap()
+
+    def _live(self, entry):
+        """The item an entry refers to if it is pending and the entry is current, else None"""
+        key, item_id = entry
+        item = self._items.get(item_id)
+        if item is None or item['status'] != 'pending' or self._heap_keys.get(item_id) != key:
+            return None
+        return item
+
+    def _rebuild_heap(self):
+        """Recompute keys for every pending item and drop stale entries; caller holds the lock"""
+        self._heap_keys = {
+            item_id: self.policy.key(self._items[item_id]) for item_id in self._buckets['pending']
+        }
+        self._heap = [(key, item_id) for item_id, key in self._heap_keys.items()]
+        heapq.heapify(self._heap)
+
+    def set_status(self, item_id, status):
+        """
+        Move item to another status bucket
+
+        Returns:
+            dict: The updated item, or None if it is not queued
+        """
+        with self._lock:
+            return self._set_status(item_id, status)
+
+    def _set_status(self, item_id, status):
+        """Move item between buckets; caller holds the lock"""
+        item = self._items.get(item_id)
+        if item is None:
+            return None
+        del self._buckets[item['status']][item_id]
+        self._buckets[status][item_id] = None
+        if item['status'] == 'pending':
+            # Its heap entries go stale
+            self._heap_keys.pop(item_id, None)
+        item['status'] = status
+        if status == 'pending':
+            self._push(item)
+        if self.store:
+            self.store.record_status(item_id, status)
+        return item
+
+    def update_progress(self, item_id, percent):
+        """Record download progress (0-100) for an item"""
+        item = self._items.get(item_id)
+        if item is None:
+            return
+        item['progress'] = percent
+        if self.store:
+            self.store.record_progress(item_id, percent)
 
     def mark_completed(self, item_id):
         """Mark item as completed"""
-        for item in self.queue:
-            if item['id'] == item_id:
-                item['status'] = 'completed'
-                self.completed.append(item)
-                logger.info(f"Marked completed: {item_id}")
-                break
+        if self.set_status(item_id, 'completed'):
+            logger.info(f"Marked completed: {item_id}")
+
+    def mark_failed(self, item_id):
+        """Mark item as failed"""
+        if self.set_status(item_id, 'failed'):
+            logger.info(f"Marked failed: {item_id}")
+
+    def move_all(self, from_status, to_status):
+        """
+        Move every item with one status to another
+
+        Returns:
+            list: IDs of the moved items
+        """
+        with self._lock:
+            item_ids = list(self._buckets[from_status])
+            for item_id in item_ids:
+                self._set_status(item_id, to_status)
+        return item_ids
+
+    def requeue_failed(self):
+        """Move all failed items back to pending with a fresh retry budget"""
+        with self._lock:
+            item_ids = self.move_all('failed', 'pending')
+            for item_id in item_ids:
+                self._items[item_id]['attempts'] = 0
+        return len(item_ids)
 
     def get_completed_ids(self):
         """Get all completed item IDs"""
-        return [item['id'] for item in self.queue if item['status'] == 'completed']
+        return list(self._buckets['completed'])
 
     def clear_completed(self):
         """Clear all completed items"""
-        self.queue = [item for item in self.queue if item['status'] != 'completed']
-        count = len(self.completed)
-        self.completed = []
+        with self._lock:
+            completed_ids = self._buckets['completed']
+            for item_id in completed_ids:
+                self._unindex_video(self._items.pop(item_id))
+            count = len(completed_ids)
+            self._buckets['completed'] = {}
+            if self.store:
+                self.store.record_remove(completed_ids)
         logger.info(f"Cleared {count} completed items")
         return count
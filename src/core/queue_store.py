@@ -0,0 +1,156 @@
+"""
+Persistent queue journal backed by SQLite in WAL mode
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# Columns stored outside the JSON payload because they change often
+_MUTABLE_FIELDS = ('id', 'status', 'progress')
+
+
+class QueueStore:
+    def __init__(self, path, flush_interval=1.0):
+        """
+        Journal queue transitions to disk with batched commits
+
+        Writes are buffered in memory and committed by a background thread
+        every `flush_interval` seconds, so a burst of progress updates costs
+        one transaction instead of one commit each. Progress updates for the
+        same item are coalesced to the latest value.
+
+        Args:
+            path: SQLite database file
+            flush_interval: Seconds between background commits
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.flush_interval = flush_interval
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " id TEXT PRIMARY KEY,"
+            " seq INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " progress REAL NOT NULL DEFAULT 0,"
+            " data TEXT NOT NULL)"
+        )
+        # record_add assigns MAX(seq) + 1; the index keeps that O(log n) for bulk adds
+        self._conn.execute("CREATE INDEX IF NOT EXISTS items_seq ON items (seq)")
+        self._conn.commit()
+
+        # _db_lock serializes use of the connection; _lock guards the buffers
+        self._db_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._ops = []
+        self._progress = {}
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="queue-store-flush", daemon=True)
+        self._flusher.start()
+
+    def load(self):
+        """
+        Load all journaled items in queue order
+
+        Returns:
+            list: Item dicts as they were last recorded
+        """
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute("SELECT id, status, progress, data FROM items ORDER BY seq").fetchall()
+
+        items = []
+        for item_id, status, progress, data in rows:
+            item = json.loads(data)
+            item.update({'id': item_id, 'status': status, 'progress': progress})
+            items.append(item)
+        return items
+
+    def record_add(self, item):
+        """Journal a newly queued item"""
+        self.record_add_many([item])
+
+    def record_add_many(self, items):
+        """Journal a batch of newly queued items, in order"""
+        ops = []
+        for item in items:
+            data = {key: value for key, value in item.items() if key not in _MUTABLE_FIELDS}
+            ops.append((
+                "INSERT OR REPLACE INTO items (id, seq, status, progress, data)"
+                " VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM items), ?, ?, ?)",
+                (item['id'], item['status'], item.get('progress', 0), json.dumps(data, default=str))
+            ))
+        with self._lock:
+            self._ops.extend(ops)
+
+    def record_update(self, item):
+        """Journal changed item fields other than status and progress (e.g. priority)"""
+        data = {key: value for key, value in item.items() if key not in _MUTABLE_FIELDS}
+        with self._lock:
+            self._ops.append((
+                "UPDATE items SET data = ? WHERE id = ?",
+                (json.dumps(data, default=str), item['id'])
+            ))
+
+    def record_status(self, item_id, status):
+        """Journal a status transition"""
+        with self._lock:
+            self._ops.append(("UPDATE items SET status = ? WHERE id = ?", (status, item_id)))
+
+    def record_progress(self, item_id, progress):
+        """Journal a progress update; only the latest value per item is written"""
+        with self._lock:
+            self._progress[item_id] = progress
+
+    def record_remove(self, item_ids):
+        """Journal removal of one or more items"""
+        with self._lock:
+            for item_id in item_ids:
+                self._ops.append(("DELETE FROM items WHERE id = ?", (item_id,)))
+                self._progress.pop(item_id, None)
+
+    def flush(self):
+        """Commit all buffered writes in a single transaction"""
+        with self._db_lock:
+            with self._lock:
+                ops, self._ops = self._ops, []
+                progress, self._progress = self._progress, {}
+
+            if not ops and not progress:
+                return
+
+            try:
+                with self._conn:
+                    for sql, params in ops:
+                        self._conn.execute(sql, params)
+                    self._conn.executemany(
+                        "UPDATE items SET progress = ? WHERE id = ?",
+                        [(value, item_id) for item_id, value in progress.items()]
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"Queue journal write failed: {str(e)}")
+
+    def close(self):
+        """Flush pending writes and close the database"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        self._conn.close()
+
+    def _flush_loop(self):
+        """Background commit loop"""
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,195 @@
+"""
+Shared bandwidth limiter and per-host connection cap
+"""
+
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+# Longest single sleep, so rate changes take effect quickly
+_MAX_WAIT = 0.25
+
+_RATE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?\s*$', re.IGNORECASE)
+_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_rate(text):
+    """
+    Parse a rate such as "500K", "2M" or "1.5MB/s" into bytes per second
+
+    Returns:
+        int: Bytes per second; 0 for empty input (unlimited)
+
+    Raises:
+        ValueError: If the text is not a rate
+    """
+    if not text or not text.strip():
+        return 0
+    match = _RATE_RE.match(text)
+    if not match:
+        raise ValueError(f"Invalid rate: {text!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+
+
+def host_key(url):
+    """Group URLs by the host that serves them (youtu.be counts as youtube.com)"""
+    host = (urlparse(url).hostname or '').lower()
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return 'youtube.com' if host == 'youtu.be' else host
+
+
+class TokenBucket:
+    def __init__(self, rate=0, burst=None):
+        """
+        Global bytes/sec budget shared by all downloads
+
+        Downloads report the bytes they just received and are made to wait
+        until the bucket has paid for them. The balance may go negative, so
+        a download that reports after another waits behind it; every active
+        download therefore gets an even share of the budget.
+
+        Args:
+            rate: Bytes per second, 0 for unlimited
+            burst: Bytes that may be spent at once (default: one second's worth)
+        """
+        self._lock = threading.Lock()
+        self._rate = 0
+        self._burst = 0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self.set_rate(rate, burst)
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def set_rate(self, rate, burst=None):
+        """Change the limit; takes effect for downloads already in flight"""
+        with self._lock:
+            self._rate = max(int(rate), 0)
+            self._burst = burst if burst is not None else self._rate
+            self._tokens = min(self._tokens, self._burst) if self._rate else 0.0
+            self._updated = time.monotonic()
+
+    def consume(self, nbytes, should_abort=None):
+        """
+        Pay for nbytes, blocking while the shared budget is overdrawn
+
+        Args:
+            nbytes: Bytes just transferred
+            should_abort: Optional callable; stop waiting when it returns True
+        """
+        if nbytes <= 0:
+            return
+
+        with self._lock:
+            if not self._rate:
+                return
+            self._refill()
+            self._tokens -= nbytes
+
+        while True:
+            with self._lock:
+                if not self._rate:
+                    return
+                self._refill()
+                # Wait until the shared balance is repaid, including the debt of
+                # downloads that reported before us; this queues them fairly
+                deficit = -self._tokens
+                if deficit <= 0:
+                    return
+                wait = min(deficit / self._rate, _MAX_WAIT)
+
+            if should_abort and should_abort():
+                return
+            time.sleep(wait)
+
+    def _refill(self):
+        """Add tokens for the time elapsed; caller holds the lock"""
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._updated) * self._rate, self._burst)
+        self._updated = now
+
+
+class HostLimiter:
+    def __init__(self, max_per_host=0):
+        """
+        Cap concurrent connections per host
+
+        A download waits for its first connection (acquire). The extra
+        connections of segmented and fragmented downloads never wait: they
+        are opened only while the host has room for them (try_acquire).
+
+        Args:
+            max_per_host: Connections per host, 0 for unlimited
+        """
+        self._cond = threading.Condition()
+        self._max_per_host = max_per_host
+        self._active = {}
+
+    @property
+    def max_per_host(self):
+        return self._max_per_host
+
+    def set_limit(self, max_per_host):
+        """Change the limit; waiting downloads re-check immediately, open connections are kept"""
+        with self._cond:
+            self._max_per_host = max(int(max_per_host), 0)
+            self._cond.notify_all()
+
+    def acquire(self, host, should_abort=None):
+        """
+        Wait for a free connection on host
+
+        Returns:
+            bool: True once a connection is held, False if should_abort fired first
+        """
+        with self._cond:
+            while self._max_per_host and self._active.get(host, 0) >= self._max_per_host:
+                if should_abort and should_abort():
+                    return False
+                self._cond.wait(_MAX_WAIT)
+            self._active[host] = self._active.get(host, 0) + 1
+            return True
+
+    def try_acquire(self, host, count=1):
+        """
+        Take up to count connections on host without waiting
+
+        Returns:
+            int: Connections granted, possibly 0
+        """
+        with self._cond:
+            active = self._active.get(host, 0)
+            if self._max_per_host:
+                count = max(min(count, self._max_per_host - active), 0)
+            if count:
+                self._active[host] = active + count
+            return count
+
+    def release(self, host, count=1):
+        with self._cond:
+            active = self._active.get(host, 0) - count
+            if active > 0:
+                self._active[host] = active
+            else:
+                self._active.pop(host, None)
+            self._cond.notify_all()
+
+
+class HostConnections:
+    """Extra connections one download may open on its host, besides the one it holds"""
+
+    def __init__(self, limiter, host):
+        self._limiter = limiter
+        self._host = host
+
+    def acquire(self, count=1):
+        """Take up to count extra connections without waiting; returns how many were granted"""
+        return self._limiter.try_acquire(self._host, count)
+
+    def release(self, count=1):
+        self._limiter.release(self._host, count)
@@ -0,0 +1,305 @@
+"""
+Download worker for a remote coordinator
+
+RemoteWorker leases items from a CoordinatorServer (see coordinator.py),
+downloads and post-processes them with a local downloader, and reports
+the results. A heartbeat per job keeps its lease alive and carries
+progress; pause and cancel requests from the coordinator arrive as the
+heartbeat's reply. Several workers, on one host or many, can share one
+coordinator.
+"""
+
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+import uuid
+from src.core.coordinator import RESULT_FIELDS, TOKEN_HEADER
+from src.core.downloader import DownloadResult
+from src.core.postprocess import PostProcessor, PostProcessResult
+from src.core.storage import staging_dir, discard_staging, finalize
+from src.utils.logger import get_logger, log_context
+
+logger = get_logger()
+
+# Seconds between lease requests while the coordinator has nothing to hand out
+POLL_INTERVAL = 1.0
+# Seconds to wait for one coordinator request
+REQUEST_TIMEOUT = 10.0
+# Consecutive failed lease requests after which a worker gives up
+MAX_CONNECT_FAILURES = 30
+# Attempts to deliver a result before leaving the item to the lease reaper
+REPORT_ATTEMPTS = 5
+
+
+class CoordinatorError(Exception):
+    """The coordinator could not be reached or rejected a request"""
+
+
+class CoordinatorAuthError(CoordinatorError):
+    """The coordinator refused this worker's token"""
+
+
+class RemoteWorker:
+    def __init__(self, coordinator_url, downloader, slots=1, download_path=None, worker_id=None, token=None,
+                 max_postprocess=None, on_start=None, on_progress=None, on_finish=None):
+        """
+        Lease and run downloads for a coordinator
+
+        Args:
+            coordinator_url: Base URL of the coordinator, e.g. http://10.0.0.5:8750
+            downloader: Local VideoDownloader or ProcessDownloader
+            slots: Jobs run at the same time
+            download_path: Directory to save into (default: each item's own download_path)
+            worker_id: Name reported to the coordinator (default: host name plus a random suffix)
+            token: Shared secret, if the coordinator requires one
+            max_postprocess: Concurrent ffmpeg jobs (default: number of CPU cores)
+            on_start: Called with job when a lease is granted
+            on_progress: Called with (job, progress_data) during downloads
+            on_finish: Called with (job, result) once a result is reported
+        """
+        self.coordinator_url = coordinator_url.rstrip('/')
+        self.downloader = downloader
+        self.slots = slots
+        self.download_path = download_path
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        self.token = token
+        self.postprocessor = PostProcessor(max_postprocess)
+        self.on_start = on_start
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+
+        # Why the worker gave up on the coordinator, if it did
+        self.error = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def run(self):
+        """Serve jobs until stop() is called or the coordinator stays unreachable"""
+        self.start()
+        self.join()
+
+    def start(self):
+        """Start the job slots on background threads"""
+        logger.info(f"Worker {self.worker_id} serving {self.coordinator_url} with {self.slots} slots")
+        self._threads = [
+            threading.Thread(target=self._slot_loop, name=f"remote-slot-{number}", daemon=True)
+            for number in range(self.slots)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def join(self):
+        """Wait for the slots to finish; stays interruptible with Ctrl+C"""
+        for thread in self._threads:
+            while thread.is_alive():
+                thread.join(0.5)
+
+    def stop(self):
+        """Stop taking jobs; running ones are paused and handed back to the coordinator"""
+        self._stop.set()
+        self.downloader.pause_all()
+
+    def close(self):
+        self.postprocessor.close()
+
+    def _slot_loop(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                job = self._request('/lease')
+                failures = 0
+            except CoordinatorAuthError as e:
+                self._give_up(str(e))
+                return
+            except CoordinatorError as e:
+                failures += 1
+                if failures >= MAX_CONNECT_FAILURES:
+                    self._give_up(str(e))
+                    return
+                self._stop.wait(POLL_INTERVAL)
+                continue
+
+            if job is None:
+                self._stop.wait(POLL_INTERVAL)
+                continue
+            if self._stop.is_set():
+                self._report('/release', {'id': job['id']})
+                return
+            with log_context(job['id']):
+                try:
+                    self._run_job(job)
+                except Exception as e:
+                    logger.error(f"Worker error for {job['url']}: {str(e)}")
+                    self._report('/complete', {'id': job['id'], 'result': self._result_body(
+                        DownloadResult('failed', str(e), error_kind='unknown')
+                    )})
+
+    def _give_up(self, error):
+        """Stop every slot; without a coordinator none of them can do anything"""
+        if self.error is None:
+            self.error = error
+            logger.error(f"Giving up on coordinator {self.coordinator_url}: {error}")
+        self._stop.set()
+
+    def _run_job(self, job):
+        """Download, post-process and report one leased item"""
+        item_id = job['id']
+        download_path = self.download_path or job['download_path']
+        # Drop a stop request left over from this item's previous lease
+        self.downloader.active_downloads.pop(item_id, None)
+        # Latest state, sent with each heartbeat; 'action' is the coordinator's stop request
+        state = {'phase': 'downloading', 'progress': None, 'action': None}
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop, args=(job, state, done), name=f"heartbeat-{item_id}", daemon=True
+        )
+        heartbeat.start()
+
+        if self.on_start:
+            self.on_start(job)
+
+        def progress_callback(progress_data):
+            state['progress'] = progress_data
+            if self.on_progress and progress_data.get('total_bytes'):
+                self.on_progress(job, progress_data)
+
+        try:
+            result = self.downloader.download(
+                job['url'],
+                download_path,
+                job['quality'],
+                progress_callback,
+                item_id=item_id,
+                format_id=job.get('format_id')
+            )
+            # Drop a pause/cancel request that arrived after the download ended
+            self.downloader.active_downloads.pop(item_id, None)
+
+            if result.status == 'completed' and result.files and state['action'] != 'lost':
+                state['phase'] = 'processing'
+                self._postprocess(job, result, download_path, state)
+        finally:
+            done.set()
+            heartbeat.join()
+
+        if state['action'] == 'lost':
+            logger.warning(f"Lease on {job['url']} expired; dropping the result")
+            return
+        if result.status == 'paused' and state['action'] is None:
+            # Paused by stop(), not by the coordinator: give the item back
+            self._report('/release', {'id': item_id})
+            return
+
+        self._report('/complete', {
+            'id': item_id,
+            'result': self._result_body(result),
+        })
+        if self.on_finish:
+            self.on_finish(job, result)
+
+    def _postprocess(self, job, result, download_path, state):
+        """
+        Convert the downloaded files and move them out of staging; updates result in place
+
+        Nothing is moved if the lease was lost meanwhile: the item is
+        already requeued, and its new run would save a second copy.
+        """
+        futures = [self.postprocessor.submit(path) for path in result.files]
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(PostProcessResult(None, 'failed', 0.0, str(e)))
+
+        result.files = [outcome.path for outcome in outcomes if outcome.path]
+        result.timings['postprocess'] = sum(outcome.seconds for outcome in outcomes)
+        errors = [outcome.error for outcome in outcomes if not outcome]
+        if errors:
+            # The files stay in staging; a retry on this host finds them there
+            result.status = 'failed'
+            result.error = errors[0]
+            logger.error(f"Post-processing failed for {job['url']}: {errors[0]}")
+        elif self._still_leased(job, state):
+            result.files = finalize(result.files, download_path)
+            discard_staging(staging_dir(download_path, job['id']))
+
+    def _still_leased(self, job, state):
+        """Renew the lease once more right before finalizing; False if it was lost"""
+        if state['action'] != 'lost':
+            try:
+                if self._request('/heartbeat', {'id': job['id'], 'phase': 'processing'})['action'] == 'lost':
+                    state['action'] = 'lost'
+            except CoordinatorError as e:
+                # Finalize anyway; the result is reported once the coordinator is back
+                logger.warning(f"Heartbeat for {job['url']} failed: {str(e)}")
+        return state['action'] != 'lost'
+
+    def _heartbeat_loop(self, job, state, done):
+        """Renew the lease of a running job and apply the coordinator's stop requests"""
+        interval = job['lease_seconds'] / 3
+        while not done.wait(interval):
+            try:
+                reply = self._request('/heartbeat', {
+                    'id': job['id'],
+                    'phase': state['phase'],
+                    'progress': state['progress'],
+                })
+            except CoordinatorError as e:
+                # Keep going; the lease survives a few missed heartbeats
+                logger.warning(f"Heartbeat for {job['url']} failed: {str(e)}")
+                continue
+
+            action = reply['action']
+            if action is None or state['action'] is not None:
+                continue
+            state['action'] = action
+            if action == 'cancelled':
+                self.downloader.cancel(job['id'])
+            else:
+                # 'lost': another worker may be running the item by now, so
+                # its partial files are kept rather than deleted
+                self.downloader.pause(job['id'])
+
+    @staticmethod
+    def _result_body(result):
+        return {field: getattr(result, field) for field in RESULT_FIELDS}
+
+    def _report(self, path, body):
+        """Send a result or release, retrying briefly; undelivered items are requeued by lease expiry"""
+        for attempt in range(1, REPORT_ATTEMPTS + 1):
+            try:
+                return self._request(path, body)
+            except CoordinatorError as e:
+                logger.warning(f"Reporting {body['id']} failed (attempt {attempt}): {str(e)}")
+                self._stop.wait(POLL_INTERVAL * attempt)
+        return None
+
+    def _request(self, path, body=None):
+        """
+        POST a JSON body to the coordinator
+
+        Returns:
+            dict: The JSON reply, or None for an empty (204) reply
+
+        Raises:
+            CoordinatorError: If the coordinator is unreachable or refuses the request
+        """
+        data = json.dumps(dict(body or {}, worker=self.worker_id)).encode('utf-8')
+        request = urllib.request.Request(
+            self.coordinator_url + path, data=data, headers={'Content-Type': 'application/json'}
+        )
+        if self.token:
+            request.add_header(TOKEN_HEADER, self.token)
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                payload = response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 403:
+                raise CoordinatorAuthError(f"{path} refused: wrong or missing token") from e
+            raise CoordinatorError(f"{path} returned HTTP {e.code}") from e
+        except (urllib.error.URLError, OSError) as e:
+            raise CoordinatorError(str(getattr(e, 'reason', e))) from e
+        return json.loads(payload) if payload else None
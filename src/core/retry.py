@@ -0,0 +1,298 @@
+"""
+Failure classification, retry backoff and per-host circuit breaking
+"""
+
+import errno
+import random
+import re
+import socket
+import threading
+import time
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# Error kinds reported in DownloadResult.error_kind
+#   throttled: the site is rate limiting us (429, 403, bot checks)
+#   server:    5xx responses
+#   network:   resets, timeouts, DNS failures, truncated transfers
+#   permanent: the video is gone, private, blocked or the URL is unsupported
+#   no_space:  the download filesystem is full
+#   unknown:   anything else
+RETRYABLE_ERRORS = ('throttled', 'server', 'network')
+
+# Checked in order against the text of every exception in the chain
+_MESSAGE_PATTERNS = (
+    ('no_space', re.compile(r"No space left on device|There is not enough space on the disk", re.I)),
+    ('throttled', re.compile(
+        r"HTTP Error 4(?:29|03)|Too Many Requests|rate.?limit|confirm you.?re not a bot", re.I)),
+    ('server', re.compile(r"HTTP Error 5\d\d", re.I)),
+    ('permanent', re.compile(
+        r"HTTP Error 4(?:04|10)|Video unavailable|Private video|has been removed|"
+        r"not available|copyright|Unsupported URL|confirm your age|members-only|"
+        r"Requested format is not available", re.I)),
+    ('network', re.compile(
+        r"timed out|Connection (?:reset|refused|aborted)|Remote end closed|IncompleteRead|"
+        r"Temporary failure in name resolution|Name or service not known|"
+        r"Network is unreachable|did not match the expected length", re.I)),
+)
+
+
+def _exception_chain(exc):
+    """exc followed by the exceptions it wraps (yt-dlp's exc_info/cause, then __cause__/__context__)"""
+    seen = set()
+    stack = [exc]
+    while stack:
+        exc = stack.pop(0)
+        if exc is None or id(exc) in seen:
+            continue
+        seen.add(id(exc))
+        yield exc
+        exc_info = getattr(exc, 'exc_info', None)
+        if isinstance(exc_info, tuple) and len(exc_info) == 3:
+            stack.append(exc_info[1])
+        cause = getattr(exc, 'cause', None)
+        if isinstance(cause, BaseException):
+            stack.append(cause)
+        stack.extend((exc.__cause__, exc.__context__))
+
+
+def _retry_after(exc):
+    """Seconds from an HTTP error's Retry-After header, if it has one in seconds"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(exc, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return max(float(headers.get('Retry-After')), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc):
+    """
+    Work out why a download failed
+
+    HTTP status codes and transport exceptions anywhere in the chain are
+    trusted first; yt-dlp often only reports the cause in its message, so
+    the message text is matched next.
+
+    Args:
+        exc: Exception raised by the download
+
+    Returns:
+        tuple: (kind, retry_after) where kind is one of the kinds above and
+            retry_after is the server's requested delay in seconds, or None
+    """
+    chain = list(_exception_chain(exc))
+
+    if any(getattr(error, 'errno', None) == errno.ENOSPC for error in chain):
+        return 'no_space', None
+
+    for error in chain:
+        status = getattr(error, 'status', None) or getattr(error, 'code', None)
+        if isinstance(status, int) and 400 <= status < 600:
+            if status in (403, 429):
+                return 'throttled', _retry_after(error)
+            if status >= 500:
+                return 'server', _retry_after(error)
+            if status in (404, 410):
+                return 'permanent', None
+
+    for error in chain:
+        if isinstance(error, (ConnectionError, TimeoutError, socket.timeout, socket.gaierror)):
+            return 'network', None
+        if type(error).__name__ in ('TransportError', 'IncompleteRead', 'ContentTooShortError'):
+            return 'network', None
+
+    text = ' '.join(str(error) for error in chain)
+    for kind, pattern in _MESSAGE_PATTERNS:
+        if pattern.search(text):
+            return kind, None
+
+    # yt-dlp marks errors it expects users to see (e.g. geo blocks) as expected
+    if any(getattr(error, 'expected', False) for error in chain):
+        return 'permanent', None
+    return 'unknown', None
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=5, base_delay=2.0, max_delay=300.0):
+        """
+        Exponential backoff with jitter for transient failures
+
+        Args:
+            max_attempts: Total attempts per item, including the first
+            base_delay: Delay in seconds before the first retry
+            max_delay: Upper bound for a single delay
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, kind, attempts):
+        """Whether an item that failed with kind after attempts tries should run again"""
+        return kind in RETRYABLE_ERRORS and attempts < self.max_attempts
+
+    def delay(self, attempts, retry_after=None):
+        """
+        Seconds to wait before the next attempt
+
+        The nominal delay doubles per attempt; the actual delay is drawn
+        from its upper half so items that failed together spread out.
+
+        Args:
+            attempts: Attempts made so far (1 after the first failure)
+            retry_after: Delay requested by the server, used as a floor
+        """
+        nominal = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        delay = random.uniform(nominal / 2, nominal)
+        if retry_after:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=3, window=60.0, cooldown=30.0, max_cooldown=600.0):
+        """
+        Stop starting downloads on a host that is throttling us
+
+        After `threshold` throttling failures within `window` seconds the
+        host's circuit opens and no new downloads start on it. Once the
+        cooldown passes, one trial download is let through: success closes
+        the circuit, another throttle reopens it with twice the cooldown.
+        Downloads that started before the circuit opened do not count,
+        so one of them finishing cannot close it early.
+
+        Args:
+            threshold: Throttling failures that open the circuit
+            window: Seconds over which failures are counted
+            cooldown: Initial seconds the circuit stays open
+            max_cooldown: Upper bound for the doubled cooldown
+        """
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        # host -> {'failures': [times], 'open_until': t, 'cooldown': s, 'trial': bool}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host):
+        return self._hosts.setdefault(
+            host, {'failures': [], 'open_until': 0.0, 'cooldown': self.cooldown, 'trial': False}
+        )
+
+    def allow(self, host):
+        """
+        Check whether a new download may start on host
+
+        Returns True for at most one caller once an open circuit's cooldown
+        has passed; that download is the trial.
+        """
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or not state['open_until']:
+                return True
+            if state['trial'] or time.monotonic() < state['open_until']:
+                return False
+            state['trial'] = True
+            return True
+
+    def skip_open(self, host_of):
+        """
+        claim_next() predicate passing over items whose host's circuit is open
+
+        allow() hands out the half-open trial, so each host is only asked
+        until it says yes; a host it refuses is passed over for the rest of
+        the claim.
+
+        Args:
+            host_of: Maps an item to its host key
+        """
+        blocked = {}
+
+        def skip(item):
+            host = host_of(item)
+            if host not in blocked:
+                if self.allow(host):
+                    return False
+                blocked[host] = True
+            return blocked[host]
+
+        return skip
+
+    def is_open(self, host):
+        """Whether new downloads on host are currently held back"""
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or not state['open_until']:
+                return False
+            return state['trial'] or time.monotonic() < state['open_until']
+
+    def reopens_in(self):
+        """Seconds until the next open circuit allows a trial, or None if none is cooling down"""
+        now = time.monotonic()
+        with self._lock:
+            waits = [
+                state['open_until'] - now for state in self._hosts.values()
+                if state['open_until'] > now and not state['trial']
+            ]
+        return min(waits) if waits else None
+
+    def record(self, host, kind, started):
+        """
+        Record the outcome of a download on host
+
+        Args:
+            host: Host key (see rate_limiter.host_key)
+            kind: Error kind of a failed download, or None for a completed one
+            started: time.monotonic() when the download was admitted
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(host)
+            if started < state['open_until']:
+                # Started before the circuit opened; only the trial decides
+                return
+            if kind is None:
+                # The host served a download
+                if state['open_until']:
+                    logger.info(f"Circuit closed for {host}")
+                self._hosts.pop(host, None)
+                return
+
+            if kind != 'throttled':
+                # Says nothing about throttling; let another trial through
+                state['trial'] = False
+                return
+
+            if state['trial']:
+                state['cooldown'] = min(state['cooldown'] * 2, self.max_cooldown)
+                self._open(host, state, now)
+                return
+
+            state['failures'] = [t for t in state['failures'] if now - t < self.window] + [now]
+            if not state['open_until'] and len(state['failures']) >= self.threshold:
+                self._open(host, state, now)
+
+    def release(self, host, started):
+        """
+        Give back a trial that ended without an outcome (paused or cancelled)
+
+        Args:
+            host: Host key
+            started: time.monotonic() when the download was admitted; only
+                the trial, admitted after the cooldown, gives anything back
+        """
+        with self._lock:
+            state = self._hosts.get(host)
+            if state and started >= state['open_until']:
+                state['trial'] = False
+
+    def _open(self, host, state, now):
+        """Open the circuit; caller holds the lock"""
+        state['open_until'] = now + state['cooldown']
+        state['trial'] = False
+        state['failures'] = []
+        logger.warning(f"Circuit open for {host}: throttled, holding new downloads for {state['cooldown']:.0f}s")
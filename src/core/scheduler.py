@@ -0,0 +1,479 @@
+"""
+Bounded worker-pool scheduler for queued downloads
+"""
+
+import heapq
+import threading
+import time
+from src.core.downloader import DownloadResult
+from src.core.metrics import MetricsRegistry
+from src.core.postprocess import PostProcessor, PostProcessResult
+from src.core.rate_limiter import host_key
+from src.core.retry import RetryPolicy, CircuitBreaker
+from src.core.scheduling import cached_bytes, expected_bytes
+from src.core.storage import DiskSpaceGuard, staging_dir, discard_staging, finalize
+from src.utils.logger import get_logger, log_context
+
+logger = get_logger()
+
+
+class DownloadScheduler:
+    def __init__(self, queue_manager, downloader, max_workers=3, max_postprocess=None,
+                 on_start=None, on_progress=None, on_finish=None, metrics=None,
+                 retry_policy=None, circuit_breaker=None, on_retry=None, disk_guard=None):
+        """
+        Run queued items through a fixed pool of download workers
+
+        Finished downloads are handed to a separate post-processing pool, so
+        a worker moves on to the next transfer while ffmpeg runs. Transient
+        failures are retried after a backoff delay, and no new downloads
+        start on a host that is throttling us until its circuit closes.
+        An item only starts when its download folder has room for its
+        expected size; finished files are moved there from the item's
+        staging directory after post-processing.
+
+        Args:
+            queue_manager: QueueManager supplying pending items
+            downloader: VideoDownloader (or ProcessDownloader) used by every worker
+            max_workers: Number of concurrent downloads
+            max_postprocess: Concurrent ffmpeg jobs (default: number of CPU cores)
+            on_start: Called with item when a worker picks it up
+            on_progress: Called with (item, progress_data) during a download
+            on_finish: Called with (item, result) when an item is done, including post-processing
+            metrics: MetricsRegistry receiving per-item records (one is created if omitted)
+            retry_policy: RetryPolicy for transient failures (default: RetryPolicy())
+            circuit_breaker: CircuitBreaker keyed by host (default: CircuitBreaker())
+            on_retry: Called with (item, result, delay) when a failed item is scheduled to retry
+            disk_guard: DiskSpaceGuard admitting items by free space (default: DiskSpaceGuard())
+        """
+        self.queue_manager = queue_manager
+        self.downloader = downloader
+        self.max_workers = max_workers
+        self.postprocessor = PostProcessor(max_postprocess)
+        self.on_start = on_start
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.on_retry = on_retry
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.disk_guard = disk_guard or DiskSpaceGuard()
+
+        self.metrics = metrics or MetricsRegistry()
+        for status in ('pending', 'downloading', 'processing', 'retrying', 'paused', 'failed', 'completed'):
+            self.metrics.register_gauge(
+                f"queue_{status}",
+                f"Queue items currently {status}",
+                lambda status=status: self.queue_manager.count(status)
+            )
+
+        self._cond = threading.Condition()
+        self._workers = []
+        self._running = False
+        self._generation = 0
+        self._active = 0
+        self._processing = 0
+        # (monotonic due time, item_id) of items waiting to retry
+        self._retries = []
+        # Items paused by shutdown() rather than by the user
+        self._interrupted = set()
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def active_count(self):
+        """Number of items currently being downloaded"""
+        return self._active
+
+    @property
+    def processing_count(self):
+        """Number of items currently being post-processed"""
+        return self._processing
+
+    def start(self):
+        """Start the worker pool (no-op if already running)"""
+        with self._cond:
+            if self._running:
+                self._cond.notify_all()
+                return
+
+            # Workers from a previous start() exit once their current item ends
+            self._running = True
+            self._generation += 1
+            self._workers = []
+            for index in range(self.max_workers):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    args=(self._generation,),
+                    name=f"download-worker-{index}",
+                    daemon=True
+                )
+                self._workers.append(worker)
+                worker.start()
+
+        logger.info(f"Scheduler started with {self.max_workers} workers")
+
+    def wake(self):
+        """Notify idle workers that new items were queued"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def stop(self, wait=False, timeout=None):
+        """
+        Stop taking new items; running downloads finish normally
+
+        Args:
+            wait: Block until all workers have exited
+            timeout: Maximum seconds to wait per worker
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            workers = list(self._workers)
+
+        if wait:
+            for worker in workers:
+                worker.join(timeout)
+
+        logger.info("Scheduler stopped")
+
+    def close(self, wait=False, timeout=None):
+        """
+        Stop the scheduler and shut down the post-processing pool
+
+        Args:
+            wait: Block until workers have exited and running post-processing
+                jobs have reported back, so nothing touches the queue afterwards
+            timeout: Maximum seconds to wait for each of the two
+        """
+        self.stop(wait=wait, timeout=timeout)
+        # Jobs that have not started are cancelled; running ones still call back
+        self.postprocessor.close()
+        if wait:
+            with self._cond:
+                self._cond.wait_for(lambda: self._processing == 0, timeout)
+
+    def shutdown(self, timeout=None):
+        """
+        Stop for an application exit, leaving interrupted downloads to the next session
+
+        Running downloads are paused and journaled as pending rather than
+        paused, so the next start requeues them and they continue from
+        their partial files. Returns once workers and post-processing have
+        reported back, so the queue store can be closed.
+
+        Args:
+            timeout: Maximum seconds to wait for the workers and for post-processing each
+        """
+        # No new claims from here on, so every running download is paused below
+        self.stop()
+        with self._cond:
+            self._interrupted.update(item['id'] for item in self.queue_manager.get_items('downloading'))
+            interrupted = list(self._interrupted)
+        for item_id in interrupted:
+            self.downloader.pause(item_id)
+        self.close(wait=True, timeout=timeout)
+
+    def drain(self, timeout=None):
+        """
+        Block until the queue has no pending, downloading, processing or retrying items
+
+        Args:
+            timeout: Maximum seconds to wait, None to wait forever
+
+        Returns:
+            bool: True if the queue drained, False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: (self._active == 0 and self._processing == 0
+                         and not self.queue_manager.has_pending()
+                         and not self.queue_manager.count('retrying')),
+                timeout
+            )
+
+    def pause_item(self, item_id):
+        """Pause a pending or active item"""
+        item = self.queue_manager.get_item(item_id)
+        if item is None:
+            return
+        if item['status'] in ('pending', 'retrying'):
+            self.queue_manager.set_status(item_id, 'paused')
+        elif item['status'] == 'downloading':
+            self.downloader.pause(item_id)
+
+    def resume_item(self, item_id):
+        """Requeue a paused item; it continues from its partial file"""
+        item = self.queue_manager.get_item(item_id)
+        if item and item['status'] == 'paused':
+            self.queue_manager.set_status(item_id, 'pending')
+            self.wake()
+
+    def cancel_item(self, item_id):
+        """Cancel a pending, paused, failed or active item"""
+        item = self.queue_manager.get_item(item_id)
+        if item is None:
+            return
+        if item['status'] in ('pending', 'retrying', 'paused', 'failed'):
+            self.queue_manager.set_status(item_id, 'cancelled')
+            # A paused, retrying or failed item may have partial files
+            discard_staging(staging_dir(item['download_path'], item_id))
+        elif item['status'] == 'downloading':
+            self.downloader.cancel(item_id)
+
+    def pause_all(self):
+        """Pause every pending and active item"""
+        self.queue_manager.move_all('pending', 'paused')
+        self.queue_manager.move_all('retrying', 'paused')
+        self.downloader.pause_all()
+
+    def resume_all(self):
+        """Requeue every paused item"""
+        if self.queue_manager.move_all('paused', 'pending'):
+            self.wake()
+
+    def _worker_loop(self, generation):
+        """Take pending items until the scheduler is stopped"""
+        while True:
+            with self._cond:
+                item = None
+                while self._running and generation == self._generation:
+                    self._release_due_retries()
+                    verdicts = {}
+                    item = self.queue_manager.claim_next(skip=self._held_back(verdicts))
+                    if item:
+                        break
+                    self._cond.wait(self._next_wakeup())
+
+                if not item:
+                    return
+                # When the circuit breaker admitted it; outcomes of older downloads cannot close a circuit
+                admitted_at = time.monotonic()
+                # A pause/cancel that reached the previous attempt after it ended must not stop this one
+                self.downloader.active_downloads.pop(item['id'], None)
+                self._active += 1
+                verdict, reserved = verdicts.get(item['id'], (None, 0))
+                admitted = verdict == 'ok'
+                if admitted:
+                    self.disk_guard.reserve(
+                        item['id'],
+                        item['download_path'],
+                        staging_dir(item['download_path'], item['id']),
+                        reserved
+                    )
+
+            try:
+                with log_context(item['id']):
+                    if admitted:
+                        self._run_item(item, admitted_at)
+                    else:
+                        self._reject_no_space(item)
+            except Exception as e:
+                logger.error(f"Worker error for {item['url']}: {str(e)}")
+                self.circuit_breaker.release(host_key(item['url']), admitted_at)
+                self.disk_guard.release(item['id'])
+                self.queue_manager.mark_failed(item['id'])
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def _run_item(self, item, admitted_at):
+        """Download a single item and record the outcome"""
+        item_id = item['id']
+
+        if self.on_start:
+            self.on_start(item)
+
+        def progress_callback(progress_data):
+            total = progress_data.get('total_bytes')
+            if total:
+                percent = progress_data['downloaded_bytes'] / total * 100
+                self.queue_manager.update_progress(item_id, percent)
+            if self.on_progress:
+                self.on_progress(item, progress_data)
+
+        result = self.downloader.download(
+            item['url'],
+            item['download_path'],
+            item['quality'],
+            progress_callback,
+            item_id=item_id,
+            format_id=item.get('format_id')
+        )
+
+        # Drop a pause/cancel request that arrived after the download ended
+        self.downloader.active_downloads.pop(item_id, None)
+
+        # Retries and resumes go straight to the same streams
+        if result.format_id and result.format_id != item.get('format_id'):
+            self.queue_manager.set_format(item_id, result.format_id)
+        # The formats are known now; size-aware ordering and the disk check use their real size
+        if not item.get('expected_bytes'):
+            size = cached_bytes(item['url'], item['quality'], self.downloader.metadata_cache)
+            if size:
+                self.queue_manager.set_expected_bytes(item_id, size)
+
+        host = host_key(item['url'])
+        if result.status in ('paused', 'cancelled'):
+            self.circuit_breaker.release(host, admitted_at)
+        else:
+            self.circuit_breaker.record(host, result.error_kind if result.status == 'failed' else None, admitted_at)
+
+        if result.status == 'failed' and self.retry_policy.should_retry(result.error_kind, item['attempts']):
+            self._schedule_retry(item, result)
+        elif result.files:
+            self._start_postprocess(item, result)
+        else:
+            self._finish(item, result)
+
+    def _reject_no_space(self, item):
+        """Fail an item whose expected download does not fit on its disk even with nothing else running"""
+        free = self.disk_guard.free_bytes(item['download_path'])
+        needed = expected_bytes(item) * self.disk_guard.factor
+        error = f"Not enough disk space: about {needed / 1024 / 1024:.0f} MiB needed, {free / 1024 / 1024:.0f} MiB free"
+        logger.error(f"{error} in {item['download_path']} for {item['url']}")
+        self._finish(item, DownloadResult('failed', error, error_kind='no_space'))
+
+    def _held_back(self, verdicts):
+        """
+        claim_next() predicate passing over items that cannot start yet
+
+        Items wait while their disk is too full because of other running
+        downloads, or while their host's circuit is open. Only an item
+        whose size comes from its formats can be found too big for its
+        disk; a guessed size is admitted and reserves at most the room
+        left. Each checked item's (disk verdict, bytes to reserve) is left
+        in verdicts.
+        """
+        rooms = {}
+        circuit_open = self.circuit_breaker.skip_open(lambda item: host_key(item['url']))
+
+        def skip(item):
+            path = item['download_path']
+            if path not in rooms:
+                rooms[path] = self.disk_guard.room(path)
+            known = bool(item.get('expected_bytes'))
+            size = expected_bytes(item)
+            verdict = self.disk_guard.verdict(size, rooms[path], known)
+            if not known:
+                size = min(size, max(rooms[path][0], 0) / self.disk_guard.factor)
+            verdicts[item['id']] = (verdict, size)
+            if verdict == 'wait':
+                return True
+            if verdict == 'full':
+                # Claimed only to be failed, so it must not take a circuit's trial
+                return False
+            return circuit_open(item)
+
+        return skip
+
+    def _schedule_retry(self, item, result):
+        """Park a failed item until its backoff delay has passed"""
+        delay = self.retry_policy.delay(item['attempts'], result.retry_after)
+        self.disk_guard.release(item['id'])
+        item['retry_at'] = time.time() + delay
+        self.queue_manager.set_status(item['id'], 'retrying')
+        with self._cond:
+            heapq.heappush(self._retries, (time.monotonic() + delay, item['id']))
+            self._cond.notify_all()
+
+        logger.info(
+            f"Retrying {item['url']} in {delay:.1f}s "
+            f"(attempt {item['attempts']} of {self.retry_policy.max_attempts} failed: {result.error_kind})"
+        )
+        if self.on_retry:
+            self.on_retry(item, result, delay)
+
+    def _release_due_retries(self):
+        """Move items whose backoff has passed back to pending; caller holds the condition"""
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now:
+            _, item_id = heapq.heappop(self._retries)
+            item = self.queue_manager.get_item(item_id)
+            # Paused, cancelled or removed while waiting
+            if item and item['status'] == 'retrying':
+                self.queue_manager.set_status(item_id, 'pending')
+
+    def _next_wakeup(self):
+        """Seconds until a retry is due or a circuit allows a trial, None if nothing is scheduled"""
+        waits = []
+        if self._retries:
+            waits.append(max(self._retries[0][0] - time.monotonic(), 0.0))
+        reopens_in = self.circuit_breaker.reopens_in()
+        if reopens_in is not None and self.queue_manager.has_pending():
+            waits.append(reopens_in)
+        return min(waits) if waits else None
+
+    def _start_postprocess(self, item, result):
+        """Hand the downloaded files to the post-processing pool; the worker returns at once"""
+        futures = [self.postprocessor.submit(path) for path in result.files]
+        self.queue_manager.set_status(item['id'], 'processing')
+
+        with self._cond:
+            self._processing += 1
+        remaining = [len(futures)]
+
+        def on_done(_):
+            with self._cond:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                with log_context(item['id']):
+                    self._finish_postprocess(item, result, futures)
+            except Exception as e:
+                logger.error(f"Post-processing error for {item['url']}: {str(e)}")
+                self.disk_guard.release(item['id'])
+                self.queue_manager.mark_failed(item['id'])
+            finally:
+                with self._cond:
+                    self._processing -= 1
+                    self._cond.notify_all()
+
+        for future in futures:
+            future.add_done_callback(on_done)
+
+    def _finish_postprocess(self, item, result, futures):
+        """Record the post-processing outcome (runs on the pool's callback thread)"""
+        if any(future.cancelled() for future in futures):
+            # Pool shut down on exit; the item stays 'processing' and is requeued on restart
+            return
+
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(PostProcessResult(None, 'failed', 0.0, str(e)))
+
+        result.files = [outcome.path for outcome in outcomes if outcome.path]
+        result.timings['postprocess'] = sum(outcome.seconds for outcome in outcomes)
+        errors = [outcome.error for outcome in outcomes if not outcome]
+        if errors:
+            # The files stay in staging; a retry finds them there
+            result.status = 'failed'
+            result.error = errors[0]
+            logger.error(f"Post-processing failed for {item['url']}: {errors[0]}")
+        else:
+            result.files = finalize(result.files, item['download_path'])
+            discard_staging(staging_dir(item['download_path'], item['id']))
+
+        modes = ', '.join(outcome.mode for outcome in outcomes)
+        logger.info(f"Post-processed {item['url']} ({modes}) in {result.timings['postprocess']:.2f}s")
+
+        self._finish(item, result)
+
+    def _finish(self, item, result):
+        """Record the final status of an item and report it"""
+        self.disk_guard.release(item['id'])
+        status = result.status
+        if status == 'paused' and item['id'] in self._interrupted:
+            # Paused by shutdown(), not by the user: the next session resumes it
+            status = 'pending'
+        self.queue_manager.set_status(item['id'], status)
+        self.downloader.archive_result(item['url'], item['quality'], result)
+        self.metrics.record_item(item, result)
+        if self.on_finish:
+            self.on_finish(item, result)
@@ -0,0 +1,171 @@
+"""
+Scheduling policies deciding which pending item downloads next
+"""
+
+from src.core.archive import quality_height
+from src.utils.validators import extract_video_id
+
+# Typical video + audio bytes per second by height, for items whose formats are unknown
+BYTES_PER_SECOND = {
+    144: 20_000,
+    240: 40_000,
+    360: 90_000,
+    480: 160_000,
+    720: 330_000,
+    1080: 600_000,
+    1440: 1_300_000,
+    2160: 2_600_000,
+}
+
+# Assumed length of a video nothing is known about yet
+DEFAULT_DURATION = 10 * 60
+
+
+def _bitrate_for(height):
+    """Typical bytes per second at height (the nearest listed height at or above it)"""
+    for listed in sorted(BYTES_PER_SECOND):
+        if height <= listed:
+            return BYTES_PER_SECOND[listed]
+    return BYTES_PER_SECOND[max(BYTES_PER_SECOND)]
+
+
+def _format_size(fmt, duration):
+    """Bytes of one yt-dlp format, from its size fields or its bitrate"""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return size
+    if fmt.get('tbr') and duration:
+        return int(fmt['tbr'] * 1000 / 8 * duration)
+    return None
+
+
+def estimate_size(info, quality):
+    """
+    Estimate the download size of a video from its metadata
+
+    Mirrors the downloader's format choice: the best video stream at or
+    below the requested height plus the best audio stream, or the best
+    combined format.
+
+    Args:
+        info: yt-dlp info dict (unprocessed is fine)
+        quality: Requested quality, e.g. "1080p"
+
+    Returns:
+        int: Estimated bytes, or None if the metadata has no usable sizes
+    """
+    height = quality_height(quality) or max(BYTES_PER_SECOND)
+    duration = info.get('duration')
+    formats = info.get('formats') or []
+
+    def best(candidates, rank):
+        sized = [(rank(fmt), _format_size(fmt, duration)) for fmt in candidates]
+        sized = [entry for entry in sized if entry[1]]
+        return max(sized)[1] if sized else None
+
+    videos = [fmt for fmt in formats
+              if fmt.get('vcodec') not in (None, 'none') and (fmt.get('height') or 0) <= height]
+    video_only = [fmt for fmt in videos if fmt.get('acodec') == 'none']
+    audio_only = [fmt for fmt in formats
+                  if fmt.get('vcodec') == 'none' and fmt.get('acodec') not in (None, 'none')]
+
+    video = best(video_only, lambda fmt: (fmt.get('height') or 0, fmt.get('tbr') or 0))
+    audio = best(audio_only, lambda fmt: fmt.get('abr') or fmt.get('tbr') or 0)
+    if video and audio:
+        return video + audio
+
+    combined = best(videos, lambda fmt: (fmt.get('height') or 0, fmt.get('tbr') or 0))
+    if combined:
+        return combined
+    if duration:
+        return int(duration * _bitrate_for(height))
+    return None
+
+
+def cached_bytes(url, quality, metadata_cache):
+    """
+    Download size of a video from its cached formats
+
+    Queries the cache, so call it outside the queue lock and store the
+    result on the item as 'expected_bytes'.
+
+    Args:
+        url: Video URL
+        quality: Requested quality, e.g. "1080p"
+        metadata_cache: Optional MetadataCache
+
+    Returns:
+        int: Estimated bytes, or None if the video has no usable cached metadata
+    """
+    video_id = extract_video_id(url)
+    if not metadata_cache or not video_id:
+        return None
+    info = metadata_cache.peek(video_id)
+    return estimate_size(info, quality) if info else None
+
+
+def guessed_bytes(item):
+    """Rough size of an item from its duration (or a default length) and the height's typical bitrate"""
+    height = quality_height(item['quality']) or max(BYTES_PER_SECOND)
+    return int((item.get('duration') or DEFAULT_DURATION) * _bitrate_for(height))
+
+
+def expected_bytes(item):
+    """
+    Expected size of a queue item's download
+
+    Uses the size from cached formats when one was stored on the item
+    (see cached_bytes()), otherwise guessed_bytes(). Reads only the item,
+    so it is safe under the queue lock.
+    """
+    return item.get('expected_bytes') or guessed_bytes(item)
+
+
+class FifoPolicy:
+    """Oldest item first; priorities are ignored"""
+
+    name = 'fifo'
+
+    def key(self, item):
+        return (item['seq'],)
+
+
+class PriorityPolicy:
+    """Highest priority first, oldest first within a priority"""
+
+    name = 'priority'
+
+    def key(self, item):
+        return (-item.get('priority', 0), item['seq'])
+
+
+class ShortestJobFirstPolicy:
+    """Highest priority first, then the smallest expected download"""
+
+    name = 'sjf'
+
+    def key(self, item):
+        return (-item.get('priority', 0), expected_bytes(item), item['seq'])
+
+
+# Names accepted by make_policy(), in the order shown in the UI
+POLICIES = {
+    'priority': PriorityPolicy,
+    'sjf': ShortestJobFirstPolicy,
+    'fifo': FifoPolicy,
+}
+
+
+def make_policy(name):
+    """
+    Build a scheduling policy by name
+
+    Args:
+        name: 'priority', 'sjf' or 'fifo'
+
+    Raises:
+        ValueError: For an unknown name
+    """
+    if name not in POLICIES:
+        raise ValueError(f"Unknown scheduling policy: {name}")
+    return POLICIES[name]()
@@ -0,0 +1,378 @@
+"""
+Segmented parallel downloading of single large files
+
+A YouTube stream is throttled per connection, so one big progressive file
+downloads far below the link speed. SegmentedFD fetches it as byte-range
+chunks over several connections, writing each chunk in place into a
+preallocated .part file, and adds connections while that still raises
+the total speed.
+
+A download holds one connection to its host; every further one, for
+segments or for DASH/HLS fragments, is taken from the 'host_connections'
+param (a rate_limiter.HostConnections) and only if the per-host cap has
+room for it.
+
+This module imports yt-dlp at load time; the downloader imports it when
+the first session is built.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from yt_dlp import YoutubeDL
+from yt_dlp.downloader.common import FileDownloader
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.utils import ContentTooShortError, determine_protocol, parse_http_range
+from yt_dlp.utils.networking import HTTPHeaderDict
+from src.core.downloader import SEGMENT_STATE_SUFFIX
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# Files smaller than this download over one connection as usual
+MIN_SEGMENTED_SIZE = 16 * 1024 * 1024
+# Bytes per range request (capped by the format's http_chunk_size, if any)
+CHUNK_SIZE = 4 * 1024 * 1024
+# Bytes read from a response per write
+BLOCK_SIZE = 64 * 1024
+# Connections opened at the start; more are added while they help
+INITIAL_SEGMENTS = 2
+# Seconds between speed measurements that decide whether to add a connection
+ADAPT_INTERVAL = 0.5
+# A new connection must raise the total speed by this fraction to justify another
+MIN_GAIN = 0.15
+# Attempts per chunk before the download fails
+CHUNK_RETRIES = 3
+# Protocols whose fragments yt-dlp fetches over concurrent_fragment_downloads connections
+FRAGMENT_PROTOCOLS = ('m3u8_native', 'http_dash_segments', 'http_dash_segments_generator', 'ism')
+
+
+class _SegmentState:
+    """Completed byte ranges of a .part file, kept in a small JSON file beside it"""
+
+    def __init__(self, path, size, done=None):
+        self.path = path
+        self.size = size
+        # Sorted, non-overlapping [start, end) ranges
+        self.done = [list(r) for r in (done or [])]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved state, or None if there is none or it is unreadable"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(path, int(data['size']), data['done'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @property
+    def done_bytes(self):
+        return sum(end - start for start, end in self.done)
+
+    def missing(self):
+        """Ranges still to download"""
+        gaps, position = [], 0
+        for start, end in self.done:
+            if start > position:
+                gaps.append((position, start))
+            position = max(position, end)
+        if position < self.size:
+            gaps.append((position, self.size))
+        return gaps
+
+    def add(self, start, end):
+        """Record a finished range and save the state"""
+        with self._lock:
+            merged = []
+            for range_start, range_end in sorted(self.done + [[start, end]]):
+                if merged and range_start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], range_end)
+                else:
+                    merged.append([range_start, range_end])
+            self.done = merged
+            self.save()
+
+    def save(self):
+        temp = self.path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'size': self.size, 'done': self.done}, f)
+        os.replace(temp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class SegmentedFD(FileDownloader):
+    """Downloads one HTTP(S) file as concurrent byte ranges"""
+
+    @staticmethod
+    def can_download(info_dict, params, filename):
+        """
+        Check whether a download should be segmented
+
+        Args:
+            info_dict: Format info dict passed to YoutubeDL.dl()
+            params: YoutubeDL params; 'max_segments' > 1 enables segmenting
+            filename: Final file path
+
+        Returns:
+            bool: True for large progressive HTTP(S) files; always True when a
+                segmented .part file is waiting to be resumed
+        """
+        if (params.get('max_segments') or 1) < 2 or filename == '-' or params.get('nopart'):
+            return False
+        if determine_protocol(info_dict) not in ('http', 'https') or info_dict.get('request_data'):
+            return False
+
+        tmpfilename = filename + '.part'
+        if os.path.isfile(tmpfilename + SEGMENT_STATE_SUFFIX):
+            return True
+        if os.path.isfile(tmpfilename):
+            # Left by a single-connection download; let HttpFD continue it
+            return False
+
+        size = info_dict.get('filesize') or info_dict.get('filesize_approx') or 0
+        return size >= params.get('segment_min_size', MIN_SEGMENTED_SIZE)
+
+    def real_download(self, filename, info_dict):
+        tmpfilename = self.temp_name(filename)
+        headers = HTTPHeaderDict({'Accept-Encoding': 'identity'}, info_dict.get('http_headers'))
+        url = info_dict['url']
+
+        state = _SegmentState.load(tmpfilename + SEGMENT_STATE_SUFFIX) if os.path.isfile(tmpfilename) else None
+        if state is None:
+            size = self._probe_size(url, headers)
+            if size is None:
+                # No range support; fall back to one connection
+                fd = HttpFD(self.ydl, self.params)
+                fd._progress_hooks = self._progress_hooks
+                return fd.real_download(filename, info_dict)
+            self._preallocate(tmpfilename, size)
+            state = _SegmentState(tmpfilename + SEGMENT_STATE_SUFFIX, size)
+            state.save()
+        elif state.done:
+            self.report_resuming_byte(state.done_bytes)
+
+        chunk_size = min(
+            CHUNK_SIZE,
+            (info_dict.get('downloader_options') or {}).get('http_chunk_size') or CHUNK_SIZE
+        )
+        chunks = deque(
+            (start, min(start + chunk_size, end))
+            for gap_start, end in state.missing()
+            for start in range(gap_start, end, chunk_size)
+        )
+
+        self._filename = filename
+        self._tmpfilename = tmpfilename
+        self._info_dict = info_dict
+        self._total = state.size
+        self._downloaded = state.done_bytes
+        self._resumed = self._downloaded
+        self._started = time.time()
+        self._progress_lock = threading.Lock()
+        self._abort = threading.Event()
+        self._error = None
+
+        self.report_destination(filename)
+        self._run_workers(chunks, state, url, headers)
+        if self._error is not None:
+            raise self._error
+
+        if state.missing():
+            raise ContentTooShortError(state.done_bytes, state.size)
+        state.remove()
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'status': 'finished',
+            'filename': filename,
+            'downloaded_bytes': state.size,
+            'total_bytes': state.size,
+            'elapsed': time.time() - self._started,
+        }, info_dict)
+        return True
+
+    def _probe_size(self, url, headers):
+        """Total size from a one-byte range request, or None if ranges are not honored"""
+        request = Request(url, None, headers.copy())
+        request.headers['Range'] = 'bytes=0-0'
+        with self.ydl.urlopen(request) as response:
+            if response.status != 206:
+                return None
+            _, _, size = parse_http_range(response.headers.get('Content-Range'))
+            return size or None
+
+    @staticmethod
+    def _preallocate(path, size):
+        """Create the .part file at its full size so chunks can be written anywhere"""
+        with open(path, 'wb') as f:
+            if hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(f.fileno(), 0, size)
+                    return
+                except OSError:
+                    pass
+            f.truncate(size)
+
+    def _run_workers(self, chunks, state, url, headers):
+        """Download all chunks, adding connections while the total speed keeps rising"""
+        max_segments = self.params.get('max_segments') or 1
+        connections = self.params.get('host_connections')
+        chunks_lock = threading.Lock()
+        finished = threading.Condition()
+        workers = []
+        running = [0]
+
+        def next_chunk():
+            with chunks_lock:
+                return chunks.popleft() if chunks else None
+
+        def worker(extra):
+            try:
+                with open(self._tmpfilename, 'r+b') as f:
+                    while not self._abort.is_set():
+                        chunk = next_chunk()
+                        if chunk is None:
+                            return
+                        self._fetch_chunk(f, url, headers, *chunk)
+                        state.add(*chunk)
+            except BaseException as e:
+                if self._error is None:
+                    self._error = e
+                self._abort.set()
+            finally:
+                if extra:
+                    connections.release()
+                with finished:
+                    running[0] -= 1
+                    finished.notify_all()
+
+        def spawn():
+            """Start a connection; all but the first need room under the per-host cap"""
+            extra = bool(workers) and connections is not None
+            if extra and not connections.acquire():
+                return False
+            thread = threading.Thread(target=worker, args=(extra,), name=f"segment-{len(workers)}", daemon=True)
+            workers.append(thread)
+            with finished:
+                running[0] += 1
+            thread.start()
+            return True
+
+        for _ in range(min(INITIAL_SEGMENTS, max_segments, len(chunks))):
+            spawn()
+
+        last_speed = None
+        last_bytes, last_time = self._downloaded, time.monotonic()
+        while True:
+            with finished:
+                if finished.wait_for(lambda: not running[0], ADAPT_INTERVAL):
+                    break
+            now = time.monotonic()
+            speed = (self._downloaded - last_bytes) / (now - last_time)
+            last_bytes, last_time = self._downloaded, now
+
+            with chunks_lock:
+                remaining = len(chunks)
+            if len(workers) >= max_segments or not remaining or self._abort.is_set():
+                continue
+            # Keep adding connections while the previous one paid off; a full
+            # host is retried on the next measurement
+            if (last_speed is None or speed > last_speed * (1 + MIN_GAIN)) and spawn():
+                last_speed = speed
+
+        for thread in workers:
+            thread.join()
+        logger.info(
+            f"Segmented download of {os.path.basename(self._filename)} used {len(workers)} connections"
+        )
+
+    def _fetch_chunk(self, f, url, headers, start, end):
+        """Download bytes [start, end) into f at the same offset, resuming within the chunk on errors"""
+        position = start
+        for attempt in range(1, CHUNK_RETRIES + 1):
+            try:
+                request = Request(url, None, headers.copy())
+                request.headers['Range'] = f'bytes={position}-{end - 1}'
+                with self.ydl.urlopen(request) as response:
+                    range_start, _, _ = parse_http_range(response.headers.get('Content-Range'))
+                    if response.status != 206 or range_start != position:
+                        raise ContentTooShortError(position - start, end - start)
+                    f.seek(position)
+                    while position < end:
+                        if self._abort.is_set():
+                            return
+                        data = response.read(min(BLOCK_SIZE, end - position))
+                        if not data:
+                            raise ContentTooShortError(position - start, end - start)
+                        f.write(data)
+                        position += len(data)
+                        self._advance(len(data))
+                return
+            except Exception as e:
+                if attempt == CHUNK_RETRIES or self._abort.is_set() or self._is_cancel(e):
+                    raise
+                self.report_retry(e, attempt, CHUNK_RETRIES)
+
+    @staticmethod
+    def _is_cancel(error):
+        return type(error).__name__ == 'DownloadCancelled'
+
+    def _advance(self, nbytes):
+        """Report aggregated progress for all connections as a single download"""
+        with self._progress_lock:
+            self._downloaded += nbytes
+            elapsed = time.time() - self._started
+            speed = (self._downloaded - self._resumed) / elapsed if elapsed > 0 else None
+            self._hook_progress({
+                'status': 'downloading',
+                'filename': self._filename,
+                'tmpfilename': self._tmpfilename,
+                'downloaded_bytes': self._downloaded,
+                'total_bytes': self._total,
+                'elapsed': elapsed,
+                'speed': speed,
+                'eta': (self._total - self._downloaded) / speed if speed else None,
+            }, self._info_dict)
+
+
+class SegmentedYoutubeDL(YoutubeDL):
+    """YoutubeDL that routes large progressive downloads through SegmentedFD"""
+
+    def dl(self, name, info, subtitle=False, test=False):
+        if subtitle or test:
+            return super().dl(name, info, subtitle=subtitle, test=test)
+        if not SegmentedFD.can_download(info, self.params, name):
+            return self._fragmented_dl(name, info)
+
+        fd = SegmentedFD(self, self.params)
+        for hook in self._progress_hooks:
+            fd.add_progress_hook(hook)
+        new_info = self._copy_infodict(info)
+        if new_info.get('http_headers') is None:
+            new_info['http_headers'] = self._calc_headers(new_info)
+        return fd.download(name, new_info, subtitle)
+
+    def _fragmented_dl(self, name, info):
+        """Download with yt-dlp's own downloaders, sizing the fragment pool to the connections granted"""
+        connections = self.params.get('host_connections')
+        pool = self.params.get('concurrent_fragment_downloads') or 1
+        if connections is None or pool < 2 or determine_protocol(info) not in FRAGMENT_PROTOCOLS:
+            return super().dl(name, info)
+
+        extra = connections.acquire(pool - 1)
+        self.params['concurrent_fragment_downloads'] = 1 + extra
+        try:
+            return super().dl(name, info)
+        finally:
+            self.params['concurrent_fragment_downloads'] = pool
+            if extra:
+                connections.release(extra)
@@ -0,0 +1,281 @@
+"""
+Download staging, atomic finalize and disk-space admission
+
+Each download is written into its own staging directory under
+<download_path>/.staging/<item_id>, on the same filesystem as the final
+location, and its finished files are moved into place with a rename that
+never overwrites an existing file. Partial and fragment files
+(.part, .f137, .ytdl, ...) therefore never appear in the download folder,
+and a startup sweep can remove the staging directories of items that are
+no longer queued.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# Per-item staging directories live in this subdirectory of the download path
+STAGING_DIR = '.staging'
+
+# Free space always left on a filesystem
+MIN_FREE_BYTES = 256 * 1024 * 1024
+# Space needed per expected byte: merging and remuxing briefly keep the
+# downloaded streams and their output on disk at the same time
+SPACE_FACTOR = 2
+
+# Staging directories written to within this many seconds may belong to
+# another process sharing the download folder; sweeps by the CLI keep them
+ACTIVE_STAGING_SECONDS = 600
+
+# Suffix pattern for names taken in the download folder: "Title (1).mp4"
+_UNIQUE_SUFFIX = ' ({})'
+
+
+def staging_dir(download_path, key):
+    """
+    Staging directory of one download
+
+    Args:
+        download_path: Final download directory
+        key: Queue item ID (the URL is hashed for downloads without one)
+    """
+    if '/' in key or '\\' in key or key.startswith('.'):
+        key = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(download_path, STAGING_DIR, key)
+
+
+def discard_staging(path):
+    """Delete a staging directory with everything in it"""
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        # Drop .staging itself once the last download has left it
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+def _unique_path(directory, name):
+    """name in directory, numbered if needed so no existing file is overwritten"""
+    base, ext = os.path.splitext(name)
+    path = os.path.join(directory, name)
+    number = 1
+    while os.path.lexists(path):
+        path = os.path.join(directory, base + _UNIQUE_SUFFIX.format(number) + ext)
+        number += 1
+    return path
+
+
+def _move_no_clobber(source, target):
+    """
+    Atomically move source to target, failing with FileExistsError if target exists
+
+    A hard link plus unlink cannot overwrite; on Windows (and filesystems
+    without hard links) rename already refuses existing targets.
+    """
+    if os.name == 'nt':
+        os.rename(source, target)
+        return
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        raise
+    except OSError:
+        # No hard links here (e.g. FAT, some network shares)
+        if os.path.lexists(target):
+            raise FileExistsError(target)
+        os.rename(source, target)
+        return
+    os.unlink(source)
+
+
+def finalize(files, download_path):
+    """
+    Move finished files from a staging directory into the download folder
+
+    Args:
+        files: Paths of finished files inside a staging directory
+        download_path: Destination directory
+
+    Returns:
+        list: Final paths; a file whose name is taken gets a " (n)" suffix
+    """
+    final = []
+    for source in files:
+        name = os.path.basename(source)
+        while True:
+            target = _unique_path(download_path, name)
+            try:
+                _move_no_clobber(source, target)
+                break
+            except FileExistsError:
+                # Another download took the name in between; try the next one
+                continue
+        if os.path.basename(target) != name:
+            logger.info(f"{name} already exists, saved as {os.path.basename(target)}")
+        final.append(target)
+    return final
+
+
+def _allocated_bytes(path):
+    """Disk space used by the files under path"""
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            # st_blocks counts preallocated space too; Windows only has st_size
+            blocks = getattr(stat, 'st_blocks', None)
+            total += blocks * 512 if blocks is not None else stat.st_size
+    return total
+
+
+def _existing(path):
+    """path or its nearest existing parent"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+class DiskSpaceGuard:
+    def __init__(self, min_free=MIN_FREE_BYTES, factor=SPACE_FACTOR):
+        """
+        Admit downloads only while their filesystem has room for them
+
+        Each admitted download reserves its expected size until it
+        finishes. Bytes it has already written to its staging directory
+        count against the free space, not the reservation, so the two are
+        not counted twice.
+
+        Args:
+            min_free: Bytes always left free
+            factor: Space needed per expected download byte
+        """
+        self.min_free = min_free
+        self.factor = factor
+        # key -> (st_dev, bytes reserved, staging directory)
+        self._reservations = {}
+        self._lock = threading.Lock()
+
+    def room(self, download_path):
+        """
+        Space a new download on download_path's filesystem may use
+
+        Returns:
+            tuple: (bytes, busy) where bytes is the free space minus the
+                minimum and the unwritten part of every reservation there,
+                and busy tells whether any reservations are held there
+        """
+        path = _existing(download_path)
+        device = os.stat(path).st_dev
+        with self._lock:
+            reservations = [entry for entry in self._reservations.values() if entry[0] == device]
+        outstanding = sum(max(reserved - _allocated_bytes(staging), 0) for _, reserved, staging in reservations)
+        return shutil.disk_usage(path).free - self.min_free - outstanding, bool(reservations)
+
+    def verdict(self, expected_bytes, room, known=True):
+        """
+        Decide whether a download of expected_bytes may start
+
+        Args:
+            expected_bytes: Expected download size
+            room: room() of its download path
+            known: False if the size is only a guess (no format sizes yet);
+                such a download starts while any room is left and is never
+                refused, a real shortage then fails it with ENOSPC
+
+        Returns:
+            str: 'ok' if it may start now, 'wait' if it does not fit only
+                because other downloads hold space there, 'full' if a known
+                size does not fit even with nothing else running
+        """
+        available, busy = room
+        if expected_bytes * self.factor <= available or (not known and available > 0):
+            return 'ok'
+        if busy:
+            return 'wait'
+        return 'full' if known else 'ok'
+
+    def reserve(self, key, download_path, staging, expected_bytes):
+        """Hold space for an admitted download until release(key)"""
+        device = os.stat(_existing(download_path)).st_dev
+        with self._lock:
+            self._reservations[key] = (device, expected_bytes * self.factor, staging)
+
+    def release(self, key):
+        """Give back the space held for key, if any"""
+        with self._lock:
+            self._reservations.pop(key, None)
+
+    def free_bytes(self, download_path):
+        """Free bytes on download_path's filesystem"""
+        return shutil.disk_usage(_existing(download_path)).free
+
+
+def _last_modified(path):
+    """Newest modification time of path or anything under it"""
+    newest = os.stat(path).st_mtime
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                newest = max(newest, os.stat(os.path.join(root, name)).st_mtime)
+            except OSError:
+                continue
+    return newest
+
+
+def sweep_staging(download_paths, keep, min_age=0):
+    """
+    Delete staging directories of downloads that are no longer queued
+
+    Args:
+        download_paths: Download directories to look in
+        keep: Item IDs whose partial files must survive (queued, paused, failed)
+        min_age: Also keep directories written to within this many seconds
+
+    Returns:
+        int: Bytes freed
+    """
+    freed = removed = 0
+    cutoff = time.time() - min_age
+    for download_path in set(download_paths):
+        root = os.path.join(download_path, STAGING_DIR)
+        try:
+            entries = list(os.scandir(root))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name in keep:
+                continue
+            try:
+                if min_age and _last_modified(entry.path) > cutoff:
+                    continue
+            except OSError:
+                continue
+            freed += _allocated_bytes(entry.path) if entry.is_dir() else entry.stat().st_size
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+            removed += 1
+        try:
+            os.rmdir(root)
+        except OSError:
+            pass
+
+    if removed:
+        logger.info(f"Removed {removed} orphaned downloads from staging ({freed / 1024 / 1024:.1f} MiB)")
+    return freed
@@ -0,0 +1,98 @@
+"""
+Dialog for adding many URLs at once
+"""
+
+import customtkinter as ctk
+from tkinter import filedialog, messagebox
+from src.ui.styles import ColorScheme, Fonts
+
+
+class BulkAddDialog(ctk.CTkToplevel):
+    def __init__(self, parent, submit_callback):
+        """
+        Args:
+            parent: Owning window
+            submit_callback: Called with the entered text (one URL per line)
+        """
+        super().__init__(parent, fg_color=ColorScheme.DARK_BG)
+        self.submit_callback = submit_callback
+
+        self.title("Bulk Add")
+        self.geometry("640x480")
+        self.transient(parent)
+
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        hint = ctk.CTkLabel(
+            self,
+            text="Paste one video or playlist URL per line, or load a text file",
+            font=Fonts.BODY,
+            text_color=ColorScheme.TEXT_SECONDARY
+        )
+        hint.grid(row=0, column=0, padx=15, pady=(15, 5), sticky="w")
+
+        self.textbox = ctk.CTkTextbox(self, font=Fonts.BODY, wrap="none")
+        self.textbox.grid(row=1, column=0, padx=15, pady=5, sticky="nsew")
+
+        btn_frame = ctk.CTkFrame(self, fg_color="transparent")
+        btn_frame.grid(row=2, column=0, padx=15, pady=15, sticky="ew")
+        btn_frame.grid_columnconfigure(0, weight=1)
+
+        load_btn = ctk.CTkButton(
+            btn_frame,
+            text="Load File...",
+            width=120,
+            command=self._load_file,
+            fg_color=ColorScheme.INFO,
+            hover_color=ColorScheme.BUTTON_HOVER
+        )
+        load_btn.grid(row=0, column=0, sticky="w")
+
+        cancel_btn = ctk.CTkButton(
+            btn_frame,
+            text="Cancel",
+            width=100,
+            command=self.destroy,
+            fg_color=ColorScheme.BUTTON_DISABLED,
+            hover_color=ColorScheme.DARK_ACCENT
+        )
+        cancel_btn.grid(row=0, column=1, padx=10)
+
+        add_btn = ctk.CTkButton(
+            btn_frame,
+            text="Add All",
+            width=120,
+            command=self._submit,
+            fg_color=ColorScheme.PRIMARY,
+            hover_color=ColorScheme.BUTTON_HOVER
+        )
+        add_btn.grid(row=0, column=2)
+
+        self.after(100, self.textbox.focus_set)
+
+    def _load_file(self):
+        """Append the contents of a text file to the box"""
+        path = filedialog.askopenfilename(
+            parent=self,
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("Cannot read file", str(e), parent=self)
+            return
+
+        if self.textbox.get("1.0", "end-1c").strip():
+            text = "\n" + text
+        self.textbox.insert("end", text)
+
+    def _submit(self):
+        """Hand the text to the window and close"""
+        text = self.textbox.get("1.0", "end-1c")
+        self.destroy()
+        self.submit_callback(text)
@@ -7,12 +7,17 @@ from src.ui.styles import ColorScheme, Fonts
 
 
 class DownloadItemWidget(ctk.CTkFrame):
-    def __init__(self, parent, url, quality, remove_callback, item_id):
+    def __init__(self, parent, url, quality, remove_callback, item_id, pause_callback=None,
+                 priority_callback=None):
         super().__init__(parent, fg_color=ColorScheme.DARK_BG, corner_radius=8)
 
         self.item_id = item_id
         self.remove_callback = remove_callback
+        self.pause_callback = pause_callback
+        self.priority_callback = priority_callback
         self.url = url
+        self.status = "waiting"
+        self._shown_percent = None
 
         self.grid_columnconfigure(1, weight=1)
 
@@ -32,17 +37,16 @@ class DownloadItemWidget(ctk.CTkFrame):
         info_frame.grid_columnconfigure(0, weight=1)
 
         # Title
-        title_text = url if len(url) < 60 else url[:57] + "..."
         self.title_label = ctk.CTkLabel(
             info_frame,
-            text=title_text,
+            text=self._short_title(url),
             font=Fonts.BODY,
             anchor="w"
         )
         self.title_label.grid(row=0, column=0, sticky="w")
 
         # Quality badge
-        quality_label = ctk.CTkLabel(
+        self.quality_label = ctk.CTkLabel(
             info_frame,
             text=quality,
             font=Fonts.SMALL,
@@ -52,7 +56,7 @@ class DownloadItemWidget(ctk.CTkFrame):
             padx=10,
             pady=2
         )
-        quality_label.grid(row=0, column=1, padx=10)
+        self.quality_label.grid(row=0, column=1, padx=10)
 
         # Progress bar
         self.progress_bar = ctk.CTkProgressBar(
@@ -73,6 +77,32 @@ class DownloadItemWidget(ctk.CTkFrame):
         )
         self.status_label.grid(row=2, column=0, sticky="w", pady=(2, 0))
 
+        # Download-next button
+        self.priority_btn = ctk.CTkButton(
+            self,
+            text="⤒",
+            width=40,
+            height=40,
+            command=self._on_priority,
+            fg_color=ColorScheme.INFO,
+            hover_color=ColorScheme.BUTTON_HOVER,
+            font=("Arial", 16, "bold")
+        )
+        self.priority_btn.grid(row=0, column=2, padx=(10, 0), pady=10)
+
+        # Pause/resume button
+        self.pause_btn = ctk.CTkButton(
+            self,
+            text="⏸",
+            width=40,
+            height=40,
+            command=self._on_pause,
+            fg_color=ColorScheme.WARNING,
+            hover_color="#ff8800",
+            font=("Arial", 16, "bold")
+        )
+        self.pause_btn.grid(row=0, column=3, padx=(10, 0), pady=10)
+
         # Remove button
         self.remove_btn = ctk.CTkButton(
             self,
@@ -84,10 +114,43 @@ class DownloadItemWidget(ctk.CTkFrame):
             hover_color="#cc3344",
             font=("Arial", 16, "bold")
         )
-        self.remove_btn.grid(row=0, column=2, padx=10, pady=10)
+        self.remove_btn.grid(row=0, column=4, padx=10, pady=10)
+
+    @staticmethod
+    def _short_title(url):
+        return url if len(url) < 60 else url[:57] + "..."
+
+    def bind_item(self, item):
+        """
+        Show a queue item in this widget
+
+        Widgets are recycled by the queue view, so this only touches the
+        parts of the row that differ from what is currently displayed.
+        """
+        if item['id'] != self.item_id:
+            self.item_id = item['id']
+            self.url = item['url']
+            self.title_label.configure(text=self._short_title(item.get('title') or item['url']))
+            self.quality_label.configure(text=item['quality'])
+            self.status = None
+
+        status = "waiting" if item['status'] == "pending" else item['status']
+        if status != self.status:
+            self.set_status(status)
+
+        if status == "downloading":
+            self.update_progress(item['progress'])
+        elif status != "completed":
+            self.progress_bar.set(item['progress'] / 100)
 
     def update_progress(self, percent):
         """Update progress bar"""
+        # Skip redraws that would not change the displayed value
+        percent = round(percent, 1)
+        if percent == self._shown_percent:
+            return
+        self._shown_percent = percent
+
         self.progress_bar.set(percent / 100)
         self.status_label.configure(text=f"Downloading... {percent:.1f}%")
 
@@ -96,18 +159,43 @@ class DownloadItemWidget(ctk.CTkFrame):
         status_config = {
             "waiting": {"color": ColorScheme.TEXT_MUTED, "text": "Waiting..."},
             "downloading": {"color": ColorScheme.PRIMARY, "text": "Downloading..."},
+            "processing": {"color": ColorScheme.INFO, "text": "Processing..."},
+            "retrying": {"color": ColorScheme.WARNING, "text": "↻ Retrying soon..."},
             "completed": {"color": ColorScheme.SUCCESS, "text": "✓ Completed"},
             "failed": {"color": ColorScheme.ERROR, "text": "✗ Failed"},
-            "paused": {"color": ColorScheme.WARNING, "text": "⏸ Paused"}
+            "paused": {"color": ColorScheme.WARNING, "text": "⏸ Paused"},
+            "cancelled": {"color": ColorScheme.TEXT_MUTED, "text": "Cancelled"}
         }
 
         config = status_config.get(status, status_config["waiting"])
+        self.status = status
         self.status_dot.configure(text_color=config["color"])
         self.status_label.configure(text=config["text"])
+        self.pause_btn.configure(
+            text="▶" if status == "paused" else "⏸",
+            state="disabled" if status in ("processing", "completed", "failed", "cancelled") else "normal"
+        )
+        # Only items that have not started can be moved ahead
+        self.priority_btn.configure(
+            state="normal" if status in ("waiting", "retrying", "paused") else "disabled"
+        )
+
+        # Status text replaced the percentage, so the next update must redraw
+        self._shown_percent = None
 
         if status == "completed":
             self.progress_bar.set(1.0)
 
+    def _on_pause(self):
+        """Handle pause/resume button click"""
+        if self.pause_callback:
+            self.pause_callback(self.item_id)
+
+    def _on_priority(self):
+        """Handle download-next button click"""
+        if self.priority_callback:
+            self.priority_callback(self.item_id)
+
     def _on_remove(self):
         """Handle remove button click"""
         self.remove_callback(self.item_id)
@@ -6,14 +6,57 @@ import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import threading
 from src.ui.styles import ColorScheme, Fonts
-from src.core.downloader import VideoDownloader
+from src.core.downloader import make_downloader
 from src.core.queue_manager import QueueManager
-from src.utils.validators import validate_url
-from src.ui.download_item import DownloadItemWidget
+from src.core.scheduler import DownloadScheduler
+from src.core.progress_bus import ProgressBus
+from src.core.playlist_expander import PlaylistExpander
+from src.core.rate_limiter import TokenBucket, HostLimiter
+from src.core.scheduling import make_policy
+from src.core.storage import sweep_staging
+from src.utils.validators import validate_url, is_playlist, parse_url_list
+from src.ui.queue_view import VirtualQueueView
+from src.ui.bulk_add_dialog import BulkAddDialog
+
+
+# Concurrency limits for the download scheduler
+MAX_CONCURRENT_DOWNLOADS = 3
+# None sizes the post-processing pool to the number of CPU cores
+MAX_CONCURRENT_POSTPROCESS = None
+
+# How often the UI applies progress published by download threads
+PROGRESS_TICK_MS = 100
+
+# Choices for the per-host connection cap (0 = unlimited)
+MAX_PER_HOST_OPTIONS = ["Unlimited", "1", "2", "3", "4", "6"]
+
+# Queue order choices -> scheduling policy names
+SCHEDULING_OPTIONS = {"Priority": "priority", "Smallest first": "sjf", "First added": "fifo"}
+
+# Rejected lines listed individually in the bulk-add report
+MAX_REJECTS_SHOWN = 10
+
+# Delay before warming up the download engine after the window appears
+WARM_UP_DELAY_MS = 500
+
+# Seconds to wait on exit for downloads to pause and post-processing to report back
+SHUTDOWN_TIMEOUT = 10.0
 
 
 class MainWindow(ctk.CTk):
-    def __init__(self):
+    def __init__(self, queue_store=None, metadata_cache=None, rate_limit=0, max_per_host=0, archive=None,
+                 metrics=None, scheduling_policy="priority", download_backend="thread"):
+        """
+        Args:
+            queue_store: Optional QueueStore journaling the queue
+            metadata_cache: Optional MetadataCache shared with the downloader
+            rate_limit: Initial bandwidth cap in bytes/sec (0 = unlimited)
+            max_per_host: Initial concurrent connections per host (0 = unlimited)
+            archive: Optional DownloadArchive of completed videos, used to skip duplicates
+            metrics: Optional MetricsRegistry receiving per-download records
+            scheduling_policy: Initial queue order, a name from SCHEDULING_OPTIONS
+            download_backend: 'thread' or 'process' (downloads in worker processes)
+        """
         super().__init__()
 
         # Window configuration
@@ -22,9 +65,32 @@ class MainWindow(ctk.CTk):
         self.minsize(900, 600)
 
         # Initialize managers
-        self.queue_manager = QueueManager()
-        self.downloader = VideoDownloader()
-        self.download_widgets = {}
+        self.queue_manager = QueueManager(
+            store=queue_store,
+            archive=archive,
+            policy=make_policy(scheduling_policy),
+            metadata_cache=metadata_cache
+        )
+        self.downloader = make_downloader(
+            download_backend,
+            metadata_cache=metadata_cache,
+            archive=archive,
+            rate_limiter=TokenBucket(rate_limit),
+            host_limiter=HostLimiter(max_per_host)
+        )
+        self.progress_bus = ProgressBus()
+        self.playlist_expander = PlaylistExpander(self.queue_manager)
+        self.scheduler = DownloadScheduler(
+            self.queue_manager,
+            self.downloader,
+            max_workers=MAX_CONCURRENT_DOWNLOADS,
+            max_postprocess=MAX_CONCURRENT_POSTPROCESS,
+            on_start=self._on_download_start,
+            on_progress=self._on_download_progress,
+            on_finish=self._on_download_finish,
+            on_retry=self._on_download_retry,
+            metrics=metrics
+        )
 
         # Setup UI
         self.setup_ui()
@@ -33,6 +99,13 @@ class MainWindow(ctk.CTk):
         self.grid_rowconfigure(1, weight=1)
         self.grid_columnconfigure(0, weight=1)
 
+        self._load_restored_items()
+        self.after(PROGRESS_TICK_MS, self._drain_progress)
+        # Load yt-dlp off the UI thread once the window is on screen
+        self.after(WARM_UP_DELAY_MS, self._start_warm_up)
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def setup_ui(self):
         """Create all UI components"""
         self._create_header()
@@ -85,6 +158,19 @@ class MainWindow(ctk.CTk):
         )
         self.add_btn.grid(row=0, column=1)
 
+        # Bulk add button
+        self.bulk_btn = ctk.CTkButton(
+            input_frame,
+            text="Bulk Add",
+            font=Fonts.SUBHEADING,
+            height=40,
+            width=110,
+            command=self.open_bulk_add,
+            fg_color=ColorScheme.INFO,
+            hover_color=ColorScheme.BUTTON_HOVER
+        )
+        self.bulk_btn.grid(row=0, column=2, padx=(10, 0))
+
     def _create_options_section(self):
         """Create download options section"""
         options_frame = ctk.CTkFrame(self, fg_color=ColorScheme.DARK_SECONDARY)
@@ -138,6 +224,73 @@ class MainWindow(ctk.CTk):
         )
         browse_btn.grid(row=0, column=4, padx=15, pady=15)
 
+        # Bandwidth cap shared by all downloads
+        limit_label = ctk.CTkLabel(
+            options_frame,
+            text="Speed limit:",
+            font=Fonts.SUBHEADING
+        )
+        limit_label.grid(row=1, column=0, padx=15, pady=(0, 15), sticky="w")
+
+        self.rate_limit_entry = ctk.CTkEntry(
+            options_frame,
+            placeholder_text="KB/s (empty = unlimited)",
+            font=Fonts.BODY,
+            width=200
+        )
+        rate_limit = self.downloader.rate_limiter.rate
+        if rate_limit:
+            self.rate_limit_entry.insert(0, str(rate_limit // 1024))
+        self.rate_limit_entry.grid(row=1, column=1, padx=10, pady=(0, 15), sticky="w")
+        self.rate_limit_entry.bind("<Return>", lambda e: self.apply_rate_limit())
+        self.rate_limit_entry.bind("<FocusOut>", lambda e: self.apply_rate_limit())
+
+        # Concurrent connections per host
+        host_label = ctk.CTkLabel(
+            options_frame,
+            text="Per host:",
+            font=Fonts.SUBHEADING
+        )
+        host_label.grid(row=1, column=2, padx=15, pady=(0, 15), sticky="w")
+
+        max_per_host = self.downloader.host_limiter.max_per_host
+        self.max_per_host_var = ctk.StringVar(value=str(max_per_host) if max_per_host else "Unlimited")
+        self.max_per_host_menu = ctk.CTkOptionMenu(
+            options_frame,
+            values=MAX_PER_HOST_OPTIONS,
+            variable=self.max_per_host_var,
+            command=self.apply_max_per_host,
+            font=Fonts.BODY,
+            fg_color=ColorScheme.PRIMARY,
+            button_color=ColorScheme.PRIMARY,
+            button_hover_color=ColorScheme.BUTTON_HOVER
+        )
+        self.max_per_host_menu.grid(row=1, column=3, padx=10, pady=(0, 15), sticky="w")
+
+        # Which pending item downloads next
+        order_label = ctk.CTkLabel(
+            options_frame,
+            text="Order:",
+            font=Fonts.SUBHEADING
+        )
+        order_label.grid(row=2, column=0, padx=15, pady=(0, 15), sticky="w")
+
+        policy_name = self.queue_manager.policy.name
+        self.order_var = ctk.StringVar(
+            value=next(label for label, name in SCHEDULING_OPTIONS.items() if name == policy_name)
+        )
+        self.order_menu = ctk.CTkOptionMenu(
+            options_frame,
+            values=list(SCHEDULING_OPTIONS),
+            variable=self.order_var,
+            command=self.apply_scheduling_policy,
+            font=Fonts.BODY,
+            fg_color=ColorScheme.PRIMARY,
+            button_color=ColorScheme.PRIMARY,
+            button_hover_color=ColorScheme.BUTTON_HOVER
+        )
+        self.order_menu.grid(row=2, column=1, padx=10, pady=(0, 15), sticky="w")
+
     def _create_queue_section(self):
         """Create download queue section"""
         queue_frame = ctk.CTkFrame(self, fg_color=ColorScheme.DARK_SECONDARY)
@@ -192,13 +345,15 @@ class MainWindow(ctk.CTk):
         )
         self.clear_btn.grid(row=0, column=2, padx=5)
 
-        # Scrollable queue list
-        self.queue_scroll = ctk.CTkScrollableFrame(
+        # Virtualized queue list (only visible rows have widgets)
+        self.queue_view = VirtualQueueView(
             queue_frame,
-            fg_color=ColorScheme.DARK_ACCENT
+            self.queue_manager,
+            self.remove_from_queue,
+            self.toggle_pause,
+            priority_callback=self.prioritize_item
         )
-        self.queue_scroll.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
-        self.queue_scroll.grid_columnconfigure(0, weight=1)
+        self.queue_view.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
 
     def _create_status_bar(self):
         """Create status bar"""
@@ -237,97 +392,226 @@ class MainWindow(ctk.CTk):
         quality = self.quality_var.get().split()[0]  # Extract resolution
         download_path = self.path_entry.get()
 
-        item_id = self.queue_manager.add_item(url, quality, download_path)
+        if is_playlist(url):
+            self._expand_playlist(url, quality, download_path)
+            self.url_entry.delete(0, "end")
+            self.status_label.configure(text=f"Expanding playlist: {url[:50]}...")
+            return
 
-        # Create widget
-        widget = DownloadItemWidget(
-            self.queue_scroll,
-            url,
-            quality,
-            self.remove_from_queue,
-            item_id
-        )
-        widget.pack(fill="x", padx=5, pady=5)
-        self.download_widgets[item_id] = widget
+        if self.queue_manager.add_item(url, quality, download_path) is None:
+            duplicate = self.queue_manager.find_duplicate(url, quality)
+            self.url_entry.delete(0, "end")
+            self.status_label.configure(
+                text="Already downloaded" if duplicate == "archived" else "Already in queue"
+            )
+            return
+        self.scheduler.wake()
 
         # Update UI
         self.url_entry.delete(0, "end")
+        self.queue_view.refresh()
         self.update_queue_count()
         self.status_label.configure(text=f"Added to queue: {url[:50]}...")
 
+    def open_bulk_add(self):
+        """Open the dialog for pasting or loading many URLs"""
+        BulkAddDialog(self, self.bulk_add)
+
+    def bulk_add(self, text):
+        """
+        Queue every URL in a block of text with one batch insert and one refresh
+
+        Args:
+            text: One URL per line; blank lines and '#' comments are ignored
+        """
+        accepted, rejected = parse_url_list(text)
+        quality = self.quality_var.get().split()[0]
+        download_path = self.path_entry.get()
+
+        videos = [entry for entry in accepted if not entry['playlist_id']]
+        playlists = [entry['url'] for entry in accepted if entry['playlist_id']]
+
+        item_ids, skipped = self.queue_manager.add_items(videos, quality, download_path)
+        for url in playlists:
+            self._expand_playlist(url, quality, download_path)
+        if item_ids:
+            self.scheduler.wake()
+
+        self.queue_view.refresh()
+        self.update_queue_count()
+
+        summary = f"Added {len(item_ids)} videos"
+        if playlists:
+            summary += f", expanding {len(playlists)} playlists"
+        duplicates = skipped['queued'] + skipped['archived']
+        if duplicates:
+            summary += f", skipped {duplicates} duplicates"
+        if rejected:
+            summary += f", rejected {len(rejected)} lines"
+        self.status_label.configure(text=summary)
+
+        if rejected:
+            lines = [f"Line {number}: {text[:80]}" for number, text in rejected[:MAX_REJECTS_SHOWN]]
+            if len(rejected) > MAX_REJECTS_SHOWN:
+                lines.append(f"...and {len(rejected) - MAX_REJECTS_SHOWN} more")
+            messagebox.showwarning(
+                "Some lines were not added",
+                f"{len(rejected)} lines are not YouTube video or playlist URLs:\n\n" + "\n".join(lines)
+            )
+
+    def _start_warm_up(self):
+        """Import yt-dlp and build a download session in the background"""
+        threading.Thread(target=self.downloader.warm_up, name="warm-up", daemon=True).start()
+
+    def _expand_playlist(self, url, quality, download_path):
+        """Queue each playlist entry as its own item from a background thread"""
+
+        def on_added(item_id):
+            self.scheduler.wake()
+            self.progress_bus.notify_queue_changed()
+
+        def run():
+            count = self.playlist_expander.expand(url, quality, download_path, on_added)
+            self.progress_bus.post_message(f"Added {count} videos from playlist")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _load_restored_items(self):
+        """Show items restored from the queue journal and clear out orphaned partial downloads"""
+        count = self.queue_manager.count()
+        if count:
+            self.update_queue_count()
+            self.status_label.configure(text=f"Restored {count} items from last session")
+
+        items = self.queue_manager.get_items()
+        # Partial files of items that can still be resumed or retried are kept
+        keep = {item['id'] for item in items if item['status'] not in ('completed', 'cancelled')}
+        download_paths = {item['download_path'] for item in items} | {self.path_entry.get()}
+        threading.Thread(target=sweep_staging, args=(download_paths, keep), name="janitor", daemon=True).start()
+
     def start_downloads(self):
         """Start all downloads in queue"""
-        pending_items = self.queue_manager.get_pending_items()
+        self.queue_manager.requeue_failed()
+        self.scheduler.resume_all()
+        self.queue_view.refresh()
 
-        if not pending_items:
+        if not self.queue_manager.has_pending():
             messagebox.showinfo("Empty Queue", "No items in queue to download")
             return
 
         self.status_label.configure(text="Starting downloads...")
+        self.scheduler.start()
+
+    def _on_download_start(self, item):
+        """Scheduler callback (worker thread): a worker picked up an item"""
+        self.progress_bus.publish(item['id'])
+
+    def _on_download_progress(self, item, progress_data):
+        """Scheduler callback (worker thread): progress update for an item"""
+        # Progress is already recorded in QueueManager; just flag the row for redraw
+        self.progress_bus.publish(item['id'])
+
+    def _on_download_finish(self, item, result):
+        """Scheduler callback (worker thread): an item finished downloading"""
+        if result.status == "completed":
+            self.progress_bus.post_message("Download completed successfully")
+        elif result.status == "failed":
+            self.progress_bus.post_message("Download failed")
+        self.progress_bus.publish(item['id'])
+
+    def _on_download_retry(self, item, result, delay):
+        """Scheduler callback (worker thread): a transient failure will be retried"""
+        self.progress_bus.post_message(f"Download failed ({result.error_kind}), retrying in {delay:.0f}s")
+        self.progress_bus.publish(item['id'])
+
+    def _drain_progress(self):
+        """Apply coalesced progress updates on the Tk thread, then re-arm the timer"""
+        updates, message, queue_changed = self.progress_bus.drain()
+
+        # Only rows currently on screen are redrawn
+        if queue_changed:
+            self.queue_view.refresh()
+            self.update_queue_count()
+        elif updates:
+            self.queue_view.refresh_items(updates)
 
-        for item in pending_items:
-            thread = threading.Thread(
-                target=self._download_thread,
-                args=(item,),
-                daemon=True
-            )
-            thread.start()
-
-    def _download_thread(self, item):
-        """Download thread worker"""
-        item_id = item['id']
-        widget = self.download_widgets.get(item_id)
-
-        if widget:
-            widget.set_status("downloading")
-
-        def progress_callback(progress_data):
-            if widget:
-                if 'downloaded_bytes' in progress_data and 'total_bytes' in progress_data:
-                    percent = (progress_data['downloaded_bytes'] / progress_data['total_bytes']) * 100
-                    widget.update_progress(percent)
-
-        success = self.downloader.download(
-            item['url'],
-            item['download_path'],
-            item['quality'],
-            progress_callback
-        )
+        if message:
+            self.status_label.configure(text=message)
 
-        if widget:
-            if success:
-                widget.set_status("completed")
-                self.queue_manager.mark_completed(item_id)
-                self.status_label.configure(text="Download completed successfully")
-            else:
-                widget.set_status("failed")
-                self.status_label.configure(text="Download failed")
+        self.after(PROGRESS_TICK_MS, self._drain_progress)
 
     def pause_downloads(self):
-        """Pause all active downloads"""
-        self.downloader.pause_all()
+        """Pause all pending and active downloads"""
+        self.scheduler.pause_all()
+        self.queue_view.refresh()
         self.status_label.configure(text="Downloads paused")
 
-    def clear_completed(self):
-        """Clear completed downloads from queue"""
-        completed_ids = self.queue_manager.get_completed_ids()
+    def toggle_pause(self, item_id):
+        """Pause or resume a single item"""
+        item = self.queue_manager.get_item(item_id)
+        if item is None:
+            return
+
+        if item['status'] == 'paused':
+            self.scheduler.resume_item(item_id)
+        else:
+            self.scheduler.pause_item(item_id)
+        self.queue_view.refresh_items([item_id])
+
+    def prioritize_item(self, item_id):
+        """Make an item the next one to download"""
+        item = self.queue_manager.move_to_front(item_id)
+        if item is None:
+            return
+        self.queue_view.refresh_items([item_id])
+        if self.queue_manager.policy.name == "fifo":
+            self.status_label.configure(text="Priorities apply once the order is not \"First added\"")
+        else:
+            self.status_label.configure(text=f"Downloading next: {(item.get('title') or item['url'])[:50]}")
 
-        for item_id in completed_ids:
-            if item_id in self.download_widgets:
-                self.download_widgets[item_id].destroy()
-                del self.download_widgets[item_id]
-                self.queue_manager.remove_item(item_id)
+    def apply_scheduling_policy(self, choice):
+        """Reorder pending items with the chosen policy"""
+        self.queue_manager.set_policy(make_policy(SCHEDULING_OPTIONS[choice]))
+        self.status_label.configure(text=f"Queue order: {choice.lower()}")
 
+    def clear_completed(self):
+        """Clear completed downloads from queue"""
+        self.queue_manager.clear_completed()
+        self.queue_view.refresh()
         self.update_queue_count()
         self.status_label.configure(text="Cleared completed downloads")
 
     def remove_from_queue(self, item_id):
         """Remove specific item from queue"""
-        if item_id in self.download_widgets:
-            self.download_widgets[item_id].destroy()
-            del self.download_widgets[item_id]
-            self.queue_manager.remove_item(item_id)
-            self.update_queue_count()
+        self.scheduler.cancel_item(item_id)
+        self.queue_manager.remove_item(item_id)
+        self.queue_view.refresh()
+        self.update_queue_count()
+
+    def apply_rate_limit(self):
+        """Apply the speed limit entry to all downloads, including running ones"""
+        text = self.rate_limit_entry.get().strip()
+        try:
+            kbps = float(text) if text else 0
+            if kbps < 0:
+                raise ValueError(text)
+        except ValueError:
+            messagebox.showerror("Invalid limit", "Enter the speed limit in KB/s, or leave it empty")
+            return
+
+        rate = int(kbps * 1024)
+        if rate == self.downloader.rate_limiter.rate:
+            return
+        self.downloader.set_rate_limit(rate)
+        self.status_label.configure(
+            text=f"Speed limit: {kbps:g} KB/s" if rate else "Speed limit removed"
+        )
+
+    def apply_max_per_host(self, choice):
+        """Apply the per-host connection cap; waiting downloads pick it up immediately"""
+        limit = 0 if choice == "Unlimited" else int(choice)
+        self.downloader.set_max_per_host(limit)
+        self.status_label.configure(text=f"Connections per host: {choice.lower()}")
 
     def browse_folder(self):
         """Open folder browser"""
@@ -338,5 +622,18 @@ class MainWindow(ctk.CTk):
 
     def update_queue_count(self):
         """Update queue count label"""
-        count = len(self.download_widgets)
+        count = self.queue_manager.count()
         self.queue_count_label.configure(text=f"Queue: {count}")
+
+    def on_close(self):
+        """Stop the scheduler and close the window"""
+        # Interrupted downloads keep their partial files and are requeued next
+        # session; the store and caches close only once no worker can write to them
+        self.scheduler.shutdown(timeout=SHUTDOWN_TIMEOUT)
+        self.queue_manager.close()
+        self.downloader.close()
+        if self.downloader.metadata_cache:
+            self.downloader.metadata_cache.close()
+        if self.downloader.archive:
+            self.downloader.archive.close()
+        self.destroy()
@@ -0,0 +1,162 @@
+"""
+Virtualized download queue view that recycles a small pool of row widgets
+"""
+
+import math
+import sys
+import customtkinter as ctk
+from src.ui.styles import ColorScheme
+from src.ui.download_item import DownloadItemWidget
+
+# Vertical gap between rows in pixels
+ROW_PADDING = 10
+# Pixels scrolled per mouse wheel "unit"
+SCROLL_STEP = 40
+
+
+class VirtualQueueView(ctk.CTkFrame):
+    def __init__(self, parent, queue_manager, remove_callback, pause_callback, priority_callback=None, **kwargs):
+        """
+        Queue list that only creates widgets for visible rows
+
+        Item state lives in QueueManager; the view keeps one
+        DownloadItemWidget per visible row and rebinds them to different
+        items as the user scrolls, so memory and layout cost depend on the
+        window height rather than on the queue length.
+
+        Args:
+            parent: Parent widget
+            queue_manager: QueueManager holding the items to show
+            remove_callback: Called with item_id when a row's ✕ is clicked
+            pause_callback: Called with item_id when a row's ⏸/▶ is clicked
+            priority_callback: Called with item_id when a row's ⤒ is clicked
+        """
+        super().__init__(parent, fg_color=ColorScheme.DARK_ACCENT, **kwargs)
+
+        self.queue_manager = queue_manager
+        self.remove_callback = remove_callback
+        self.pause_callback = pause_callback
+        self.priority_callback = priority_callback
+
+        self._rows = []
+        self._row_by_item = {}
+        self._row_height = None
+        self._offset = 0
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent")
+        self.viewport.grid(row=0, column=0, sticky="nsew", padx=(5, 0), pady=5)
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns", pady=5)
+
+        self.viewport.bind("<Configure>", lambda e: self.refresh())
+        # CTk widgets refuse bind_all, so register wheel handlers on the window
+        toplevel = self.winfo_toplevel()
+        toplevel.bind_all("<MouseWheel>", self._on_mousewheel, add="+")
+        toplevel.bind_all("<Button-4>", self._on_mousewheel, add="+")
+        toplevel.bind_all("<Button-5>", self._on_mousewheel, add="+")
+
+    def refresh(self):
+        """Re-layout the visible rows for the current queue and scroll offset"""
+        # Offsets and heights are unscaled units, as place() applies widget scaling
+        total = self.queue_manager.count()
+        viewport_height = max(self._reverse_widget_scaling(self.viewport.winfo_height()), 1)
+
+        self._ensure_pool(viewport_height)
+        row_height = self._row_height or 1
+
+        max_offset = max(total * row_height - viewport_height, 0)
+        self._offset = min(max(self._offset, 0), max_offset)
+
+        first = int(self._offset // row_height)
+        shift = self._offset - first * row_height
+        items = self.queue_manager.get_items_range(first, first + len(self._rows))
+
+        self._row_by_item = {}
+        for index, row in enumerate(self._rows):
+            if index < len(items):
+                row.bind_item(items[index])
+                row.place(x=0, y=index * row_height - shift, relwidth=1)
+                self._row_by_item[items[index]['id']] = row
+            else:
+                row.place_forget()
+
+        if total:
+            content_height = total * row_height
+            self.scrollbar.set(
+                self._offset / content_height,
+                min((self._offset + viewport_height) / content_height, 1.0)
+            )
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def refresh_items(self, item_ids):
+        """Redraw the rows currently showing any of the given items"""
+        for item_id in item_ids:
+            row = self._row_by_item.get(item_id)
+            item = self.queue_manager.get_item(item_id)
+            if row is not None and item is not None:
+                row.bind_item(item)
+
+    def _ensure_pool(self, viewport_height):
+        """Grow the row pool to cover the viewport (rows are never destroyed)"""
+        if not self._rows:
+            self._rows.append(self._create_row())
+            self.update_idletasks()
+            self._row_height = self._reverse_widget_scaling(self._rows[0].winfo_reqheight()) + ROW_PADDING
+
+        needed = math.ceil(viewport_height / self._row_height) + 1
+        while len(self._rows) < needed:
+            self._rows.append(self._create_row())
+
+    def _create_row(self):
+        """Create an unbound row widget"""
+        return DownloadItemWidget(
+            self.viewport,
+            "",
+            "",
+            self.remove_callback,
+            None,
+            pause_callback=self.pause_callback,
+            priority_callback=self.priority_callback
+        )
+
+    def _scroll_by(self, pixels):
+        self._offset += pixels
+        self.refresh()
+
+    def _on_scrollbar(self, command, value, unit=None):
+        """Handle CTkScrollbar 'moveto' and 'scroll' commands"""
+        row_height = self._row_height or 1
+        if command == "moveto":
+            self._offset = float(value) * self.queue_manager.count() * row_height
+            self.refresh()
+        elif command == "scroll":
+            step = self._reverse_widget_scaling(self.viewport.winfo_height()) if unit == "pages" else SCROLL_STEP
+            self._scroll_by(int(value) * step)
+
+    def _on_mousewheel(self, event):
+        """Scroll when the wheel is used anywhere over the view"""
+        if not self._contains(event.widget):
+            return
+
+        if event.num == 4:
+            units = -1
+        elif event.num == 5:
+            units = 1
+        elif sys.platform.startswith("win"):
+            units = -int(event.delta / 120)
+        else:
+            units = -event.delta
+        self._scroll_by(units * SCROLL_STEP)
+
+    def _contains(self, widget):
+        """Check whether widget is this view or one of its descendants"""
+        while widget is not None:
+            if widget == self:
+                return True
+            widget = getattr(widget, "master", None)
+        return False
@@ -2,29 +2,208 @@
 Logging configuration
 """
 
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
+LOGGER_NAME = "YouTubeDownloader"
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
-def setup_logger():
-    """Setup application logger"""
-    os.makedirs("logs", exist_ok=True)
+# Rotate when the file reaches this size or at local midnight, whichever comes first
+MAX_LOG_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 7
 
-    log_file = os.path.join("logs", f"app_{datetime.now().strftime('%Y%m%d')}.log")
+# Queue item the current thread is working on, attached to every record it logs
+_item_id = contextvars.ContextVar("item_id", default=None)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
+_listener = None
 
-    return logging.getLogger("YouTubeDownloader")
+
+@contextmanager
+def log_context(item_id):
+    """
+    Tag records logged inside the block with a queue item ID
+
+    Args:
+        item_id: Queue item ID
+    """
+    token = _item_id.set(item_id)
+    try:
+        yield
+    finally:
+        _item_id.reset(token)
+
+
+class _ContextFilter(logging.Filter):
+    """Copies the item ID into the record on the logging thread, before it is enqueued"""
+
+    def filter(self, record):
+        if getattr(record, 'item_id', None) is None:
+            record.item_id = _item_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'item_id', None) is not None:
+            entry['item_id'] = record.item_id
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RotatingLogHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that also rolls over at midnight"""
+
+    def __init__(self, filename, max_bytes=MAX_LOG_BYTES, backup_count=LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self._rollover_at = self._next_midnight()
+
+    @staticmethod
+    def _next_midnight():
+        tomorrow = datetime.now().date() + timedelta(days=1)
+        return time.mktime(tomorrow.timetuple())
+
+    def shouldRollover(self, record):
+        if record.created >= self._rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._rollover_at = self._next_midnight()
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that only pre-formats records that need it"""
+
+    def prepare(self, record):
+        # Messages are already f-strings; only merge args and render tracebacks
+        # here, while the objects are still valid. Everything else is formatted
+        # by the listener thread.
+        if record.args or record.exc_info or record.stack_info:
+            return super().prepare(record)
+        return record
+
+
+def setup_logger(log_dir="logs", level=logging.INFO, json_format=None,
+                 max_bytes=MAX_LOG_BYTES, backup_count=LOG_BACKUP_COUNT):
+    """
+    Setup application logger
+
+    Records are put on an in-memory queue and written to the console and a
+    rotating log file by a background listener thread, so logging from a
+    download thread costs one enqueue.
+
+    Args:
+        log_dir: Directory for app.log and its rotated backups
+        level: Minimum level to record
+        json_format: Write the log file as JSON lines; None reads YTD_LOG_FORMAT
+        max_bytes: Rotate the log file at this size
+        backup_count: Rotated files to keep
+
+    Returns:
+        logging.Logger: Application logger
+    """
+    global _listener
+
+    if _listener is not None:
+        return logging.getLogger(LOGGER_NAME)
+
+    if json_format is None:
+        json_format = os.environ.get("YTD_LOG_FORMAT", "").lower() == "json"
+
+    os.makedirs(log_dir, exist_ok=True)
+
+    file_handler = RotatingLogHandler(os.path.join(log_dir, "app.log"), max_bytes, backup_count)
+    file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _EnqueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+    _listener.start()
+    atexit.register(shutdown_logger)
+
+    return logging.getLogger(LOGGER_NAME)
+
+
+class _Redispatch(logging.Handler):
+    """Passes a record from a worker process to this process's logger of the same name"""
+
+    def handle(self, record):
+        logging.getLogger(record.name).handle(record)
+        return True
+
+
+def setup_worker_logger(log_queue, level=logging.INFO):
+    """
+    Send a worker process's records to the parent process
+
+    Args:
+        log_queue: multiprocessing queue read by listen_to_workers() in the parent
+        level: Minimum level to record
+    """
+    queue_handler = _EnqueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+
+def listen_to_workers(log_queue):
+    """
+    Log records that worker processes put on log_queue through this process's handlers
+
+    Returns:
+        logging.handlers.QueueListener: The started listener; stop() it when
+            the workers have exited
+    """
+    listener = logging.handlers.QueueListener(log_queue, _Redispatch())
+    listener.start()
+    return listener
+
+
+def shutdown_logger():
+    """Flush queued records and stop the background writer"""
+    global _listener
+
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
 
 
 def get_logger():
     """Get logger instance"""
-    return logging.getLogger("YouTubeDownloader")
+    return logging.getLogger(LOGGER_NAME)
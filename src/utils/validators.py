@@ -5,6 +5,97 @@ URL validation utilities
 import re
 
 
+# One pass over a URL validates it and captures its video or playlist ID.
+# Accepted forms: watch?v=, shorts/, playlist?list= (youtube.com, www./m.) and youtu.be/
+_YOUTUBE_URL_PATTERN = re.compile(
+    r'^https?://(?:'
+    r'(?:www\.|m\.)?youtube\.com/(?:'
+    r'(?:watch\?(?:[^#]*&)?v=|shorts/)(?P<video>[\w-]+)'
+    r'|playlist\?(?:[^#]*&)?list=(?P<playlist>[\w-]+))'
+    r'|youtu\.be/(?P<short>[\w-]+))'
+)
+
+# A list= parameter on a video link; yt-dlp downloads the whole playlist for it
+_LIST_PARAM_PATTERN = re.compile(r'[?&]list=(?P<playlist>[\w-]+)')
+
+# YouTube video IDs are always 11 characters
+_VIDEO_ID_LENGTH = 11
+
+
+def parse_url(url):
+    """
+    Validate a YouTube URL and extract its IDs in a single match
+
+    Args:
+        url: URL string
+
+    Returns:
+        dict: 'url' (canonical), 'video_id' and 'playlist_id' (one is None),
+            or None if the URL is not a YouTube video or playlist URL. A video
+            link with a list= parameter counts as a playlist and keeps both IDs
+            in its URL
+    """
+    url = url.strip()
+    match = _YOUTUBE_URL_PATTERN.match(url)
+    if not match:
+        return None
+
+    playlist_id = match.group('playlist')
+    if playlist_id:
+        return {
+            'url': f"https://www.youtube.com/playlist?list={playlist_id}",
+            'video_id': None,
+            'playlist_id': playlist_id,
+        }
+
+    video_id = match.group('video') or match.group('short')
+    list_match = _LIST_PARAM_PATTERN.search(url.split('#', 1)[0])
+    if list_match:
+        return {
+            'url': f"https://www.youtube.com/watch?v={video_id}&list={list_match.group('playlist')}",
+            'video_id': None,
+            'playlist_id': list_match.group('playlist'),
+        }
+    return {
+        'url': f"https://www.youtube.com/watch?v={video_id}",
+        'video_id': video_id if len(video_id) == _VIDEO_ID_LENGTH else None,
+        'playlist_id': None,
+    }
+
+
+def parse_url_list(lines):
+    """
+    Validate many URLs at once, e.g. a pasted block or a file
+
+    Blank lines and '#' comments are ignored, and repeats of the same
+    canonical URL are dropped.
+
+    Args:
+        lines: Iterable of lines (or a single multi-line string)
+
+    Returns:
+        tuple: (accepted parse_url() dicts in input order,
+            rejected (line_number, text) pairs)
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+
+    accepted = []
+    rejected = []
+    seen = set()
+    for line_number, line in enumerate(lines, 1):
+        text = line.strip()
+        if not text or text.startswith('#'):
+            continue
+        parsed = parse_url(text)
+        if parsed is None:
+            rejected.append((line_number, text))
+        elif parsed['url'] not in seen:
+            seen.add(parsed['url'])
+            accepted.append(parsed)
+    return accepted, rejected
+
+
 def validate_url(url):
     """
     Validate YouTube URL (video or playlist)
@@ -15,16 +106,58 @@ def validate_url(url):
     Returns:
         bool: True if valid YouTube URL
     """
-    youtube_patterns = [
-        r'^https?://(www\.)?youtube\.com/watch\?v=[\w-]+',
-        r'^https?://(www\.)?youtube\.com/playlist\?list=[\w-]+',
-        r'^https?://youtu\.be/[\w-]+',
-        r'^https?://(www\.)?youtube\.com/shorts/[\w-]+'
-    ]
-
-    return any(re.match(pattern, url) for pattern in youtube_patterns)
+    return _YOUTUBE_URL_PATTERN.match(url) is not None
 
 
 def is_playlist(url):
-    """Check if URL is a playlist"""
-    return 'playlist?list=' in url
+    """Check if URL is a playlist, including a video link with a list= parameter"""
+    parsed = parse_url(url)
+    return bool(parsed and parsed['playlist_id'])
+
+
+def extract_video_id(url):
+    """
+    Extract the 11-character YouTube video ID from a video URL
+
+    Args:
+        url: URL string
+
+    Returns:
+        str: Video ID, or None for playlist and non-video URLs
+    """
+    parsed = parse_url(url)
+    return parsed['video_id'] if parsed else None
+
+
+def extract_playlist_id(url):
+    """
+    Extract the playlist ID from a playlist URL
+
+    Args:
+        url: URL string
+
+    Returns:
+        str: Playlist ID, or None if the URL is not a playlist page or a
+            video link with a list= parameter
+    """
+    parsed = parse_url(url)
+    return parsed['playlist_id'] if parsed else None
+
+
+def canonicalize_url(url):
+    """
+    Reduce a YouTube URL to its canonical form
+
+    watch?v=, youtu.be/ and shorts/ links to the same video all map to one
+    watch URL, and tracking or position parameters (si, feature, t, index,
+    utm_*) are dropped. A list= parameter is kept, since it makes the link
+    a playlist download.
+
+    Args:
+        url: Valid YouTube URL
+
+    Returns:
+        str: Canonical URL, or the stripped input if it is not a YouTube URL
+    """
+    parsed = parse_url(url)
+    return parsed['url'] if parsed else url.strip()